@@ -1,19 +1,46 @@
 from django.contrib import admin
-from .models import Facility, Booking, CustomUser
+from .models import (
+    APIToken, ArchivedBooking, Booking, BookingEvent, CustomUser, Facility, FacilitySchedule, OpeningHours, ScheduleException,
+)
+from django.db.models import Q
 from django.utils.html import format_html
+from django.utils.text import smart_split, unescape_string_literal
 from django.urls import reverse
 from django.utils import timezone
+from . import events, seats
+from .paginators import EstimatedCountPaginator
+from .routers import read_from_replica
+
+class ReplicaChangelistMixin:
+    """Render changelist pages from a read replica; actions (POST) stay on the primary."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with read_from_replica():
+            response = super().changelist_view(request, extra_context)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+        return response
+
+class LargeTableMixin:
+    """
+    Changelists of tables with millions of rows: no unfiltered COUNT(*) next to
+    the filtered one, and estimated counts for large results on PostgreSQL.
+    """
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
 @admin.register(Facility)
-class FacilityAdmin(admin.ModelAdmin):
-    list_display = ('name', 'location', 'capacity', 'created_at')
-    list_filter = ('location',)
+class FacilityAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ('name', 'location', 'capacity', 'shared_slots', 'created_at')
+    list_filter = ('location', 'shared_slots')
     search_fields = ('name', 'location')
     ordering = ('name',)
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('name', 'location', 'capacity', 'description')
+            'fields': ('name', 'location', 'capacity', 'shared_slots', 'description')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -21,17 +48,70 @@ class FacilityAdmin(admin.ModelAdmin):
         }),
     )
 
+class OpeningHoursInline(admin.TabularInline):
+    model = OpeningHours
+    extra = 0
+
+class ScheduleExceptionInline(admin.TabularInline):
+    model = ScheduleException
+    extra = 0
+
+@admin.register(FacilitySchedule)
+class FacilityScheduleAdmin(admin.ModelAdmin):
+    list_display = ('facility', 'slot_minutes')
+    list_select_related = ('facility',)
+    inlines = [OpeningHoursInline, ScheduleExceptionInline]
+
+class ReadOnlyAdminMixin:
+    """Booking history is append-only; the admin only shows it."""
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+class BookingEventInline(ReadOnlyAdminMixin, admin.TabularInline):
+    model = BookingEvent
+    fields = ('created_at', 'action', 'from_status', 'to_status', 'date', 'start_time', 'end_time', 'actor', 'source')
+    readonly_fields = fields
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('actor')
+
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableMixin, ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ('facility', 'user', 'date', 'start_time', 'end_time', 'status')
-    list_filter = ('status', 'date', 'facility')
+    # Dates are browsed with date_hierarchy; a facility filter would list every facility
+    list_filter = ('status',)
+    date_hierarchy = 'date'
     search_fields = ('facility__name', 'user__username')
+    autocomplete_fields = ('user', 'facility')
     ordering = ('-date', '-start_time')
     readonly_fields = ('created_at', 'updated_at')
+    inlines = [BookingEventInline]
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('facility', 'user')
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Match facilities and users first (trigram-indexed, small tables), then
+        filter bookings by their ids instead of joining both tables into an OR.
+        """
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            queryset = queryset.filter(
+                Q(facility__in=Facility.objects.filter(name__icontains=bit).values('pk'))
+                | Q(user__in=CustomUser.objects.filter(username__icontains=bit).values('pk'))
+            )
+        return queryset, False
+
     fieldsets = (
         ('Booking Information', {
             'fields': ('user', 'facility', 'date', 'start_time', 'end_time', 'status')
@@ -69,17 +149,55 @@ class BookingAdmin(admin.ModelAdmin):
     actions = ['confirm_bookings', 'cancel_bookings']
 
     def confirm_bookings(self, request, queryset):
-        updated = queryset.update(status='confirmed')
+        updated = seats.change_status(queryset, 'confirmed')
+        events.publish_for_queryset(queryset)
         self.message_user(request, f'{updated} bookings were confirmed.')
     confirm_bookings.short_description = 'Mark selected bookings as confirmed'
 
     def cancel_bookings(self, request, queryset):
-        updated = queryset.update(status='cancelled')
+        updated = seats.change_status(queryset, 'cancelled')
+        events.publish_for_queryset(queryset)
         self.message_user(request, f'{updated} bookings were cancelled.')
     cancel_bookings.short_description = 'Mark selected bookings as cancelled'
 
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(LargeTableMixin, ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ('facility', 'user', 'date', 'start_time', 'end_time', 'status', 'archived_at')
+    list_filter = ('status',)
+    date_hierarchy = 'date'
+    autocomplete_fields = ('user', 'facility')
+    ordering = ('-date', '-start_time')
+    readonly_fields = ('archived_at',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('facility', 'user')
+
+@admin.register(BookingEvent)
+class BookingEventAdmin(ReadOnlyAdminMixin, LargeTableMixin, admin.ModelAdmin):
+    list_display = ('created_at', 'booking_id', 'action', 'from_status', 'to_status', 'actor', 'source')
+    list_filter = ('action',)
+    date_hierarchy = 'created_at'
+    # Exact booking id only; the history outlives the booking row
+    search_fields = ('=booking__id',)
+    ordering = ('-created_at', '-id')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('actor')
+
+@admin.register(APIToken)
+class APITokenAdmin(admin.ModelAdmin):
+    list_display = ('user', 'name', 'created_at')
+    search_fields = ('user__username', 'name')
+    list_select_related = ('user',)
+    fields = ('user', 'name', 'created_at')
+    readonly_fields = fields
+
+    # Tokens are issued with the create_api_token command; the admin revokes them
+    def has_add_permission(self, request):
+        return False
+
 @admin.register(CustomUser)
-class CustomUserAdmin(admin.ModelAdmin):
+class CustomUserAdmin(LargeTableMixin, ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ('username', 'email', 'phone_number', 'is_staff')
     list_filter = ('is_staff', 'is_active')
     search_fields = ('username', 'email', 'phone_number')
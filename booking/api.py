@@ -0,0 +1,459 @@
+"""
+Versioned JSON API (mounted at /api/v1/).
+
+Rows are read with ``values()`` and encoded straight to JSON (orjson when it
+is installed) instead of hydrating model instances. List endpoints use
+keyset cursors, so a page costs the same no matter how deep the client
+pages, and every read endpoint accepts ``?fields=a,b,c``.
+"""
+import base64
+import json
+from datetime import date as date_cls, datetime, timedelta
+from functools import reduce, wraps
+from operator import or_
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, models, transaction
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import path
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+from redis.exceptions import RedisError
+
+from . import api_tokens, events, holds, schedules, seats
+from .availability import slot_capacity
+from .forms import BookingForm, FacilitySearchForm
+from .idempotency import idempotent
+from .intervals import IntervalIndexes, load_index
+from .models import Booking, Facility
+from .month_calendar import month_calendar, parse_month
+from .next_available import next_available_slots
+from .routers import read_from_replica
+from .search import search_facilities
+from .tasks import send_booking_confirmation_email
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_BATCH_SIZE = 20
+MAX_NEXT_SLOTS = 20
+MAX_SEARCH_FACILITIES = 50
+
+# API field name -> ORM lookup
+FACILITY_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'location': 'location',
+    'capacity': 'capacity',
+    'shared_slots': 'shared_slots',
+    'description': 'description',
+}
+FACILITY_ORDERING = ['name', 'id']
+
+BOOKING_FIELDS = {
+    'id': 'id',
+    'facility': 'facility_id',
+    'facility_name': 'facility__name',
+    'date': 'date',
+    'start_time': 'start_time',
+    'end_time': 'end_time',
+    'status': 'status',
+    'notes': 'notes',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+BOOKING_ORDERING = ['-date', '-start_time', '-id']
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+
+def error_response(message, status, **extra):
+    return json_response({'error': message, **extra}, status=status)
+
+
+def api_login_required(view_func):
+    """
+    Session or API token authentication. Write views are csrf_exempt for token
+    clients; session-authenticated requests still pass Django's CSRF check.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error_response('Authentication required', 401)
+        if not getattr(request, 'api_token_authenticated', False):
+            reason = api_tokens.csrf_failure(request)
+            if reason:
+                return error_response(f'CSRF check failed: {reason}', 403)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def selected_fields(request, available):
+    """The API fields requested with ?fields=, defaulting to all of them."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(available)
+    fields = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise APIError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def serialize_rows(queryset, fields, available):
+    """values() rows renamed from ORM lookups to API field names."""
+    lookups = {available[name]: name for name in fields}
+    for row in queryset.values(*lookups):
+        yield {lookups[lookup]: value for lookup, value in row.items()}
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(dumps(values)).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise APIError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise APIError('Invalid cursor')
+    return values
+
+
+def after_cursor(ordering, values):
+    """Keyset condition for rows that sort after the given ordering values."""
+    clauses = []
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clauses.append(models.Q(**equal, **{f'{name}__{lookup}': value}))
+        equal[name] = value
+    return reduce(or_, clauses)
+
+
+def paginate(request, queryset, ordering, fields, available):
+    try:
+        limit = min(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        raise APIError('Invalid limit')
+    if limit < 1:
+        raise APIError('Invalid limit')
+
+    queryset = queryset.order_by(*ordering)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        queryset = queryset.filter(after_cursor(ordering, decode_cursor(cursor, len(ordering))))
+
+    # Fetch the ordering columns too so the next cursor can be built
+    ordering_names = [field.lstrip('-') for field in ordering]
+    lookups = dict.fromkeys([available[name] for name in fields] + ordering_names)
+    rows = list(queryset.values(*lookups)[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][name] for name in ordering_names])
+
+    results = [{name: row[available[name]] for name in fields} for row in rows]
+    return {'results': results, 'next_cursor': next_cursor}
+
+
+class InvalidBooking(Exception):
+    def __init__(self, index, errors):
+        super().__init__(index)
+        self.index = index
+        self.errors = errors
+
+
+def handle_api_errors(view_func):
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except APIError as exc:
+            return error_response(exc.message, exc.status)
+    return wrapper
+
+
+@require_GET
+@handle_api_errors
+@read_from_replica()
+def facility_list(request):
+    """
+    Facilities by name; ?q= searches (best matches first where the database
+    ranks them), ?date=&time= keeps those available then.
+    """
+    fields = selected_fields(request, FACILITY_FIELDS)
+    search = FacilitySearchForm(request.GET)
+    if not search.is_valid():
+        return error_response('Invalid search', 400, errors=search.errors.get_json_data())
+    queryset = search_facilities(search.cleaned_data['q'], search.cleaned_data['date'], search.cleaned_data['time'])
+    ordering = FACILITY_ORDERING
+    if 'rank' in queryset.query.annotations:
+        # The cursor carries the rank, so later pages continue in rank order
+        ordering = ['-rank', *FACILITY_ORDERING]
+    return json_response(paginate(request, queryset, ordering, fields, FACILITY_FIELDS))
+
+
+@require_GET
+@handle_api_errors
+@read_from_replica()
+def facility_detail(request, pk):
+    fields = selected_fields(request, FACILITY_FIELDS)
+    facility = next(serialize_rows(Facility.objects.filter(pk=pk), fields, FACILITY_FIELDS), None)
+    if facility is None:
+        return error_response('Not found', 404)
+    return json_response(facility)
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+@api_login_required
+@idempotent
+@handle_api_errors
+def booking_list(request):
+    if request.method == 'POST':
+        return create_bookings(request)
+    fields = selected_fields(request, BOOKING_FIELDS)
+    with read_from_replica():
+        page = paginate(request, Booking.objects.filter(user=request.user), BOOKING_ORDERING, fields, BOOKING_FIELDS)
+    return json_response(page)
+
+
+def create_bookings(request):
+    """
+    Create one booking (a JSON object) or a batch (a JSON list, or an object
+    with a "bookings" list). A batch is all-or-nothing.
+    """
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        raise APIError('Invalid JSON body')
+    if isinstance(payload, dict) and 'bookings' in payload:
+        payload = payload['bookings']
+    is_batch = isinstance(payload, list)
+    items = payload if is_batch else [payload]
+    if not items or not all(isinstance(item, dict) for item in items):
+        raise APIError('Expected a booking object or a non-empty list of bookings')
+    if len(items) > MAX_BATCH_SIZE:
+        raise APIError(f'At most {MAX_BATCH_SIZE} bookings per request')
+
+    created = []
+    # Each facility-day's bookings are loaded once for the whole batch
+    interval_indexes = IntervalIndexes()
+    try:
+        with transaction.atomic():
+            for index, item in enumerate(items):
+                form = BookingForm(data=item, user=request.user, interval_indexes=interval_indexes)
+                if not form.is_valid():
+                    raise InvalidBooking(index, form.errors.get_json_data())
+                created.append(form.save().pk)
+    except InvalidBooking as exc:
+        return error_response('Invalid booking', 400, index=exc.index, errors=exc.errors)
+    except IntegrityError:
+        # Lost a race for the slot against a concurrent request
+        return error_response('This time slot is already booked', 409)
+
+    for booking_id in created:
+        send_booking_confirmation_email.delay(booking_id)
+
+    rows = list(serialize_rows(Booking.objects.filter(pk__in=created).order_by('id'), list(BOOKING_FIELDS), BOOKING_FIELDS))
+    return json_response({'results': rows} if is_batch else rows[0], status=201)
+
+
+@require_GET
+@api_login_required
+@handle_api_errors
+@read_from_replica()
+def booking_detail(request, pk):
+    fields = selected_fields(request, BOOKING_FIELDS)
+    queryset = Booking.objects.filter(pk=pk, user=request.user)
+    booking = next(serialize_rows(queryset, fields, BOOKING_FIELDS), None)
+    if booking is None:
+        return error_response('Not found', 404)
+    return json_response(booking)
+
+
+@csrf_exempt
+@require_POST
+@api_login_required
+@handle_api_errors
+def booking_cancel(request, pk):
+    queryset = Booking.objects.filter(pk=pk, user=request.user)
+    status = queryset.values_list('status', flat=True).first()
+    if status is None:
+        return error_response('Not found', 404)
+    if status == 'confirmed':
+        return error_response('Confirmed bookings cannot be cancelled', 403)
+    # Plain UPDATE: cancelling must not re-run the "not in the past" validation
+    if seats.change_status(queryset.filter(status='pending'), 'cancelled'):
+        events.publish_for_queryset(queryset)
+    return json_response(next(serialize_rows(queryset, list(BOOKING_FIELDS), BOOKING_FIELDS)))
+
+
+def _parse(value, parser, message):
+    if not value:
+        return None
+    try:
+        return parser(value)
+    except ValueError:
+        raise APIError(message)
+
+
+def _parse_time(value):
+    return datetime.strptime(value, '%H:%M').time()
+
+
+@require_GET
+@handle_api_errors
+@read_from_replica()
+def next_slots(request):
+    """
+    Earliest free slots. Facilities are chosen with ?facility=<id> (repeatable)
+    or ?q=<search>; ?after=, ?until=, ?earliest=, ?latest= and ?count= narrow
+    the search.
+    """
+    facility_ids = [value for value in request.GET.getlist('facility') if value]
+    query = request.GET.get('q', '').strip()
+    if facility_ids:
+        try:
+            facilities = Facility.objects.filter(pk__in=[int(value) for value in facility_ids])
+        except ValueError:
+            raise APIError('Invalid facility')
+    elif query:
+        facilities = search_facilities(query)
+    else:
+        raise APIError('Expected facility or q')
+    facilities = facilities.only('id', 'name', 'capacity', 'shared_slots')[:MAX_SEARCH_FACILITIES]
+
+    now = timezone.now()
+    after = _parse(request.GET.get('after'), datetime.fromisoformat, 'Invalid after (YYYY-MM-DD or YYYY-MM-DDTHH:MM)')
+    if after and settings.USE_TZ and timezone.is_naive(after):
+        after = timezone.make_aware(after)
+    after = max(after, now) if after else now
+    until = _parse(request.GET.get('until'), date_cls.fromisoformat, 'Invalid until (YYYY-MM-DD)')
+    horizon = after.date() + timedelta(days=settings.NEXT_SLOT_HORIZON_DAYS)
+    until = min(until, horizon) if until else horizon
+    earliest = _parse(request.GET.get('earliest'), _parse_time, 'Invalid earliest (HH:MM)')
+    latest = _parse(request.GET.get('latest'), _parse_time, 'Invalid latest (HH:MM)')
+    try:
+        count = min(int(request.GET.get('count', 5)), MAX_NEXT_SLOTS)
+    except ValueError:
+        raise APIError('Invalid count')
+    if count < 1:
+        raise APIError('Invalid count')
+
+    slots = next_available_slots(facilities, count, after, until, earliest, latest)
+    return json_response({'results': [slot.as_dict() for slot in slots], 'searched_until': until})
+
+
+@require_GET
+@handle_api_errors
+def facility_calendar(request, pk):
+    """Per-day and per-slot occupancy of a facility for ?month=YYYY-MM (default this month)."""
+    facility = Facility.objects.filter(pk=pk).only('id', 'capacity', 'shared_slots').first()
+    if facility is None:
+        return error_response('Not found', 404)
+    today = timezone.now().date()
+    year, month = _parse(request.GET.get('month'), parse_month, 'Invalid month (YYYY-MM)') or (today.year, today.month)
+    days = month_calendar(facility, year, month)
+    return json_response({
+        'facility': facility.id,
+        'month': f'{year:04d}-{month:02d}',
+        'days': [
+            {
+                'date': day['date'],
+                'free_slots': day['free_slots'],
+                'slots': [
+                    {
+                        'start_time': slot['start_time'].strftime('%H:%M'),
+                        'end_time': slot['end_time'].strftime('%H:%M'),
+                        'booked': slot['booked'],
+                        'free': slot['free'],
+                    }
+                    for slot in day['slots']
+                ],
+            }
+            for day in days
+        ],
+    })
+
+
+@csrf_exempt
+@require_POST
+@api_login_required
+@handle_api_errors
+def hold_create(request):
+    """Reserve a seat in a slot for SLOT_HOLD_TTL_SECONDS while the customer checks out."""
+    try:
+        payload = json.loads(request.body)
+        facility_id = int(payload['facility'])
+        date = date_cls.fromisoformat(payload['date'])
+        start_time = datetime.strptime(payload['start_time'], '%H:%M').strftime('%H:%M')
+    except (ValueError, KeyError, TypeError):
+        raise APIError('Expected facility, date (YYYY-MM-DD) and start_time (HH:MM)')
+    if date < timezone.now().date():
+        raise APIError('Cannot hold a slot in the past')
+
+    facility = Facility.objects.filter(pk=facility_id).first()
+    if facility is None:
+        return error_response('Not found', 404)
+    slot_start = datetime.strptime(start_time, '%H:%M').time()
+    slot_end = schedules.slot_end(facility.id, date, slot_start)
+    if slot_end is None:
+        raise APIError('The facility has no slot at that time on this date')
+    booked = len(load_index(facility.id, date).overlapping(slot_start, slot_end))
+    available = slot_capacity(facility) - booked
+    if available <= 0:
+        return error_response('This time slot is already booked', 409)
+
+    try:
+        hold = holds.place_hold(facility.id, date, start_time, available)
+    except RedisError:
+        return error_response('Holds are temporarily unavailable', 503)
+    if hold is None:
+        return error_response('This time slot is currently held by another customer', 409)
+    return json_response({'token': hold.token, 'expires_in': settings.SLOT_HOLD_TTL_SECONDS}, status=201)
+
+
+@csrf_exempt
+@require_http_methods(['DELETE'])
+@api_login_required
+def hold_release(request, token):
+    holds.release(token)
+    return HttpResponse(status=204)
+
+
+urlpatterns = [
+    path('facilities/', facility_list, name='facility_list'),
+    path('facilities/<int:pk>/', facility_detail, name='facility_detail'),
+    path('facilities/<int:pk>/calendar/', facility_calendar, name='facility_calendar'),
+    path('bookings/', booking_list, name='booking_list'),
+    path('bookings/<int:pk>/', booking_detail, name='booking_detail'),
+    path('bookings/<int:pk>/cancel/', booking_cancel, name='booking_cancel'),
+    path('slots/next/', next_slots, name='next_slots'),
+    path('holds/', hold_create, name='hold_create'),
+    path('holds/<str:token>/', hold_release, name='hold_release'),
+]
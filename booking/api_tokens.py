@@ -0,0 +1,67 @@
+"""
+Token authentication for the JSON API.
+
+Clients without a browser session (mobile apps, partner servers) send
+``Authorization: Bearer <token>``. Only a SHA-256 digest of each token is
+stored, so a token is shown once, when ``create_api_token`` issues it, and
+revoked by deleting its ``APIToken`` row.
+
+Token requests carry no cookies, so they need no CSRF protection: the API's
+write views are exempt from ``CsrfViewMiddleware`` and ``api_login_required``
+runs the same check itself for session-authenticated requests.
+"""
+import hashlib
+import secrets
+
+from django.middleware.csrf import CsrfViewMiddleware
+
+KEYWORD = 'Bearer'
+
+
+def digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue(user, name=''):
+    """Create a token for user. Returns the raw token, which is not stored."""
+    from .models import APIToken
+
+    token = secrets.token_urlsafe(32)
+    APIToken.objects.create(user=user, name=name, key_hash=digest(token))
+    return token
+
+
+def bearer_token(request):
+    """The token of an ``Authorization: Bearer`` header, '' for none, None if malformed."""
+    header = request.headers.get('Authorization')
+    if not header:
+        return ''
+    keyword, _, token = header.partition(' ')
+    if keyword != KEYWORD or not token.strip():
+        return None
+    return token.strip()
+
+
+def authenticate(token):
+    """The active user the token belongs to, or None."""
+    from .models import APIToken
+
+    api_token = (
+        APIToken.objects.select_related('user')
+        .filter(key_hash=digest(token), user__is_active=True)
+        .first()
+    )
+    return api_token.user if api_token is not None else None
+
+
+class _CSRFCheck(CsrfViewMiddleware):
+    def _reject(self, request, reason):
+        return reason
+
+
+def csrf_failure(request):
+    """Why a session-authenticated request fails the CSRF check, or None if it passes."""
+    check = _CSRFCheck(lambda request: None)
+    # Reads the CSRF cookie the way the middleware would have
+    check.process_request(request)
+    return check.process_view(request, None, (), {})
@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.core.exceptions import ImproperlyConfigured
 
 class BookingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'booking' 
\ No newline at end of file
+    name = 'booking'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .checks import check_production_settings
+
+        # Servers and workers do not run system checks; refuse to start here
+        errors = check_production_settings()
+        if errors:
+            raise ImproperlyConfigured(
+                'Refusing to start with debug-grade production settings: '
+                + ' '.join(f'{error.msg} ({error.id})' for error in errors)
+            )
@@ -0,0 +1,86 @@
+"""
+Moves long-past, cancelled and expired bookings from booking_booking into
+booking_archivedbooking.
+
+Each chunk is its own short transaction so row locks are held briefly, and
+the loop sleeps between chunks so archival can run during business hours
+without starving regular traffic.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import audit
+from .models import ArchivedBooking, Booking, BookingReminder, SlotSeats
+
+# Bookings that no longer hold their slot
+RELEASED_STATUSES = ['cancelled', 'expired']
+
+ARCHIVED_FIELDS = [
+    'id', 'user_id', 'facility_id', 'date', 'start_time', 'end_time',
+    'status', 'notes', 'created_at', 'updated_at',
+]
+
+
+def archivable_bookings(now=None):
+    """Bookings past the archive horizon, plus released ones past the (shorter) cancelled horizon."""
+    now = now or timezone.now()
+    past_cutoff = now.date() - timedelta(days=settings.BOOKING_ARCHIVE_AFTER_DAYS)
+    cancelled_cutoff = now - timedelta(days=settings.BOOKING_ARCHIVE_CANCELLED_AFTER_DAYS)
+    return Booking.objects.filter(
+        models.Q(date__lt=past_cutoff)
+        | models.Q(status__in=RELEASED_STATUSES, updated_at__lt=cancelled_cutoff)
+    )
+
+
+@audit.collect(source='booking.archive')
+def archive_chunk(chunk_size, now=None):
+    """
+    Archive up to chunk_size bookings in one transaction. Returns the number
+    moved. The chunk's "archived" events are written once it committed.
+    """
+    with transaction.atomic():
+        rows = list(
+            archivable_bookings(now)
+            .order_by('id')
+            .select_for_update(skip_locked=True)
+            .values(*ARCHIVED_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+        ArchivedBooking.objects.bulk_create(
+            [ArchivedBooking(original_id=row.pop('id'), **row) for row in rows]
+        )
+        with audit.deletes_recorded_as('archived'):
+            Booking.objects.filter(id__in=ids).delete()
+        return len(rows)
+
+
+def archive_bookings(chunk_size=None, pause=None, max_chunks=None, now=None):
+    """
+    Archive bookings chunk by chunk until none are left (or max_chunks is hit),
+    sleeping ``pause`` seconds between chunks. Returns the total moved.
+    """
+    chunk_size = chunk_size or settings.BOOKING_ARCHIVE_CHUNK_SIZE
+    pause = settings.BOOKING_ARCHIVE_CHUNK_PAUSE if pause is None else pause
+    total = chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        moved = archive_chunk(chunk_size, now)
+        total += moved
+        chunks += 1
+        if moved < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+    # Seat counters of past days are never read again
+    SlotSeats.objects.filter(date__lt=(now or timezone.now()).date()).delete()
+    # Nor are reminder markers once every lead time has passed
+    longest_lead = max(settings.BOOKING_REMINDERS.values(), default=timedelta(0))
+    BookingReminder.objects.filter(
+        claimed_at__lt=(now or timezone.now()) - longest_lead - timedelta(days=1)
+    ).delete()
+    return total
@@ -0,0 +1,66 @@
+"""
+Client disconnects for the slot-events stream under ASGI.
+
+Django 4.2 only listens for ``http.disconnect`` while it reads the request
+body, and servers such as uvicorn drop writes to a client that is gone
+without raising. An event stream would never learn that its browser left
+and keep its Redis connection, and its place under SLOT_EVENTS_MAX_STREAMS,
+forever. ``CancelOnDisconnect`` keeps listening for the stream views and
+cancels the request once the client disconnects.
+"""
+import asyncio
+
+from django.urls import Resolver404, resolve
+
+STREAM_VIEWS = {'booking:slot_events'}
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class CancelOnDisconnect:
+    def __init__(self, app, view_names=STREAM_VIEWS):
+        self.app = app
+        self.view_names = set(view_names)
+
+    def is_stream(self, scope):
+        if scope['type'] != 'http':
+            return False
+        try:
+            return resolve(scope['path']).view_name in self.view_names
+        except Resolver404:
+            return False
+
+    async def __call__(self, scope, receive, send):
+        if not self.is_stream(scope):
+            return await self.app(scope, receive, send)
+
+        # Read the (empty) body here so the listener below gets every later message
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message)
+            if not message.get('more_body', False):
+                break
+
+        async def replay():
+            if body:
+                return body.pop(0)
+            # Django does not read past the body; the listener owns the connection now
+            await asyncio.Future()
+
+        request = asyncio.ensure_future(self.app(scope, replay, send))
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({request, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (request, disconnect):
+                task.cancel()
+            # Let the stream's cleanup (pubsub close, stream count) run before returning
+            await asyncio.gather(request, disconnect, return_exceptions=True)
+        if not request.cancelled():
+            request.result()
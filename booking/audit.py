@@ -0,0 +1,142 @@
+"""
+Append-only booking history (``BookingEvent``).
+
+Creations, status changes, reschedules and deletes are recorded as events.
+An event is only queued once the change is committed, so rolled-back changes
+leave no history. Inside ``collect()`` (every request through
+``AuditMiddleware``, and each chunk of the archive and expiry jobs) queued
+events are buffered and written with one ``bulk_create`` when the block
+ends: auditing costs at most one INSERT per request or chunk, after the
+booking transaction committed, and a long job never holds more than a
+chunk's events. Outside a ``collect()`` block, e.g. in a shell, each event
+is written on commit.
+"""
+import logging
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 1000
+
+_collector = ContextVar('booking_event_collector', default=None)
+# Action recorded for deleted bookings; the archiver moves rather than deletes
+_delete_action = ContextVar('booking_delete_action', default='deleted')
+
+
+def write(events):
+    from .models import BookingEvent
+
+    if not events:
+        return
+    try:
+        BookingEvent.objects.bulk_create(events, batch_size=FLUSH_BATCH_SIZE)
+    except Exception:
+        # The bookings are committed already; losing history beats failing the request
+        logger.exception('Could not write %d booking events', len(events))
+
+
+class collect(ContextDecorator):
+    """
+    Buffer the events of the block (or decorated task) and write them together
+    at its end. ``source`` says where the changes came from; ``request`` gives
+    the acting user. Nested blocks share the outermost buffer.
+    """
+
+    def __init__(self, source='', request=None):
+        self.source = source
+        self.request = request
+        self.events = []
+        self.closed = False
+
+    def _recreate_cm(self):
+        # A fresh buffer per call keeps decorated tasks thread-safe
+        return type(self)(self.source, self.request)
+
+    def __enter__(self):
+        self._token = None if _collector.get() is not None else _collector.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        if self._token is not None:
+            _collector.reset(self._token)
+            self.closed = True
+            self.flush()
+        return False
+
+    @property
+    def actor_id(self):
+        user = getattr(self.request, 'user', None)
+        return user.pk if user is not None and user.is_authenticated else None
+
+    def add(self, event):
+        self.events.append(event)
+        if self.closed:
+            # Committed after the block ended (e.g. a transaction left open)
+            self.flush()
+
+    def flush(self):
+        events, self.events = self.events, []
+        actor_id = self.actor_id if events else None
+        for event in events:
+            event.source = self.source
+            event.actor_id = actor_id
+        write(events)
+
+
+class deletes_recorded_as(ContextDecorator):
+    """Record Booking deletes inside the block with another action, e.g. 'archived'."""
+
+    def __init__(self, action):
+        self.action = action
+
+    def _recreate_cm(self):
+        return type(self)(self.action)
+
+    def __enter__(self):
+        self._token = _delete_action.set(self.action)
+        return self
+
+    def __exit__(self, *exc):
+        _delete_action.reset(self._token)
+        return False
+
+
+def record(booking_id, action, from_status='', to_status='', date=None, start_time=None, end_time=None, using=None):
+    """Queue an event for when the current transaction commits."""
+    from .models import BookingEvent
+
+    event = BookingEvent(
+        booking_id=booking_id,
+        action=action,
+        from_status=from_status or '',
+        to_status=to_status or '',
+        date=date,
+        start_time=start_time,
+        end_time=end_time,
+        created_at=timezone.now(),
+    )
+    collector = _collector.get()
+    if collector is not None:
+        transaction.on_commit(lambda: collector.add(event), using=using)
+    else:
+        transaction.on_commit(lambda: write([event]), using=using)
+
+
+def record_status_changes(rows, to_status):
+    """record() for booking values() rows moved to to_status by a queryset update."""
+    for row in rows:
+        record(
+            row['id'], 'status_changed', row['status'], to_status,
+            row['date'], row['start_time'], row['end_time'],
+        )
+
+
+def record_delete(booking):
+    record(
+        booking.pk, _delete_action.get(), booking.status, '',
+        booking.date, booking.start_time, booking.end_time,
+    )
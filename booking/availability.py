@@ -0,0 +1,51 @@
+"""Slot occupancy lookups shared by the availability endpoints and booking validation."""
+from . import holds, schedules
+from .intervals import IntervalIndex
+from .models import Booking, Facility
+
+# Statuses that hold a slot
+OCCUPYING_STATUSES = ['confirmed', 'pending']
+
+
+def slot_capacity(facility):
+    """Seats per time slot: the capacity for shared-slot facilities, otherwise one."""
+    return facility.seats_per_slot
+
+
+def occupied_counts(facility_id, date):
+    """{'HH:MM': bookings occupying the slot} for the facility's slots on date."""
+    bookings = list(Booking.objects.filter(
+        facility_id=facility_id,
+        date=date,
+        status__in=OCCUPYING_STATUSES
+    ).values_list('start_time', 'end_time'))
+    counts = {}
+    # Bookings off the grid still show at their start time
+    for start, _ in bookings:
+        label = start.strftime('%H:%M')
+        counts[label] = counts.get(label, 0) + 1
+    # Bookings spanning several slots occupy the later ones too
+    index = IntervalIndex(bookings)
+    for start, end in schedules.slot_grid(facility_id, date):
+        label = start.strftime('%H:%M')
+        counts[label] = max(counts.get(label, 0), len(index.overlapping(start, end)))
+    return {label: count for label, count in counts.items() if count}
+
+
+def unavailable_slots(facility_id, date, exclude_hold=None):
+    """
+    Full slots, slots whose remaining seats are all held by other customers,
+    and form choices the facility does not offer on date (closed, holiday).
+    """
+    facility = Facility.objects.only('capacity', 'shared_slots').filter(pk=facility_id).first()
+    if facility is None:
+        return []
+    capacity = slot_capacity(facility)
+    counts = occupied_counts(facility_id, date)
+    held = holds.held_counts(facility_id, date, exclude_hold)
+    unavailable = {
+        label for label in counts.keys() | held.keys()
+        if counts.get(label, 0) + held.get(label, 0) >= capacity
+    }
+    unavailable.update(schedules.closed_start_times(facility_id, date))
+    return sorted(unavailable)
@@ -0,0 +1,60 @@
+"""
+Startup check for the production settings profile.
+
+``check_production_settings`` is a system check (so ``manage.py check`` and
+``migrate`` report it) and is also run by ``BookingConfig.ready()`` when
+``settings.PRODUCTION`` is set, so web servers and Celery workers refuse to
+start with debug-grade settings instead of leaking memory for hours.
+"""
+from django.conf import settings
+from django.core import checks
+
+DEBUG_SECRET_KEYS = {'', 'your-secret-key'}
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def _uses_cached_loader(template_settings):
+    loaders = template_settings.get('OPTIONS', {}).get('loaders') or []
+    return any(
+        (loader[0] if isinstance(loader, (list, tuple)) else loader)
+        == 'django.template.loaders.cached.Loader'
+        for loader in loaders
+    )
+
+
+@checks.register(checks.Tags.compatibility)
+def check_production_settings(app_configs=None, **kwargs):
+    if not getattr(settings, 'PRODUCTION', False):
+        return []
+    errors = []
+    if settings.DEBUG:
+        errors.append(checks.Error(
+            'DEBUG is on: every SQL statement is kept in connection.queries.',
+            id='booking.E001',
+        ))
+    if settings.SECRET_KEY in DEBUG_SECRET_KEYS or settings.SECRET_KEY.startswith('django-insecure-'):
+        errors.append(checks.Error('SECRET_KEY is a development placeholder.', id='booking.E002'))
+    for template_settings in settings.TEMPLATES:
+        if (
+            template_settings['BACKEND'] == 'django.template.backends.django.DjangoTemplates'
+            and not _uses_cached_loader(template_settings)
+        ):
+            errors.append(checks.Error(
+                'Django templates are not loaded through the cached template loader.',
+                id='booking.E003',
+            ))
+    for alias, database in settings.DATABASES.items():
+        if not database.get('CONN_MAX_AGE'):
+            errors.append(checks.Error(
+                f"DATABASES['{alias}'] opens a new connection per request (CONN_MAX_AGE is 0).",
+                id='booking.E004',
+            ))
+    if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+        errors.append(checks.Error(
+            'The default cache is process-local; sessions, rate limits and slot grids need a shared cache.',
+            id='booking.E005',
+        ))
+    return errors
@@ -0,0 +1,167 @@
+"""
+Slot occupancy change notifications over Redis pub/sub.
+
+Once a booking write commits, the unavailable slots of the facility and day
+it touched are re-read from the primary and published on
+``slots:<facility_id>:<date>``; the server-sent events view relays them to
+browsers watching that facility and date. A stream starts with a ``snapshot``
+event followed by one ``slot`` event per change, both carrying the day's full
+state: with shared slots one booking does not fill a slot for everyone and
+one cancellation does not free a slot other bookings still fill. Clients
+never need to poll /api/available-slots/.
+"""
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from redis import Redis
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from . import month_calendar
+from .availability import unavailable_slots
+from .routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_async_client = None
+# Streams open in this process (one event loop, so no lock is needed)
+_open_streams = 0
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = Redis.from_url(
+            settings.SLOT_EVENTS_REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+        )
+    return _client
+
+
+def channel_name(facility_id, date):
+    return f'slots:{facility_id}:{date}'
+
+
+def slot_state(facility_id, date):
+    """The day's unavailable slots as published after a change, read from the primary."""
+    return {
+        'facility': facility_id,
+        'date': str(date),
+        'booked_slots': use_primary()(unavailable_slots)(facility_id, date),
+    }
+
+
+def publish(state):
+    try:
+        get_client().publish(channel_name(state['facility'], state['date']), json.dumps(state))
+    except RedisError:
+        # Listeners fall back to re-fetching; a lost update must not fail the write
+        logger.warning('Could not publish slot change', exc_info=True)
+
+
+def publish_on_commit(facility_id, date):
+    """Publish the day's state once committed; the cached month calendar is dropped with it."""
+
+    def notify():
+        month_calendar.invalidate(facility_id, date)
+        # Past days are not offered for booking, so nobody watches them
+        if date >= timezone.now().date():
+            publish(slot_state(facility_id, date))
+
+    transaction.on_commit(notify)
+
+
+def publish_days(days):
+    """publish_on_commit() once per distinct (facility_id, date) pair."""
+    for facility_id, date in set(days):
+        publish_on_commit(facility_id, date)
+
+
+def publish_for_queryset(queryset):
+    """Publish the days of every booking in queryset, e.g. after queryset.update()."""
+    publish_days(queryset.values_list('facility_id', 'date').distinct().order_by())
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {data}\n\n'
+
+
+def snapshot_event(facility_id, date):
+    """
+    The first event of a stream. It is read once the stream is subscribed, and
+    from the primary like published states, so no change falls in between.
+    """
+    slots = use_primary()(unavailable_slots)(facility_id, date)
+    return format_event('snapshot', json.dumps({'booked_slots': slots}))
+
+
+def get_async_client():
+    """
+    The async client of the process. Its pool is shared by every stream (each
+    open stream holds one connection) and never grows past
+    SLOT_EVENTS_MAX_STREAMS connections.
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(
+            settings.SLOT_EVENTS_REDIS_URL,
+            max_connections=settings.SLOT_EVENTS_MAX_STREAMS,
+        )
+    return _async_client
+
+
+def streams_available():
+    """Whether this process may open another stream (checked by the view before streaming)."""
+    return _open_streams < settings.SLOT_EVENTS_MAX_STREAMS
+
+
+async def stream_slot_events(facility_id, date):
+    """
+    Server-sent events for one facility and date (ASGI). When the client goes
+    away the request is cancelled (see booking.asgi) and the stream's
+    connection goes back to the pool.
+    """
+    global _open_streams
+    _open_streams += 1
+    pubsub = get_async_client().pubsub()
+    try:
+        await pubsub.subscribe(channel_name(facility_id, date))
+        yield await sync_to_async(snapshot_event)(facility_id, date)
+        while True:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=settings.SLOT_EVENTS_HEARTBEAT
+            )
+            if message is None:
+                # Comment line keeps proxies from closing an idle stream
+                yield ': keepalive\n\n'
+            else:
+                yield format_event('slot', message['data'].decode())
+    except RedisError:
+        # End the stream; the browser reconnects and starts from a new snapshot
+        logger.warning('Slot event stream lost Redis', exc_info=True)
+    finally:
+        _open_streams -= 1
+        await pubsub.aclose()
+
+
+def stream_slot_events_sync(facility_id, date):
+    """WSGI fallback for stream_slot_events; holds one worker thread per client."""
+    pubsub = get_client().pubsub()
+    try:
+        pubsub.subscribe(channel_name(facility_id, date))
+        yield snapshot_event(facility_id, date)
+        while True:
+            message = pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=settings.SLOT_EVENTS_HEARTBEAT
+            )
+            if message is None:
+                yield ': keepalive\n\n'
+            else:
+                yield format_event('slot', message['data'].decode())
+    finally:
+        pubsub.close()
@@ -0,0 +1,60 @@
+"""
+Expires pending bookings that were never confirmed, releasing their slots.
+
+Work is done in chunks of set-based UPDATEs. The date lower bound keeps the
+scan on the (date, status) index; anything older is the archiver's job.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import audit, events, seats
+from .models import Booking
+
+
+def stale_pending_bookings(now=None):
+    now = now or timezone.now()
+    return Booking.objects.filter(
+        date__gte=now.date() - timedelta(days=settings.BOOKING_ARCHIVE_AFTER_DAYS),
+        status='pending',
+        created_at__lt=now - timedelta(minutes=settings.BOOKING_PENDING_TTL_MINUTES),
+    )
+
+
+@audit.collect(source='booking.expiry')
+def expire_chunk(chunk_size, now=None):
+    """
+    Expire up to chunk_size stale pending bookings. Returns the number expired.
+    The chunk's events are written once it committed.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        rows = list(
+            stale_pending_bookings(now)
+            .order_by('date', 'id')
+            .select_for_update(skip_locked=True)
+            .values('id', 'facility_id', 'date', 'start_time', 'end_time', 'status')[:chunk_size]
+        )
+        if not rows:
+            return 0
+        expired = Booking.objects.filter(
+            id__in=[row['id'] for row in rows], status='pending'
+        ).update(status='expired', updated_at=now)
+        seats.release_rows(rows)
+        audit.record_status_changes(rows, 'expired')
+        # Live availability listeners see the slots free up
+        events.publish_days((row['facility_id'], row['date']) for row in rows)
+        return expired
+
+
+def expire_pending_bookings(chunk_size=None, now=None):
+    """Expire stale pending bookings chunk by chunk. Returns the total expired."""
+    chunk_size = chunk_size or settings.BOOKING_PENDING_EXPIRY_CHUNK_SIZE
+    total = 0
+    while True:
+        expired = expire_chunk(chunk_size, now)
+        total += expired
+        if expired < chunk_size:
+            return total
@@ -2,8 +2,11 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from .models import Booking, Facility
-from django.db import models
-from datetime import datetime, time
+from datetime import datetime
+from .routers import use_primary
+from . import holds, schedules
+from .intervals import IntervalIndexes
+from .availability import slot_capacity
 
 class BookingForm(forms.ModelForm):
     date = forms.DateField(
@@ -16,6 +19,15 @@ class BookingForm(forms.ModelForm):
         help_text='Select start time'
     )
 
+    end_time = forms.ChoiceField(
+        choices=[],  # Choices will be set in __init__
+        required=False,
+        help_text='Book several consecutive slots by choosing a later end time'
+    )
+
+    # Token from /api/v1/holds/ for the slot this customer is holding
+    hold_token = forms.CharField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Booking
         fields = ['facility', 'date', 'start_time', 'notes']
@@ -25,19 +37,21 @@ class BookingForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
+        # Share one IntervalIndexes across the forms of a batch
+        self.interval_indexes = kwargs.pop('interval_indexes', None) or IntervalIndexes()
         super().__init__(*args, **kwargs)
         
-        # Generate time slots (9:00 to 18:00)
-        time_slots = []
-        for hour in range(9, 18):
-            time_str = f"{hour:02d}:00"
-            time_slots.append((time_str, time_str))
-        
-        self.fields['start_time'].choices = time_slots
+        # Start times offered by any facility; clean() checks the chosen facility's grid
+        self.fields['start_time'].choices = [(t, t) for t in schedules.all_start_times()]
+        self.fields['end_time'].choices = [('', 'One slot')] + [(t, t) for t in schedules.all_end_times()]
+        if self.instance.pk:
+            self.initial.setdefault('end_time', self.instance.end_time.strftime('%H:%M'))
         
         # Only show available facilities
         self.fields['facility'].queryset = Facility.objects.all().order_by('name')
 
+    # Availability checks must see the latest writes, not a lagging replica
+    @use_primary()
     def clean(self):
         cleaned_data = super().clean()
         date = cleaned_data.get('date')
@@ -48,9 +62,6 @@ class BookingForm(forms.ModelForm):
             try:
                 # Convert start_time string to time object
                 start_time_obj = datetime.strptime(start_time, '%H:%M').time()
-                # Calculate end_time (1 hour after start_time)
-                end_hour = (start_time_obj.hour + 1) % 24
-                end_time = time(end_hour, 0)
                 
                 # Get current time in UTC
                 now = timezone.now()
@@ -63,35 +74,41 @@ class BookingForm(forms.ModelForm):
                 elif date == today and start_time_obj < current_time:
                     raise ValidationError('Cannot book in the past')
 
-                # Check for overlapping bookings
-                overlapping = Booking.objects.filter(
-                    facility=facility,
-                    date=date,
-                    status__in=['confirmed', 'pending']
-                ).filter(
-                    models.Q(start_time__lt=end_time) & 
-                    models.Q(end_time__gt=start_time_obj)
-                )
-
-                if overlapping.exists():
+                # The slots (and so end_time) come from the facility's schedule
+                end_time = cleaned_data.get('end_time')
+                end_time_obj = datetime.strptime(end_time, '%H:%M').time() if end_time else None
+                span = schedules.slot_span(facility.id, date, start_time_obj, end_time_obj)
+                if span is None:
                     raise ValidationError(
-                        'This time slot is already booked or pending. Please choose another time.'
+                        'The facility is closed at this time on the selected date. Please choose another time.'
                     )
+                end_time = span[-1][1]
 
-                # Check facility capacity
-                concurrent_bookings = Booking.objects.filter(
-                    facility=facility,
-                    date=date,
-                    status__in=['confirmed', 'pending'],
-                    start_time=start_time_obj
-                ).count()
-
-                if concurrent_bookings >= facility.capacity:
+                # Conflicts are checked against the facility-day's bookings in memory
+                index = self.interval_indexes.get(facility.id, date, exclude_pk=self.instance.pk)
+                capacity = slot_capacity(facility)
+                if not index.fits(start_time_obj, end_time, capacity):
+                    if capacity == 1:
+                        raise ValidationError(
+                            'This time slot is already booked or pending. Please choose another time.'
+                        )
                     raise ValidationError(
                         'Facility is at full capacity for this time slot.'
                     )
 
-                # Add end_time to cleaned_data
+                # Seats held by other customers who are still completing the form
+                held_counts = holds.held_counts(
+                    facility.id, date, exclude_token=cleaned_data.get('hold_token')
+                )
+                for slot_start, slot_end in span:
+                    held = held_counts.get(slot_start.strftime('%H:%M'), 0)
+                    if held and index.peak(slot_start, slot_end) + held >= capacity:
+                        raise ValidationError(
+                            'This time slot is currently held by another customer. Please choose another time.'
+                        )
+
+                # Add the slot times to cleaned_data
+                cleaned_data['start_time'] = start_time_obj
                 cleaned_data['end_time'] = end_time
 
             except (ValueError, TypeError) as e:
@@ -105,4 +122,19 @@ class BookingForm(forms.ModelForm):
         booking.end_time = self.cleaned_data['end_time']
         if commit:
             booking.save()
-        return booking 
\ No newline at end of file
+            self.interval_indexes.add(booking.facility_id, booking.date, booking.start_time, booking.end_time)
+            if self.cleaned_data.get('hold_token'):
+                holds.release(self.cleaned_data['hold_token'])
+        return booking
+
+
+class FacilitySearchForm(forms.Form):
+    q = forms.CharField(required=False, max_length=200, label='Search')
+    date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    time = forms.TimeField(required=False, widget=forms.TimeInput(attrs={'type': 'time'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if bool(cleaned_data.get('date')) != bool(cleaned_data.get('time')):
+            raise ValidationError('Choose both a date and a time to filter by availability.')
+        return cleaned_data
@@ -0,0 +1,190 @@
+"""
+Short-lived slot holds kept outside the database.
+
+While a customer fills in the booking form the chosen slot is reserved for
+``SLOT_HOLD_TTL_SECONDS``. Holds for one facility and day live in a single
+sorted set (member ``HH:MM|secret``, score = expiry time); the capacity check
+and insert run atomically in a Lua script so concurrent customers cannot
+over-hold a slot. Abandoned holds simply expire.
+
+Tokens look like ``<facility_id>-<YYYYMMDD>-<HHMM>-<secret>`` so a hold can be
+released or honoured from the token alone.
+"""
+import logging
+import secrets
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from redis import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+class Hold:
+    def __init__(self, facility_id, date, start_time, secret):
+        self.facility_id = int(facility_id)
+        self.date = date
+        self.start_time = start_time
+        self.secret = secret
+
+    @classmethod
+    def parse(cls, token):
+        """Hold for a token, or None if the token is malformed."""
+        try:
+            facility_id, day, start, secret = token.split('-', 3)
+            return cls(
+                facility_id,
+                datetime.strptime(day, '%Y%m%d').date(),
+                f'{start[:2]}:{start[2:]}',
+                secret,
+            )
+        except (AttributeError, ValueError):
+            return None
+
+    @property
+    def token(self):
+        return f"{self.facility_id}-{self.date:%Y%m%d}-{self.start_time.replace(':', '')}-{self.secret}"
+
+    @property
+    def key(self):
+        return f'holds:{self.facility_id}:{self.date}'
+
+    @property
+    def member(self):
+        return f'{self.start_time}|{self.secret}'
+
+
+def day_key(facility_id, date):
+    return f'holds:{facility_id}:{date}'
+
+
+class MemoryBackend:
+    """Process-local holds for tests and a single development server."""
+
+    def __init__(self):
+        self._sets = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        members = self._sets.setdefault(key, {})
+        for member, expires in list(members.items()):
+            if expires <= now:
+                del members[member]
+        return members
+
+    def add(self, key, member, start_time, available, ttl, now):
+        with self._lock:
+            members = self._live(key, now)
+            held = sum(1 for existing in members if existing.startswith(f'{start_time}|'))
+            if held >= available:
+                return False
+            members[member] = now + ttl
+            return True
+
+    def remove(self, key, member):
+        with self._lock:
+            self._sets.get(key, {}).pop(member, None)
+
+    def members(self, key, now):
+        with self._lock:
+            return list(self._live(key, now))
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+
+
+class RedisBackend:
+    SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local ttl = tonumber(ARGV[2])
+    local prefix = ARGV[3] .. '|'
+    local available = tonumber(ARGV[4])
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+    local held = 0
+    for _, member in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+        if string.sub(member, 1, #prefix) == prefix then
+            held = held + 1
+        end
+    end
+    if held >= available then
+        return 0
+    end
+    redis.call('ZADD', KEYS[1], now + ttl, ARGV[5])
+    redis.call('PEXPIRE', KEYS[1], math.ceil(ttl * 1000))
+    return 1
+    """
+
+    def __init__(self):
+        self.client = Redis.from_url(
+            settings.SLOT_HOLD_REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+        )
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def add(self, key, member, start_time, available, ttl, now):
+        return bool(self.script(keys=[key], args=[now, ttl, start_time, available, member]))
+
+    def remove(self, key, member):
+        self.client.zrem(key, member)
+
+    def members(self, key, now):
+        return [member.decode() for member in self.client.zrangebyscore(key, f'({now}', '+inf')]
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend():
+    path = settings.SLOT_HOLD_BACKEND
+    with _backends_lock:
+        if path not in _backends:
+            _backends[path] = import_string(path)()
+        return _backends[path]
+
+
+def place_hold(facility_id, date, start_time, available):
+    """
+    Hold a seat in the slot if fewer than ``available`` seats are held already
+    (``available`` = capacity minus confirmed/pending bookings). Returns the
+    Hold, or None when the slot is fully held.
+    """
+    hold = Hold(facility_id, date, start_time, secrets.token_urlsafe(12))
+    added = get_backend().add(
+        hold.key, hold.member, start_time, available,
+        settings.SLOT_HOLD_TTL_SECONDS, time.time(),
+    )
+    return hold if added else None
+
+
+def release(token):
+    hold = Hold.parse(token)
+    if hold is None:
+        return
+    try:
+        get_backend().remove(hold.key, hold.member)
+    except RedisError:
+        logger.warning('Could not release slot hold', exc_info=True)
+
+
+def held_counts(facility_id, date, exclude_token=None):
+    """{'HH:MM': live holds} for the facility and day, not counting exclude_token."""
+    excluded = Hold.parse(exclude_token) if exclude_token else None
+    try:
+        members = get_backend().members(day_key(facility_id, date), time.time())
+    except RedisError:
+        # Holds are advisory; without Redis only real bookings block a slot
+        logger.warning('Could not read slot holds', exc_info=True)
+        return {}
+    counts = {}
+    for member in members:
+        if excluded is not None and member == excluded.member:
+            continue
+        start_time = member.split('|', 1)[0]
+        counts[start_time] = counts.get(start_time, 0) + 1
+    return counts
@@ -0,0 +1,239 @@
+"""
+Idempotency-Key support for booking creation.
+
+A client that may retry a POST sends an ``Idempotency-Key`` header. The first
+request with a key claims it (Redis ``SET NX``) and stores its response once
+it has one; a repeat of the same request gets the stored response back, with
+an ``Idempotent-Replayed`` header, without the form being validated again or
+the booking tables being read. Keys are scoped to the user and the URL path
+and kept for ``IDEMPOTENCY_TTL_SECONDS``.
+
+A repeat that arrives while the first request still runs gets a 409, and a
+key reused with a different body a 422. Server errors and exceptions release
+the key so the client can retry. The in-progress claim only lives for
+``IDEMPOTENCY_LOCK_SECONDS``, and only a stored response is kept for the full
+TTL: a worker killed mid-request does not lock its key for a day. When Redis
+is unavailable the keys are kept in the ``IdempotencyKey`` table instead.
+"""
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from redis import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+class MemoryBackend:
+    """Process-local keys for tests and a single development server."""
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key, fingerprint, ttl):
+        now = time.time()
+        with self._lock:
+            expires, record = self._records.get(key, (0, None))
+            if expires > now:
+                return record
+            self._records[key] = (now + ttl, {'fingerprint': fingerprint})
+            return None
+
+    def complete(self, key, record, ttl):
+        with self._lock:
+            self._records[key] = (time.time() + ttl, record)
+
+    def release(self, key):
+        with self._lock:
+            self._records.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+class RedisBackend:
+    def __init__(self):
+        self.client = Redis.from_url(
+            settings.IDEMPOTENCY_REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+        )
+
+    def claim(self, key, fingerprint, ttl):
+        for _ in range(2):
+            if self.client.set(key, json.dumps({'fingerprint': fingerprint}), nx=True, ex=ttl):
+                return None
+            stored = self.client.get(key)
+            if stored is not None:
+                return json.loads(stored)
+            # Expired between SET and GET; claim again
+        return {'fingerprint': fingerprint}
+
+    def complete(self, key, record, ttl):
+        self.client.set(key, json.dumps(record), ex=ttl)
+
+    def release(self, key):
+        self.client.delete(key)
+
+
+class DatabaseBackend:
+    """Keys in the IdempotencyKey table; the fallback while Redis is down."""
+
+    def claim(self, key, fingerprint, ttl):
+        from .models import IdempotencyKey
+
+        for _ in range(2):
+            now = timezone.now()
+            try:
+                with transaction.atomic():
+                    IdempotencyKey.objects.create(
+                        key=key, fingerprint=fingerprint, expires_at=now + timedelta(seconds=ttl),
+                    )
+                return None
+            except IntegrityError:
+                stored = IdempotencyKey.objects.filter(key=key, expires_at__gt=now).first()
+                if stored is not None:
+                    return {
+                        'fingerprint': stored.fingerprint,
+                        'status': stored.status_code,
+                        'content_type': stored.content_type,
+                        'location': stored.location,
+                        'body': base64.b64encode(bytes(stored.body)).decode(),
+                    }
+                IdempotencyKey.objects.filter(key=key, expires_at__lte=now).delete()
+        return {'fingerprint': fingerprint}
+
+    def complete(self, key, record, ttl):
+        from .models import IdempotencyKey
+
+        # The claim may have gone to Redis before it became unavailable
+        IdempotencyKey.objects.update_or_create(key=key, defaults={
+            'fingerprint': record['fingerprint'],
+            'status_code': record['status'],
+            'content_type': record['content_type'],
+            'location': record['location'],
+            'body': base64.b64decode(record['body']),
+            'expires_at': timezone.now() + timedelta(seconds=ttl),
+        })
+
+    def release(self, key):
+        from .models import IdempotencyKey
+
+        IdempotencyKey.objects.filter(key=key).delete()
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+_database = DatabaseBackend()
+
+
+def get_backend():
+    path = settings.IDEMPOTENCY_BACKEND
+    with _backends_lock:
+        if path not in _backends:
+            _backends[path] = import_string(path)()
+        return _backends[path]
+
+
+def _call(method, *args):
+    try:
+        return getattr(get_backend(), method)(*args)
+    except RedisError:
+        logger.warning('Idempotency store unavailable, using the database', exc_info=True)
+        return getattr(_database, method)(*args)
+
+
+def store_key(user_id, path, key):
+    digest = hashlib.sha256(f'{user_id}:{path}:{key}'.encode()).hexdigest()
+    return f'idempotency:{digest}'
+
+
+def response_record(response, fingerprint):
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    return {
+        'fingerprint': fingerprint,
+        'status': response.status_code,
+        'content_type': response.get('Content-Type', ''),
+        'location': response.get('Location', ''),
+        'body': base64.b64encode(response.content).decode(),
+    }
+
+
+def replay(record, fingerprint):
+    """The stored response for a repeated request, or why it cannot be replayed."""
+    if record['fingerprint'] != fingerprint:
+        return JsonResponse(
+            {'error': f'{HEADER} was already used for a different request'}, status=422,
+        )
+    if record.get('status') is None:
+        response = JsonResponse(
+            {'error': f'A request with this {HEADER} is still in progress'}, status=409,
+        )
+        response['Retry-After'] = '1'
+        return response
+    response = HttpResponse(
+        base64.b64decode(record['body']),
+        status=record['status'],
+        content_type=record['content_type'] or None,
+    )
+    if record['location']:
+        response['Location'] = record['location']
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(view_func):
+    """Replay the stored response of an authenticated POST repeated with the same Idempotency-Key."""
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if request.method != 'POST' or not key or not request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse(
+                {'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}, status=400,
+            )
+
+        scoped = store_key(request.user.pk, request.path, key)
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        stored = _call('claim', scoped, fingerprint, settings.IDEMPOTENCY_LOCK_SECONDS)
+        if stored is not None:
+            return replay(stored, fingerprint)
+
+        try:
+            response = view_func(request, *args, **kwargs)
+        except BaseException:
+            _call('release', scoped)
+            raise
+        if response.status_code >= 500 or response.streaming:
+            _call('release', scoped)
+        else:
+            _call('complete', scoped, response_record(response, fingerprint), settings.IDEMPOTENCY_TTL_SECONDS)
+        return response
+    return wrapper
+
+
+def purge_expired():
+    """Delete expired fallback keys. Returns the number deleted."""
+    from .models import IdempotencyKey
+
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,93 @@
+"""
+Sorted interval index for booking conflict checks.
+
+The occupying bookings of one facility on one day are loaded with a single
+query into an ``IntervalIndex`` sorted by start time. Overlaps are found by
+bisecting the start times (bounded by the longest booking), and capacity is
+checked with a sweep line over the overlapping intervals, so a day with many
+bookings costs O(log n + k) per check instead of a query per check.
+
+``IntervalIndexes`` caches one index per (facility, date) for the lifetime of
+a request or batch; bookings created during the batch are added to it so
+later items in the same batch see them.
+"""
+from bisect import bisect_left, bisect_right, insort
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+class IntervalIndex:
+    def __init__(self, intervals=()):
+        # Parallel lists sorted by (start, end), in minutes since midnight
+        self._intervals = sorted((to_minutes(start), to_minutes(end)) for start, end in intervals)
+        self._starts = [start for start, _ in self._intervals]
+        self._longest = max((end - start for start, end in self._intervals), default=0)
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def add(self, start_time, end_time):
+        interval = (to_minutes(start_time), to_minutes(end_time))
+        insort(self._intervals, interval)
+        self._starts.insert(bisect_right(self._starts, interval[0]), interval[0])
+        self._longest = max(self._longest, interval[1] - interval[0])
+
+    def _overlapping(self, start, end):
+        # Anything overlapping [start, end) starts before end and after start - longest
+        lo = bisect_right(self._starts, start - self._longest)
+        hi = bisect_left(self._starts, end)
+        return [interval for interval in self._intervals[lo:hi] if interval[1] > start]
+
+    def overlapping(self, start_time, end_time):
+        """(start, end) minute pairs of the intervals overlapping [start_time, end_time)."""
+        return self._overlapping(to_minutes(start_time), to_minutes(end_time))
+
+    def peak(self, start_time, end_time):
+        """Most intervals in use at the same moment within [start_time, end_time)."""
+        start, end = to_minutes(start_time), to_minutes(end_time)
+        # Ends sort before starts at the same minute: back-to-back bookings do not overlap
+        points = []
+        for interval_start, interval_end in self._overlapping(start, end):
+            points.append((max(interval_start, start), 1))
+            points.append((min(interval_end, end), -1))
+        points.sort(key=lambda point: (point[0], point[1]))
+        peak = current = 0
+        for _, change in points:
+            current += change
+            peak = max(peak, current)
+        return peak
+
+    def fits(self, start_time, end_time, capacity):
+        """Whether one more interval fits in [start_time, end_time) without exceeding capacity."""
+        return self.peak(start_time, end_time) < capacity
+
+
+def load_index(facility_id, date, exclude_pk=None):
+    """IntervalIndex of the bookings occupying the facility on date."""
+    from .availability import OCCUPYING_STATUSES
+    from .models import Booking
+
+    bookings = Booking.objects.filter(facility_id=facility_id, date=date, status__in=OCCUPYING_STATUSES)
+    if exclude_pk is not None:
+        bookings = bookings.exclude(pk=exclude_pk)
+    return IntervalIndex(bookings.values_list('start_time', 'end_time'))
+
+
+class IntervalIndexes:
+    """Per-request cache of IntervalIndex by (facility_id, date)."""
+
+    def __init__(self):
+        self._indexes = {}
+
+    def get(self, facility_id, date, exclude_pk=None):
+        key = (facility_id, date, exclude_pk)
+        if key not in self._indexes:
+            self._indexes[key] = load_index(facility_id, date, exclude_pk)
+        return self._indexes[key]
+
+    def add(self, facility_id, date, start_time, end_time):
+        for (index_facility, index_date, _), index in self._indexes.items():
+            if index_facility == facility_id and index_date == date:
+                index.add(start_time, end_time)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from booking.archive import archive_bookings
+
+class Command(BaseCommand):
+    help = 'Moves past and cancelled bookings into the archive table in small chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Bookings moved per transaction')
+        parser.add_argument('--pause', type=float, help='Seconds to sleep between chunks')
+        parser.add_argument('--max-chunks', type=int, help='Stop after this many chunks')
+
+    def handle(self, *args, **options):
+        archived = archive_bookings(
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+            max_chunks=options['max_chunks'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} bookings'))
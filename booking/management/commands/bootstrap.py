@@ -0,0 +1,121 @@
+import hashlib
+import os
+from io import StringIO
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+from booking.models import Facility
+
+# Stored in STATIC_ROOT after a successful collectstatic
+STATIC_HASH_FILE = '.bootstrap-static-hash'
+# Arbitrary key: concurrent containers wait for each other's migrations
+MIGRATE_LOCK_ID = 72710045
+
+
+class Command(BaseCommand):
+    help = (
+        'Prepares a container for serving: migrates, collects static files, loads sample '
+        'data and creates the superuser, skipping every step that is already done'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-sample-data', action='store_true', help='Never load sample facilities')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Run migrate and collectstatic even when they look up to date',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.force = options['force']
+        self.step('migrate', self.migrate)
+        self.step('collectstatic', self.collectstatic)
+        if not options['skip_sample_data']:
+            self.step('sample data', self.sample_data)
+        self.step('superuser', self.superuser)
+        self.stdout.write(self.style.SUCCESS(f'Bootstrap finished in {time.monotonic() - started:.2f}s'))
+
+    def step(self, name, function):
+        started = time.monotonic()
+        outcome = function()
+        self.stdout.write(f'{name}: {outcome} ({time.monotonic() - started:.2f}s)')
+
+    def migrate(self):
+        with self.migrate_lock():
+            executor = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+            plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+            if not plan and not self.force:
+                return 'skipped, no unapplied migrations'
+            call_command('migrate', interactive=False, verbosity=0)
+            return f'applied {len(plan)} migrations'
+
+    @contextmanager
+    def migrate_lock(self):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != 'postgresql':
+            yield
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', [MIGRATE_LOCK_ID])
+            try:
+                yield
+            finally:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [MIGRATE_LOCK_ID])
+
+    def collectstatic(self):
+        source_hash = static_source_hash()
+        hash_path = os.path.join(settings.STATIC_ROOT, STATIC_HASH_FILE)
+        try:
+            with open(hash_path) as hash_file:
+                collected_hash = hash_file.read().strip()
+        except OSError:
+            collected_hash = None
+        if collected_hash == source_hash and not self.force:
+            return 'skipped, static files unchanged'
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(hash_path, 'w') as hash_file:
+            hash_file.write(source_hash)
+        return 'collected'
+
+    def sample_data(self):
+        if Facility.objects.exists():
+            return 'skipped, facilities exist'
+        call_command('setup_sample_data', stdout=StringIO())
+        return 'created sample facilities'
+
+    def superuser(self):
+        username = os.environ.get('DJANGO_SUPERUSER_USERNAME')
+        password = os.environ.get('DJANGO_SUPERUSER_PASSWORD')
+        if not username or not password:
+            return 'skipped, DJANGO_SUPERUSER_USERNAME/PASSWORD not set'
+        User = get_user_model()
+        if User.objects.filter(username=username).exists():
+            return f'skipped, {username} exists'
+        User.objects.create_superuser(username, os.environ.get('DJANGO_SUPERUSER_EMAIL', ''), password)
+        return f'created {username}'
+
+
+def static_source_hash():
+    """
+    Hash of every file collectstatic would copy (path, size and mtime), so an
+    unchanged image skips collecting without reading file contents.
+    """
+    digest = hashlib.sha256()
+    digest.update(settings.STATICFILES_STORAGE.encode())
+    entries = []
+    for finder in get_finders():
+        for path, storage in finder.list(['CVS', '.*', '*~']):
+            prefix = getattr(storage, 'prefix', None) or ''
+            stat = os.stat(storage.path(path))
+            entries.append(f'{os.path.join(prefix, path)}\0{stat.st_size}\0{stat.st_mtime_ns}')
+    for entry in sorted(entries):
+        digest.update(entry.encode())
+        digest.update(b'\n')
+    return digest.hexdigest()
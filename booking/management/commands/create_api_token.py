@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from booking.api_tokens import issue
+
+class Command(BaseCommand):
+    help = 'Issues a JSON API bearer token for a user; the token is only shown once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--name', default='', help='What the token is for, e.g. the client app')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}")
+        token = issue(user, options['name'])
+        self.stdout.write(self.style.SUCCESS(f'API token for {user.username}:'))
+        self.stdout.write(token)
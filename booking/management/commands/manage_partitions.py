@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from booking import partitions
+
+class Command(BaseCommand):
+    help = 'Creates upcoming monthly booking partitions and detaches expired ones (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=settings.BOOKING_PARTITION_MONTHS_AHEAD,
+            help='Number of future months that must have a partition',
+        )
+        parser.add_argument(
+            '--retain-months', type=int, default=settings.BOOKING_PARTITION_RETAIN_MONTHS,
+            help='Partitions ending more than this many months ago are detached',
+        )
+        parser.add_argument(
+            '--drop', action='store_true',
+            help='Drop detached partitions instead of keeping them as standalone tables',
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported():
+            self.stdout.write(self.style.WARNING('Database does not support partitioning, skipping'))
+            return
+
+        created = partitions.ensure_future_partitions(options['months_ahead'])
+        detached = partitions.detach_old_partitions(options['retain_months'], drop=options['drop'])
+
+        for name in created:
+            self.stdout.write(f'Created partition {name}')
+        for name in detached:
+            self.stdout.write(f"{'Dropped' if options['drop'] else 'Detached'} partition {name}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Partitions up to date ({len(created)} created, {len(detached)} detached)'
+        ))
@@ -0,0 +1,20 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from booking.rollups import refresh_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuilds the utilization rollups of days with changed bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Rebuild every day from this date (YYYY-MM-DD) instead')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+        days = refresh_rollups(since=since)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rollups of {days} facility days'))
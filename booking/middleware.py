@@ -0,0 +1,92 @@
+from django.conf import settings
+
+from django.http import JsonResponse
+
+from . import api_tokens, audit, ratelimit
+from .routers import end_request, start_request, wrote_to_primary
+
+REPLICA_PIN_COOKIE = 'pin_primary'
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read-your-writes for replica routing: after a request writes booking data,
+    the client gets a short-lived cookie that keeps its reads on the primary
+    until the replicas have caught up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tokens = start_request(pinned=REPLICA_PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+            if wrote_to_primary():
+                response.set_cookie(
+                    REPLICA_PIN_COOKIE,
+                    '1',
+                    max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                    httponly=True,
+                    samesite='Lax',
+                )
+        finally:
+            end_request(tokens)
+        return response
+
+
+class APITokenMiddleware:
+    """
+    Authenticates JSON API requests that carry ``Authorization: Bearer <token>``
+    (see booking.api_tokens). Runs before rate limiting, so token clients are
+    limited per user.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.resolver_match is None or 'api_v1' not in request.resolver_match.namespaces:
+            return None
+        token = api_tokens.bearer_token(request)
+        if token == '':
+            return None
+        user = api_tokens.authenticate(token) if token else None
+        if user is None:
+            return JsonResponse({'error': 'Invalid API token'}, status=401)
+        request.user = user
+        request.api_token_authenticated = True
+        return None
+
+
+class RateLimitMiddleware:
+    """Applies settings.RATELIMITS to views by their namespaced URL name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.RATELIMIT_ENABLED or request.resolver_match is None:
+            return None
+        name = request.resolver_match.view_name
+        config = settings.RATELIMITS.get(name)
+        if config is None:
+            return None
+        return ratelimit.check(request, name, config)
+
+
+class AuditMiddleware:
+    """Writes the booking events of a request with one INSERT once it is done (see booking.audit)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with audit.collect(source=f'{request.method} {request.path}'[:200], request=request):
+            return self.get_response(request)
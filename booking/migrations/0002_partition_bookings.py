@@ -0,0 +1,91 @@
+from django.db import migrations
+from django.utils import timezone
+
+from booking import partitions
+
+# Only runs on PostgreSQL; SQLite keeps the plain table. The primary key has to
+# include the partition key, unique_booking_time_slot already does.
+PARTITION_SQL = """
+CREATE SEQUENCE booking_booking_partitioned_id_seq;
+CREATE TABLE booking_booking_partitioned (
+    id bigint NOT NULL DEFAULT nextval('booking_booking_partitioned_id_seq'),
+    date date NOT NULL,
+    start_time time NOT NULL,
+    end_time time NOT NULL,
+    status varchar(20) NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    updated_at timestamp with time zone NOT NULL,
+    notes text NOT NULL,
+    facility_id bigint NOT NULL,
+    user_id bigint NOT NULL,
+    CONSTRAINT booking_booking_partitioned_pkey PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date);
+CREATE TABLE booking_booking_default PARTITION OF booking_booking_partitioned DEFAULT;
+INSERT INTO booking_booking_partitioned
+    (id, date, start_time, end_time, status, created_at, updated_at, notes, facility_id, user_id)
+    SELECT id, date, start_time, end_time, status, created_at, updated_at, notes, facility_id, user_id
+    FROM booking_booking;
+SELECT setval('booking_booking_partitioned_id_seq', COALESCE((SELECT MAX(id) FROM booking_booking), 0) + 1, false);
+DROP TABLE booking_booking;
+ALTER TABLE booking_booking_partitioned RENAME TO booking_booking;
+ALTER TABLE booking_booking RENAME CONSTRAINT booking_booking_partitioned_pkey TO booking_booking_pkey;
+ALTER SEQUENCE booking_booking_partitioned_id_seq RENAME TO booking_booking_id_seq;
+ALTER SEQUENCE booking_booking_id_seq OWNED BY booking_booking.id;
+ALTER TABLE booking_booking ADD CONSTRAINT unique_booking_time_slot UNIQUE (facility_id, date, start_time);
+ALTER TABLE booking_booking ADD CONSTRAINT booking_booking_facility_id_fk
+    FOREIGN KEY (facility_id) REFERENCES booking_facility (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE booking_booking ADD CONSTRAINT booking_booking_user_id_fk
+    FOREIGN KEY (user_id) REFERENCES booking_customuser (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX booking_boo_date_6751a5_idx ON booking_booking (date, status);
+CREATE INDEX booking_boo_user_id_dddf68_idx ON booking_booking (user_id, status);
+CREATE INDEX booking_boo_facilit_55baf9_idx ON booking_booking (facility_id, date);
+"""
+
+UNPARTITION_SQL = """
+ALTER SEQUENCE booking_booking_id_seq OWNED BY NONE;
+CREATE TABLE booking_booking_plain (LIKE booking_booking INCLUDING DEFAULTS);
+INSERT INTO booking_booking_plain SELECT * FROM booking_booking;
+DROP TABLE booking_booking CASCADE;
+ALTER TABLE booking_booking_plain RENAME TO booking_booking;
+ALTER SEQUENCE booking_booking_id_seq OWNED BY booking_booking.id;
+ALTER TABLE booking_booking ADD CONSTRAINT booking_booking_pkey PRIMARY KEY (id);
+ALTER TABLE booking_booking ADD CONSTRAINT unique_booking_time_slot UNIQUE (facility_id, date, start_time);
+ALTER TABLE booking_booking ADD CONSTRAINT booking_booking_facility_id_fk
+    FOREIGN KEY (facility_id) REFERENCES booking_facility (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE booking_booking ADD CONSTRAINT booking_booking_user_id_fk
+    FOREIGN KEY (user_id) REFERENCES booking_customuser (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX booking_boo_date_6751a5_idx ON booking_booking (date, status);
+CREATE INDEX booking_boo_user_id_dddf68_idx ON booking_booking (user_id, status);
+CREATE INDEX booking_boo_facilit_55baf9_idx ON booking_booking (facility_id, date);
+"""
+
+
+def partition_bookings(apps, schema_editor):
+    connection = schema_editor.connection
+    if not partitions.is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT MIN(date) FROM booking_booking')
+        first_date = cursor.fetchone()[0]
+    schema_editor.execute(PARTITION_SQL)
+
+    # Give existing rows and the coming months their own partitions
+    today = timezone.now().date()
+    for month in partitions.month_range(min(first_date or today, today), partitions.add_months(today, 3)):
+        partitions.create_month_partition(month, connection)
+
+
+def unpartition_bookings(apps, schema_editor):
+    if partitions.is_supported(schema_editor.connection):
+        schema_editor.execute(UNPARTITION_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_bookings, unpartition_bookings),
+    ]
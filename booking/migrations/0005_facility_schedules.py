@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:47
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0004_booking_expired_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacilitySchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_minutes', models.PositiveIntegerField(default=60, validators=[django.core.validators.MinValueValidator(5)])),
+                ('facility', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='schedule', to='booking.facility')),
+            ],
+            options={
+                'verbose_name': 'Facility schedule',
+                'verbose_name_plural': 'Facility schedules',
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduleException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('closed', models.BooleanField(default=True)),
+                ('opens_at', models.TimeField(blank=True, null=True)),
+                ('closes_at', models.TimeField(blank=True, null=True)),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='booking.facilityschedule')),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OpeningHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('opens_at', models.TimeField()),
+                ('closes_at', models.TimeField()),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opening_hours', to='booking.facilityschedule')),
+            ],
+            options={
+                'verbose_name': 'Opening hours',
+                'verbose_name_plural': 'Opening hours',
+                'ordering': ['weekday', 'opens_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='scheduleexception',
+            constraint=models.UniqueConstraint(fields=('schedule', 'date'), name='unique_schedule_exception_date'),
+        ),
+    ]
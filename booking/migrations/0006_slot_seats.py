@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0005_facility_schedules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotSeats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('seats_taken', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Slot seats',
+                'verbose_name_plural': 'Slot seats',
+            },
+        ),
+        migrations.RemoveConstraint(
+            model_name='booking',
+            name='unique_booking_time_slot',
+        ),
+        migrations.AddField(
+            model_name='facility',
+            name='shared_slots',
+            field=models.BooleanField(default=False, help_text='Let several bookings share a time slot, up to the capacity'),
+        ),
+        migrations.AddField(
+            model_name='slotseats',
+            name='facility',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_seats', to='booking.facility'),
+        ),
+        migrations.AddConstraint(
+            model_name='slotseats',
+            constraint=models.UniqueConstraint(fields=('facility', 'date', 'start_time'), name='unique_slot_seats'),
+        ),
+    ]
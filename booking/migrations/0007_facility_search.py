@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Only runs on PostgreSQL; elsewhere booking.search falls back to icontains.
+# The tsvector expression must stay identical to booking.search.search_document().
+SEARCH_INDEX_SQL = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX booking_facility_search_idx ON booking_facility
+    USING gin (to_tsvector('english'::regconfig, name || ' ' || location || ' ' || description));
+CREATE INDEX booking_facility_name_trgm_idx ON booking_facility USING gin (name gin_trgm_ops);
+CREATE INDEX booking_facility_location_trgm_idx ON booking_facility USING gin (location gin_trgm_ops);
+"""
+
+DROP_SEARCH_INDEX_SQL = """
+DROP INDEX IF EXISTS booking_facility_search_idx;
+DROP INDEX IF EXISTS booking_facility_name_trgm_idx;
+DROP INDEX IF EXISTS booking_facility_location_trgm_idx;
+"""
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_INDEX_SQL)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_slot_seats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_facility_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('cancelled', 'Cancelled'), ('expired', 'Expired')], max_length=20)),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('booked_minutes', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['updated_at'], name='booking_boo_updated_627c16_idx'),
+        ),
+        migrations.AddField(
+            model_name='bookingrollup',
+            name='facility',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='booking.facility'),
+        ),
+        migrations.AddIndex(
+            model_name='bookingrollup',
+            index=models.Index(fields=['date', 'facility'], name='booking_boo_date_4c1216_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookingrollup',
+            constraint=models.UniqueConstraint(fields=('facility', 'date', 'hour', 'status'), name='unique_booking_rollup'),
+        ),
+    ]
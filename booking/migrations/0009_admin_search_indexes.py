@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# Only runs on PostgreSQL. Admin search uses icontains, which PostgreSQL runs as
+# UPPER(column::text) LIKE UPPER('%term%'); trigram indexes on the same
+# expression serve it without a sequential scan.
+ADMIN_SEARCH_INDEX_SQL = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX booking_customuser_username_upper_trgm_idx ON booking_customuser
+    USING gin (UPPER(username::text) gin_trgm_ops);
+CREATE INDEX booking_customuser_email_upper_trgm_idx ON booking_customuser
+    USING gin (UPPER(email::text) gin_trgm_ops);
+CREATE INDEX booking_customuser_phone_number_upper_trgm_idx ON booking_customuser
+    USING gin (UPPER(phone_number::text) gin_trgm_ops);
+CREATE INDEX booking_facility_name_upper_trgm_idx ON booking_facility
+    USING gin (UPPER(name::text) gin_trgm_ops);
+CREATE INDEX booking_facility_location_upper_trgm_idx ON booking_facility
+    USING gin (UPPER(location::text) gin_trgm_ops);
+"""
+
+DROP_ADMIN_SEARCH_INDEX_SQL = """
+DROP INDEX IF EXISTS booking_customuser_username_upper_trgm_idx;
+DROP INDEX IF EXISTS booking_customuser_email_upper_trgm_idx;
+DROP INDEX IF EXISTS booking_customuser_phone_number_upper_trgm_idx;
+DROP INDEX IF EXISTS booking_facility_name_upper_trgm_idx;
+DROP INDEX IF EXISTS booking_facility_location_upper_trgm_idx;
+"""
+
+
+def create_admin_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(ADMIN_SEARCH_INDEX_SQL)
+
+
+def drop_admin_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_ADMIN_SEARCH_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_booking_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_admin_search_indexes, drop_admin_search_indexes),
+    ]
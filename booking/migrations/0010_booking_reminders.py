@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0009_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=10)),
+                ('batch', models.UUIDField(db_index=True)),
+                ('claimed_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'date', 'start_time'], name='booking_boo_status_83b1de_idx'),
+        ),
+        migrations.AddField(
+            model_name='bookingreminder',
+            name='booking',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='reminders', to='booking.booking'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookingreminder',
+            constraint=models.UniqueConstraint(fields=('booking', 'kind'), name='unique_booking_reminder'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
 from django.utils import timezone
@@ -16,6 +16,10 @@ class Facility(models.Model):
     name = models.CharField(max_length=200)
     location = models.CharField(max_length=500)
     capacity = models.IntegerField(validators=[MinValueValidator(1)])
+    shared_slots = models.BooleanField(
+        default=False,
+        help_text='Let several bookings share a time slot, up to the capacity'
+    )
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -53,11 +57,81 @@ class Facility(models.Model):
     def is_available_today(self):
         return self.today_booking_count < self.capacity
 
+    @property
+    def seats_per_slot(self):
+        return self.capacity if self.shared_slots else 1
+
+class FacilitySchedule(models.Model):
+    """Opening hours and slot length of a facility; see booking.schedules for the slot grids."""
+    facility = models.OneToOneField(Facility, on_delete=models.CASCADE, related_name='schedule')
+    slot_minutes = models.PositiveIntegerField(default=60, validators=[MinValueValidator(5)])
+
+    class Meta:
+        verbose_name = "Facility schedule"
+        verbose_name_plural = "Facility schedules"
+
+    def __str__(self):
+        return f"Schedule for {self.facility.name}"
+
+class OpeningHours(models.Model):
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    schedule = models.ForeignKey(FacilitySchedule, on_delete=models.CASCADE, related_name='opening_hours')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    opens_at = models.TimeField()
+    closes_at = models.TimeField()
+
+    class Meta:
+        ordering = ['weekday', 'opens_at']
+        verbose_name = "Opening hours"
+        verbose_name_plural = "Opening hours"
+
+    def clean(self):
+        if self.opens_at and self.closes_at and self.closes_at <= self.opens_at:
+            raise ValidationError('Closing time must be after opening time')
+
+    def __str__(self):
+        return f"{self.get_weekday_display()} {self.opens_at}-{self.closes_at}"
+
+class ScheduleException(models.Model):
+    """A holiday (closed) or different opening hours on one date."""
+    schedule = models.ForeignKey(FacilitySchedule, on_delete=models.CASCADE, related_name='exceptions')
+    date = models.DateField()
+    closed = models.BooleanField(default=True)
+    opens_at = models.TimeField(null=True, blank=True)
+    closes_at = models.TimeField(null=True, blank=True)
+    reason = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['schedule', 'date'], name='unique_schedule_exception_date')
+        ]
+
+    def clean(self):
+        if not self.closed:
+            if not self.opens_at or not self.closes_at:
+                raise ValidationError('Opening and closing times are required unless the facility is closed')
+            if self.closes_at <= self.opens_at:
+                raise ValidationError('Closing time must be after opening time')
+
+    def __str__(self):
+        return f"{self.date}: {'closed' if self.closed else f'{self.opens_at}-{self.closes_at}'}"
+
 class Booking(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
         ('cancelled', 'Cancelled'),
+        ('expired', 'Expired'),
     ]
 
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='bookings')
@@ -74,16 +148,15 @@ class Booking(models.Model):
         ordering = ['-date', '-start_time']
         verbose_name = "Booking"
         verbose_name_plural = "Bookings"
-        constraints = [
-            models.UniqueConstraint(
-                fields=['facility', 'date', 'start_time'],
-                name='unique_booking_time_slot'
-            )
-        ]
+        # Slot capacity is enforced by SlotSeats counters (see booking.seats)
         indexes = [
             models.Index(fields=['date', 'status']),
             models.Index(fields=['user', 'status']),
             models.Index(fields=['facility', 'date']),
+            # Incremental rollups scan by modification time (booking.rollups)
+            models.Index(fields=['updated_at']),
+            # Reminders scan confirmed bookings by start (booking.reminders)
+            models.Index(fields=['status', 'date', 'start_time']),
         ]
 
     def __str__(self):
@@ -108,30 +181,172 @@ class Booking(models.Model):
         if self.end_time <= self.start_time:
             raise ValidationError('End time must be after start time')
 
-        # Check for overlapping bookings
-        overlapping = Booking.objects.filter(
-            facility=self.facility,
-            date=self.date,
-            status='confirmed'
-        ).exclude(id=self.id).filter(
-            models.Q(start_time__lt=self.end_time) & 
-            models.Q(end_time__gt=self.start_time)
-        )
-
-        if overlapping.exists():
-            raise ValidationError('This time slot is already booked')
-
-        # Check facility capacity
-        concurrent_bookings = Booking.objects.filter(
-            facility=self.facility,
-            date=self.date,
-            status='confirmed',
-            start_time=self.start_time
-        ).exclude(id=self.id).count()
-
-        if concurrent_bookings >= self.facility.capacity:
-            raise ValidationError('Facility is at full capacity for this time slot')
-
     def save(self, *args, **kwargs):
+        from . import seats
+
         self.full_clean()
-        super().save(*args, **kwargs) 
\ No newline at end of file
+        # Seats are checked and taken by seats.admit() (SlotFull when none is left);
+        # taking the seats and writing the booking succeed or fail together
+        with transaction.atomic():
+            seats.admit(self)
+            super().save(*args, **kwargs)
+
+class SlotSeats(models.Model):
+    """Seats taken in one slot of a facility's grid; maintained by booking.seats."""
+    facility = models.ForeignKey(Facility, on_delete=models.CASCADE, related_name='slot_seats')
+    date = models.DateField()
+    start_time = models.TimeField()
+    seats_taken = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Slot seats"
+        verbose_name_plural = "Slot seats"
+        constraints = [
+            models.UniqueConstraint(fields=['facility', 'date', 'start_time'], name='unique_slot_seats')
+        ]
+
+    def __str__(self):
+        return f"{self.facility_id} {self.date} {self.start_time}: {self.seats_taken}"
+
+class BookingReminder(models.Model):
+    """
+    Sent marker of one reminder of a booking; maintained by booking.reminders.
+    Claimed (sent_at empty) before the email goes out, so a reminder is sent once.
+    """
+    # No database constraint: booking_booking is partitioned on PostgreSQL. Markers
+    # are only read until the booking starts; archive_bookings purges old ones
+    # instead of every booking delete cascading here.
+    booking = models.ForeignKey(Booking, on_delete=models.DO_NOTHING, related_name='reminders', db_constraint=False)
+    kind = models.CharField(max_length=10)
+    batch = models.UUIDField(db_index=True)
+    claimed_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['booking', 'kind'], name='unique_booking_reminder')
+        ]
+
+    def __str__(self):
+        return f"{self.booking_id} {self.kind}: {self.sent_at or 'claimed'}"
+
+class ArchivedBooking(models.Model):
+    """Past and cancelled bookings moved out of the hot booking table by booking.archive."""
+    original_id = models.BigIntegerField(unique=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='archived_bookings')
+    facility = models.ForeignKey(Facility, on_delete=models.CASCADE, related_name='archived_bookings')
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date', '-start_time']
+        verbose_name = "Archived booking"
+        verbose_name_plural = "Archived bookings"
+        indexes = [
+            models.Index(fields=['user', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.facility.name} - {self.date} ({self.start_time}-{self.end_time})"
+
+class BookingRollup(models.Model):
+    """Bookings per facility, day, hour and status; maintained by booking.rollups."""
+    facility = models.ForeignKey(Facility, on_delete=models.CASCADE, related_name='rollups')
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    # Bookings starting in the hour (so totals add up) and minutes of the hour booked
+    bookings = models.PositiveIntegerField(default=0)
+    booked_minutes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facility', 'date', 'hour', 'status'], name='unique_booking_rollup')
+        ]
+        indexes = [
+            models.Index(fields=['date', 'facility']),
+        ]
+
+    def __str__(self):
+        return f"{self.facility_id} {self.date} {self.hour:02d}:00 {self.status}: {self.bookings}"
+
+class RollupWatermark(models.Model):
+    """Latest Booking.updated_at a rollup has processed."""
+    name = models.CharField(max_length=50, unique=True)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.updated_at}"
+
+class IdempotencyKey(models.Model):
+    """Stored response of an Idempotency-Key; booking.idempotency's fallback when Redis is down."""
+    key = models.CharField(max_length=100, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    # Empty until the first request has a response
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    location = models.TextField(blank=True)
+    body = models.BinaryField(default=b'')
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.status_code or 'in progress'}"
+
+class BookingEvent(models.Model):
+    """One entry of a booking's append-only history; written in batches by booking.audit."""
+    ACTION_CHOICES = [
+        ('created', 'Created'),
+        ('status_changed', 'Status changed'),
+        ('rescheduled', 'Rescheduled'),
+        ('deleted', 'Deleted'),
+        ('archived', 'Archived'),
+    ]
+
+    # No database constraint: booking_booking is partitioned on PostgreSQL, and
+    # the history outlives deleted and archived (ArchivedBooking.original_id) bookings
+    booking = models.ForeignKey(Booking, on_delete=models.DO_NOTHING, related_name='events', db_constraint=False)
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20, blank=True)
+    # The booking's slot after the event (before it, for deletes)
+    date = models.DateField(null=True, blank=True)
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    actor = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Request ("POST /bookings/1/delete/") or task that made the change
+    source = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['booking', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.booking_id} {self.action}: {self.from_status or '-'} -> {self.to_status or '-'}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Booking events are append-only')
+        super().save(*args, **kwargs)
+
+class APIToken(models.Model):
+    """Bearer token of a JSON API client; only its digest is stored (see booking.api_tokens)."""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='api_tokens')
+    name = models.CharField(max_length=100, blank=True)
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "API token"
+        verbose_name_plural = "API tokens"
+
+    def __str__(self):
+        return f"{self.user} {self.name or self.pk}"
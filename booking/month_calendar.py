@@ -0,0 +1,94 @@
+"""
+Month calendars of slot occupancy per facility.
+
+A month costs one query: occupying bookings grouped by date and time range
+(``GROUP BY date, start_time, end_time``). The grouped rows are cached per
+(facility, month) for ``CALENDAR_CACHE_SECONDS`` and deleted whenever a
+booking of that facility and month changes (``events.publish_on_commit``
+covers every booking write path). Slot grids and capacity are applied when
+the calendar is built, so schedule and capacity changes need no
+invalidation here.
+
+The rows are always read from the primary: a lagging replica would cache a
+stale month right after the invalidation.
+"""
+import calendar
+from collections import defaultdict
+from datetime import date as date_cls, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+
+from . import schedules
+from .availability import OCCUPYING_STATUSES, slot_capacity
+from .intervals import IntervalIndex
+from .models import Booking
+from .routers import use_primary
+
+
+def parse_month(value):
+    """(year, month) from 'YYYY-MM'. Raises ValueError."""
+    year, month = (int(part) for part in value.split('-'))
+    date_cls(year, month, 1)
+    return year, month
+
+
+def month_days(year, month):
+    first = date_cls(year, month, 1)
+    return [first + timedelta(days=offset) for offset in range(calendar.monthrange(year, month)[1])]
+
+
+def cache_key(facility_id, year, month):
+    return f'month_calendar:{facility_id}:{year:04d}-{month:02d}'
+
+
+def invalidate(facility_id, date):
+    if isinstance(date, str):
+        date = date_cls.fromisoformat(date)
+    cache.delete(cache_key(facility_id, date.year, date.month))
+
+
+def month_occupancy(facility_id, year, month):
+    """[(date, start_time, end_time, bookings)] of the occupying bookings in the month."""
+    key = cache_key(facility_id, year, month)
+    rows = cache.get(key)
+    if rows is None:
+        days = month_days(year, month)
+        with use_primary():
+            rows = list(
+                Booking.objects.filter(
+                    facility_id=facility_id,
+                    date__gte=days[0],
+                    date__lte=days[-1],
+                    status__in=OCCUPYING_STATUSES,
+                )
+                .values_list('date', 'start_time', 'end_time')
+                .annotate(bookings=models.Count('id'))
+                .order_by()
+            )
+        cache.set(key, rows, settings.CALENDAR_CACHE_SECONDS)
+    return rows
+
+
+def month_calendar(facility, year, month):
+    """Per-day slot occupancy of facility for the month, one dict per day."""
+    intervals = defaultdict(list)
+    for date, start_time, end_time, bookings in month_occupancy(facility.id, year, month):
+        intervals[date].extend([(start_time, end_time)] * bookings)
+    capacity = slot_capacity(facility)
+
+    days = []
+    for date in month_days(year, month):
+        index = IntervalIndex(intervals[date]) if date in intervals else None
+        slots = []
+        for start, end in schedules.slot_grid(facility.id, date):
+            booked = index.peak(start, end) if index is not None else 0
+            slots.append({'start_time': start, 'end_time': end, 'booked': booked, 'free': max(capacity - booked, 0)})
+        days.append({
+            'date': date,
+            'slots': slots,
+            'free_slots': sum(1 for slot in slots if slot['free']),
+            'closed': not slots,
+        })
+    return days
@@ -0,0 +1,95 @@
+"""
+Earliest free slots across a set of facilities.
+
+Occupancy is read in date-ordered chunks of ``NEXT_SLOT_CHUNK_DAYS`` (one
+query per chunk for all facilities) and the scan stops as soon as enough
+free slots were found, so a search that succeeds tomorrow costs one query
+no matter how much booking history lies ahead.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import schedules
+from .availability import OCCUPYING_STATUSES, slot_capacity
+from .intervals import IntervalIndex
+from .models import Booking
+
+
+class FreeSlot:
+    def __init__(self, facility, date, start_time, end_time):
+        self.facility = facility
+        self.date = date
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def as_dict(self):
+        return {
+            'facility': self.facility.id,
+            'facility_name': self.facility.name,
+            'date': self.date,
+            'start_time': self.start_time.strftime('%H:%M'),
+            'end_time': self.end_time.strftime('%H:%M'),
+        }
+
+
+def _chunk_indexes(facility_ids, first_day, last_day):
+    """{(facility_id, date): IntervalIndex} of occupying bookings between two days."""
+    intervals = {}
+    bookings = Booking.objects.filter(
+        facility_id__in=facility_ids,
+        date__gte=first_day,
+        date__lte=last_day,
+        status__in=OCCUPYING_STATUSES,
+    ).values_list('facility_id', 'date', 'start_time', 'end_time')
+    for facility_id, date, start_time, end_time in bookings:
+        intervals.setdefault((facility_id, date), []).append((start_time, end_time))
+    return {key: IntervalIndex(value) for key, value in intervals.items()}
+
+
+def _free_slots_on(facilities, date, indexes, after=None, earliest=None, latest=None):
+    """Free slots of all facilities on date, in start time order."""
+    slots = []
+    for facility in facilities:
+        index = indexes.get((facility.id, date))
+        capacity = slot_capacity(facility)
+        for start, end in schedules.slot_grid(facility.id, date):
+            if after is not None and start < after:
+                continue
+            if earliest is not None and start < earliest:
+                continue
+            if latest is not None and start > latest:
+                break
+            if index is None or index.fits(start, end, capacity):
+                slots.append(FreeSlot(facility, date, start, end))
+    slots.sort(key=lambda slot: (slot.start_time, slot.facility.name, slot.facility.id))
+    return slots
+
+
+def next_available_slots(facilities, count=5, start=None, until=None, earliest=None, latest=None):
+    """
+    The first ``count`` free slots from ``start`` (a datetime, default now) up
+    to ``until`` (a date, default NEXT_SLOT_HORIZON_DAYS ahead), optionally
+    only starting between ``earliest`` and ``latest`` o'clock.
+    """
+    facilities = list(facilities)
+    start = start or timezone.now()
+    until = until or start.date() + timedelta(days=settings.NEXT_SLOT_HORIZON_DAYS)
+    chunk = timedelta(days=settings.NEXT_SLOT_CHUNK_DAYS)
+    found = []
+    if not facilities:
+        return found
+
+    facility_ids = [facility.id for facility in facilities]
+    first_day = start.date()
+    while first_day <= until and len(found) < count:
+        last_day = min(first_day + chunk - timedelta(days=1), until)
+        indexes = _chunk_indexes(facility_ids, first_day, last_day)
+        day = first_day
+        while day <= last_day and len(found) < count:
+            after = start.time() if day == start.date() else None
+            found.extend(_free_slots_on(facilities, day, indexes, after, earliest, latest)[:count - len(found)])
+            day += timedelta(days=1)
+        first_day = last_day + timedelta(days=1)
+    return found
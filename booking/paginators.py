@@ -0,0 +1,38 @@
+"""
+Paginators for very large tables.
+
+``EstimatedCountPaginator`` asks the PostgreSQL planner for the row count
+(``EXPLAIN``) instead of running ``COUNT(*)``. Estimates at or below
+``ADMIN_EXACT_COUNT_LIMIT`` rows are replaced by an exact count, which is
+cheap at that size, so small and well-filtered result sets still show exact
+numbers. Other databases always count exactly.
+"""
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimated_count(queryset):
+    """The planner's row estimate for queryset on PostgreSQL, otherwise None."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate > settings.ADMIN_EXACT_COUNT_LIMIT:
+            return estimate
+        return super().count
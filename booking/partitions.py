@@ -0,0 +1,132 @@
+"""
+Monthly range partitioning of booking_booking on PostgreSQL.
+
+The parent table is partitioned by ``date``; each month lives in
+``booking_booking_pYYYY_MM`` and anything outside the managed range falls
+into ``booking_booking_default``. Other database backends keep the plain
+table and every function here is a no-op.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+PARENT_TABLE = 'booking_booking'
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+
+
+def is_supported(conn=None):
+    return (conn or connection).vendor == 'postgresql'
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(day):
+    return f'{PARENT_TABLE}_p{day.year:04d}_{day.month:02d}'
+
+
+def month_range(start, end):
+    """Yield the first day of every month from start up to and including end."""
+    current = month_start(start)
+    while current <= end:
+        yield current
+        current = add_months(current, 1)
+
+
+def attached_partitions(conn=None):
+    """Return {table_name: partition bound expression} for the attached partitions."""
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [PARENT_TABLE],
+        )
+        return dict(cursor.fetchall())
+
+
+def create_month_partition(month, conn=None):
+    """
+    Create and attach the partition for ``month``.
+
+    Rows that already landed in the default partition for that month are moved
+    across first, otherwise PostgreSQL refuses to attach the new range.
+    """
+    conn = conn or connection
+    name = partition_name(month)
+    lower, upper = month, add_months(month, 1)
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+        if DEFAULT_PARTITION in attached_partitions(conn):
+            cursor.execute(
+                f'INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s',
+                [lower, upper],
+            )
+            cursor.execute(
+                f'DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s',
+                [lower, upper],
+            )
+        cursor.execute(
+            f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+            [lower, upper],
+        )
+    return name
+
+
+def ensure_future_partitions(months_ahead=None, today=None, conn=None):
+    """Create any missing monthly partitions from this month to months_ahead. Returns the new names."""
+    conn = conn or connection
+    if not is_supported(conn):
+        return []
+    if months_ahead is None:
+        months_ahead = settings.BOOKING_PARTITION_MONTHS_AHEAD
+    today = today or timezone.now().date()
+    existing = attached_partitions(conn)
+    created = []
+    for month in month_range(today, add_months(today, months_ahead)):
+        if partition_name(month) not in existing:
+            created.append(create_month_partition(month, conn))
+    return created
+
+
+def detach_old_partitions(retain_months=None, drop=False, today=None, conn=None):
+    """
+    Detach monthly partitions that end before the retention window.
+
+    Detached tables are kept as standalone tables unless ``drop`` is set.
+    Returns the affected table names.
+    """
+    conn = conn or connection
+    if not is_supported(conn):
+        return []
+    if retain_months is None:
+        retain_months = settings.BOOKING_PARTITION_RETAIN_MONTHS
+    cutoff = add_months(month_start(today or timezone.now().date()), -retain_months)
+    detached = []
+    for name in sorted(attached_partitions(conn)):
+        if name == DEFAULT_PARTITION:
+            continue
+        year, month = name.rsplit('_p', 1)[1].split('_')
+        if add_months(date(int(year), int(month), 1), 1) > cutoff:
+            continue
+        with conn.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}')
+            if drop:
+                cursor.execute(f'DROP TABLE {name}')
+        detached.append(name)
+    return detached
@@ -0,0 +1,156 @@
+"""
+Token-bucket rate limiting for expensive endpoints.
+
+Limits are configured per URL name in ``settings.RATELIMITS``::
+
+    RATELIMITS = {
+        'booking:available_slots': {'rate': '60/m', 'burst': 20, 'key': 'user_or_ip'},
+        'booking:booking_create': {'rate': '10/m', 'burst': 5, 'key': 'user', 'methods': ['POST']},
+    }
+
+``rate`` is the refill rate, ``burst`` the bucket size (defaults to the rate's
+count) and ``key`` one of ``user``, ``ip`` or ``user_or_ip``. Buckets live in
+Redis (atomic Lua script) or, for tests and development, in process memory.
+"""
+import logging
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+from redis import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'30/m' -> (30, 60)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class MemoryBackend:
+    """Process-local buckets; fine for tests and a single development server."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, capacity, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return True, 0.0
+            self._buckets[key] = (tokens, now)
+            return False, (1 - tokens) / rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisBackend:
+    """Buckets stored as Redis hashes, refilled and consumed atomically in Lua."""
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local allowed = 0
+    local retry_after = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    else
+        retry_after = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+    return {allowed, tostring(retry_after)}
+    """
+
+    def __init__(self):
+        self.client = Redis.from_url(
+            settings.RATELIMIT_REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+        )
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def consume(self, key, rate, capacity, now=None):
+        now = time.time() if now is None else now
+        try:
+            allowed, retry_after = self.script(keys=[f'ratelimit:{key}'], args=[rate, capacity, now])
+        except RedisError:
+            # Fail open: an unavailable limiter must not take the site down
+            logger.warning('Rate limiter unavailable, allowing request', exc_info=True)
+            return True, 0.0
+        return bool(allowed), float(retry_after)
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend():
+    path = settings.RATELIMIT_BACKEND
+    with _backends_lock:
+        if path not in _backends:
+            _backends[path] = import_string(path)()
+        return _backends[path]
+
+
+def client_key(request, key_type):
+    user = getattr(request, 'user', None)
+    if key_type in ('user', 'user_or_ip') and user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def check(request, name, config):
+    """Consume one token for this request. Returns None or a 429 response."""
+    if request.method not in config.get('methods', [request.method]):
+        return None
+    count, period = parse_rate(config['rate'])
+    capacity = config.get('burst', count)
+    key = f"{name}:{client_key(request, config.get('key', 'user_or_ip'))}"
+    allowed, retry_after = get_backend().consume(key, count / period, capacity)
+    if allowed:
+        return None
+    response = JsonResponse({'error': 'Too many requests'}, status=429)
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def ratelimit(rate, burst=None, key='user_or_ip', methods=None):
+    """Decorator form for views that are not covered by settings.RATELIMITS."""
+    config = {'rate': rate, 'key': key}
+    if burst is not None:
+        config['burst'] = burst
+    if methods is not None:
+        config['methods'] = methods
+
+    def decorator(view_func):
+        name = f'{view_func.__module__}.{view_func.__qualname__}'
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if settings.RATELIMIT_ENABLED:
+                limited = check(request, name, config)
+                if limited is not None:
+                    return limited
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,132 @@
+"""
+Reminder emails before confirmed bookings (e.g. 24 hours and 1 hour ahead).
+
+A beat task runs ``schedule_reminders`` every few minutes. For each kind in
+``BOOKING_REMINDERS`` it selects the confirmed bookings starting within the
+last ``REMINDER_CATCH_UP`` before ``now + lead`` (a range scan on the
+``(status, date, start_time)`` index) that have no ``BookingReminder`` of
+that kind yet. Those are claimed in batches of ``REMINDER_BATCH_SIZE`` by
+inserting marker rows tagged with a batch id, and one task per batch is
+queued. Nothing is scheduled per booking, so the broker only ever holds a
+few batch messages.
+
+``send_reminder_batch`` sends a batch over one mail connection and stamps
+the markers. A batch that fails to send releases its claims so the next run
+picks the bookings up again; claims a dead worker left behind expire after
+``REMINDER_STALE_CLAIM``.
+"""
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import models
+from django.utils import timezone
+
+from .models import Booking, BookingReminder
+
+
+def starting_between(queryset, start, end):
+    """Bookings starting in (start, end], as a range over (date, start_time)."""
+    if start.date() == end.date():
+        return queryset.filter(date=start.date(), start_time__gt=start.time(), start_time__lte=end.time())
+    return queryset.filter(
+        models.Q(date=start.date(), start_time__gt=start.time())
+        | models.Q(date__gt=start.date(), date__lt=end.date())
+        | models.Q(date=end.date(), start_time__lte=end.time())
+    )
+
+
+def due_reminders(kind, lead, now):
+    """Confirmed bookings due a reminder of kind that none was claimed for yet."""
+    window_end = now + lead
+    window_start = max(window_end - settings.REMINDER_CATCH_UP, now)
+    claimed = BookingReminder.objects.filter(booking=models.OuterRef('pk'), kind=kind)
+    return starting_between(Booking.objects.filter(status='confirmed'), window_start, window_end).filter(
+        ~models.Exists(claimed)
+    )
+
+
+def claim(kind, booking_ids):
+    """Claim reminders for booking_ids; bookings claimed concurrently are skipped. Returns the batch id."""
+    batch = uuid4()
+    BookingReminder.objects.bulk_create(
+        [BookingReminder(booking_id=booking_id, kind=kind, batch=batch) for booking_id in booking_ids],
+        ignore_conflicts=True,
+    )
+    return batch
+
+
+def schedule_reminders(now=None, batch_size=None):
+    """Claim every due reminder and queue one send task per batch. Returns the number claimed."""
+    from .tasks import send_reminder_batch
+
+    now = now or timezone.now()
+    batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+    BookingReminder.objects.filter(
+        sent_at__isnull=True, claimed_at__lt=now - settings.REMINDER_STALE_CLAIM
+    ).delete()
+
+    claimed = 0
+    for kind, lead in settings.BOOKING_REMINDERS.items():
+        booking_ids = list(due_reminders(kind, lead, now).order_by().values_list('pk', flat=True))
+        for index in range(0, len(booking_ids), batch_size):
+            chunk = booking_ids[index:index + batch_size]
+            send_reminder_batch.delay(str(claim(kind, chunk)))
+            claimed += len(chunk)
+    return claimed
+
+
+def reminder_message(reminder):
+    booking = reminder.booking
+    return EmailMessage(
+        f'Booking Reminder - {booking.facility.name}',
+        f"""
+        Dear {booking.user.username},
+
+        This is a reminder of your upcoming booking:
+        Facility: {booking.facility.name}
+        Date: {booking.date}
+        Time: {booking.start_time} - {booking.end_time}
+
+        See you soon!
+        """,
+        settings.DEFAULT_FROM_EMAIL,
+        [booking.user.email],
+    )
+
+
+def send_reminder_batch(batch):
+    """
+    Send the claimed reminders of a batch over one mail connection. Returns
+    the number sent. Each reminder is stamped as soon as its email went out,
+    so a failure part-way only releases the ones not sent yet.
+    """
+    reminders = list(
+        BookingReminder.objects.filter(batch=batch, sent_at__isnull=True)
+        .select_related('booking__user', 'booking__facility')
+    )
+    # Bookings cancelled since they were claimed need no reminder
+    cancelled = [reminder.pk for reminder in reminders if reminder.booking.status != 'confirmed']
+    BookingReminder.objects.filter(pk__in=cancelled).delete()
+    reminders = [reminder for reminder in reminders if reminder.pk not in cancelled]
+
+    # Nothing to send without an address; they count as done
+    unreachable = [reminder.pk for reminder in reminders if not reminder.booking.user.email]
+    BookingReminder.objects.filter(pk__in=unreachable).update(sent_at=timezone.now())
+    pending = [reminder for reminder in reminders if reminder.pk not in unreachable]
+    if not pending:
+        return 0
+
+    sent = 0
+    connection = get_connection()
+    try:
+        connection.open()
+        for reminder in pending:
+            sent += connection.send_messages([reminder_message(reminder)]) or 0
+            BookingReminder.objects.filter(pk=reminder.pk).update(sent_at=timezone.now())
+    except Exception:
+        BookingReminder.objects.filter(batch=batch, sent_at__isnull=True).delete()
+        raise
+    finally:
+        connection.close()
+    return sent
@@ -0,0 +1,161 @@
+"""
+Hourly utilization rollups for reporting.
+
+``refresh_rollups`` reads only the bookings whose ``updated_at`` passed the
+stored watermark, collects the (facility, day) pairs they touch and rebuilds
+the ``BookingRollup`` rows of just those days. Reads go to a replica when one
+is configured, so reports and the dashboard never load the primary's booking
+table. Days are rebuilt from live and archived bookings, so archiving does
+not change the numbers.
+
+The watermark trails the newest ``updated_at`` seen by
+``ROLLUP_WATERMARK_OVERLAP_SECONDS``: a transaction that commits late (or a
+lagging replica) is still picked up on the next run, and rebuilding a day
+twice is harmless. Hard-deleted bookings leave a day's rollups the next time
+the day is rebuilt; ``refresh_rollups --since`` rebuilds a range on demand.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+
+from .intervals import to_minutes
+from .models import ArchivedBooking, Booking, BookingRollup, Facility, RollupWatermark
+from .routers import read_from_replica
+
+WATERMARK_NAME = 'booking_rollups'
+DAYS_PER_BATCH = 200
+
+
+def hour_spans(start_time, end_time):
+    """(hour, minutes of that hour covered) for [start_time, end_time)."""
+    start, end = to_minutes(start_time), to_minutes(end_time)
+    return [
+        (hour, min(end, (hour + 1) * 60) - max(start, hour * 60))
+        for hour in range(start // 60, (end + 59) // 60)
+    ]
+
+
+def _day_rows(days):
+    """Booking values rows (live and archived) for a set of (facility_id, date) pairs."""
+    facility_ids = {facility_id for facility_id, _ in days}
+    dates = {date for _, date in days}
+    fields = ('facility_id', 'date', 'start_time', 'end_time', 'status')
+    for model in (Booking, ArchivedBooking):
+        for row in model.objects.filter(facility_id__in=facility_ids, date__in=dates).values_list(*fields):
+            if (row[0], row[1]) in days:
+                yield row
+
+
+def rebuild_days(days):
+    """Replace the rollups of the given (facility_id, date) pairs. Returns rows written."""
+    days = set(days)
+    if not days:
+        return 0
+    with read_from_replica():
+        rows = list(_day_rows(days))
+
+    totals = defaultdict(lambda: [0, 0])
+    for facility_id, date, start_time, end_time, status in rows:
+        for position, (hour, minutes) in enumerate(hour_spans(start_time, end_time)):
+            total = totals[(facility_id, date, hour, status)]
+            total[0] += position == 0
+            total[1] += minutes
+
+    rollups = [
+        BookingRollup(
+            facility_id=facility_id, date=date, hour=hour, status=status,
+            bookings=count, booked_minutes=minutes,
+        )
+        for (facility_id, date, hour, status), (count, minutes) in totals.items()
+    ]
+    stale = models.Q()
+    for facility_id, date in days:
+        stale |= models.Q(facility_id=facility_id, date=date)
+    with transaction.atomic():
+        BookingRollup.objects.filter(stale).delete()
+        BookingRollup.objects.bulk_create(rollups)
+    return len(rollups)
+
+
+def _rebuild_in_batches(days):
+    days = sorted(days)
+    for index in range(0, len(days), DAYS_PER_BATCH):
+        rebuild_days(days[index:index + DAYS_PER_BATCH])
+
+
+def refresh_rollups(since=None):
+    """
+    Rebuild the days touched by bookings changed since the watermark (or since
+    ``since``, a date, for a manual rebuild). Returns the number of days rebuilt.
+    """
+    watermark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+    changed = Booking.objects.all()
+    if since is not None:
+        changed = changed.filter(date__gte=since)
+    elif watermark.updated_at is not None:
+        changed = changed.filter(updated_at__gt=watermark.updated_at)
+
+    with read_from_replica():
+        newest = changed.aggregate(newest=models.Max('updated_at'))['newest']
+        days = set(changed.values_list('facility_id', 'date').distinct().order_by())
+    if since is not None:
+        days |= set(
+            ArchivedBooking.objects.filter(date__gte=since).values_list('facility_id', 'date').distinct().order_by()
+        )
+    _rebuild_in_batches(days)
+
+    if newest is not None:
+        trailing = newest - timedelta(seconds=settings.ROLLUP_WATERMARK_OVERLAP_SECONDS)
+        if watermark.updated_at is None or trailing > watermark.updated_at:
+            watermark.updated_at = trailing
+            watermark.save(update_fields=['updated_at'])
+    return len(days)
+
+
+def utilization_report(first_day, last_day):
+    """
+    Per-facility totals between two days, read from the rollups only.
+    Utilization is occupied seat-minutes over the seat-minutes on offer.
+    """
+    from . import schedules
+    from .availability import OCCUPYING_STATUSES
+
+    facilities = {facility.id: facility for facility in Facility.objects.order_by('name')}
+    report = {
+        facility_id: {
+            'facility': facility,
+            'statuses': {status: 0 for status, _ in Booking.STATUS_CHOICES},
+            'booked_minutes': 0,
+            'offered_minutes': 0,
+        }
+        for facility_id, facility in facilities.items()
+    }
+    hours = defaultdict(int)
+    rollups = BookingRollup.objects.filter(date__gte=first_day, date__lte=last_day).values(
+        'facility_id', 'hour', 'status'
+    ).annotate(total=models.Sum('bookings'), minutes=models.Sum('booked_minutes'))
+    for row in rollups:
+        entry = report.get(row['facility_id'])
+        if entry is None:
+            continue
+        entry['statuses'][row['status']] += row['total']
+        if row['status'] in OCCUPYING_STATUSES:
+            entry['booked_minutes'] += row['minutes']
+            hours[row['hour']] += row['minutes']
+
+    day = first_day
+    while day <= last_day:
+        for facility_id, entry in report.items():
+            grid_minutes = sum(
+                to_minutes(end) - to_minutes(start) for start, end in schedules.slot_grid(facility_id, day)
+            )
+            entry['offered_minutes'] += grid_minutes * entry['facility'].seats_per_slot
+        day += timedelta(days=1)
+
+    for entry in report.values():
+        offered = entry['offered_minutes']
+        entry['utilization'] = round(100 * entry['booked_minutes'] / offered, 1) if offered else 0
+    busiest = sorted(hours.items(), key=lambda item: -item[1])[:5]
+    return list(report.values()), busiest
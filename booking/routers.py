@@ -0,0 +1,97 @@
+import random
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Read-only views opt in to replica reads; everything else stays on the primary
+_replica_reads = ContextVar('replica_reads', default=False)
+# Set when the client recently wrote (read-your-writes) or the code needs fresh data
+_pinned = ContextVar('pinned_to_primary', default=False)
+# Set when the current request wrote to a replicated model
+_wrote = ContextVar('wrote_to_primary', default=False)
+
+
+class read_from_replica(ContextDecorator):
+    """Allow reads inside the block (or decorated view) to go to a replica."""
+
+    def _recreate_cm(self):
+        # A fresh instance per call keeps decorated views thread-safe
+        return type(self)()
+
+    def __enter__(self):
+        self._token = _replica_reads.set(True)
+        return self
+
+    def __exit__(self, *exc):
+        _replica_reads.reset(self._token)
+        return False
+
+
+class use_primary(ContextDecorator):
+    """Force reads inside the block to the primary, e.g. for booking validation."""
+
+    def _recreate_cm(self):
+        return type(self)()
+
+    def __enter__(self):
+        self._token = _pinned.set(True)
+        return self
+
+    def __exit__(self, *exc):
+        _pinned.reset(self._token)
+        return False
+
+
+def start_request(pinned=False):
+    """Reset the routing state for a new request and return a token for end_request."""
+    return (_replica_reads.set(False), _pinned.set(pinned), _wrote.set(False))
+
+
+def end_request(tokens):
+    replica_token, pinned_token, wrote_token = tokens
+    _replica_reads.reset(replica_token)
+    _pinned.reset(pinned_token)
+    _wrote.reset(wrote_token)
+
+
+def wrote_to_primary():
+    return _wrote.get()
+
+
+def get_replicas():
+    return list(getattr(settings, 'REPLICA_DATABASES', []))
+
+
+class ReplicaRouter:
+    """
+    Sends reads of booking models to a replica when the caller opted in
+    with read_from_replica and the client is not pinned to the primary.
+    All writes, migrations and unrouted apps use the default database.
+    """
+
+    def _is_routed(self, model):
+        return model._meta.app_label in getattr(settings, 'REPLICA_ROUTED_APPS', ['booking'])
+
+    def db_for_read(self, model, **hints):
+        if not self._is_routed(model):
+            return None
+        if _pinned.get() or not _replica_reads.get():
+            return DEFAULT_DB_ALIAS
+        replicas = get_replicas()
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if self._is_routed(model):
+            _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
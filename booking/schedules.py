@@ -0,0 +1,195 @@
+"""
+Per-facility slot grids.
+
+A facility's ``FacilitySchedule`` (weekday opening hours, slot length and
+dated exceptions such as holidays) is compiled once into ready-made grids of
+``(start_time, end_time)`` pairs and kept in process memory, so building the
+booking form or checking a slot is a dictionary lookup instead of a
+recomputation. Facilities without a schedule use the default grid: hourly
+slots from 09:00 to 18:00 every day.
+
+Saving a schedule clears the cache of the process that saved it (see
+booking.signals); other processes pick the change up within
+``SCHEDULE_CACHE_SECONDS``.
+"""
+import threading
+import time
+from datetime import datetime, time as time_cls, timedelta
+
+from django.conf import settings
+
+DEFAULT_OPENS_AT = time_cls(9, 0)
+DEFAULT_CLOSES_AT = time_cls(18, 0)
+DEFAULT_SLOT_MINUTES = 60
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def build_grid(opens_at, closes_at, slot_minutes):
+    """Consecutive slots that fit between opens_at and closes_at."""
+    day = datetime(2000, 1, 1)
+    start = datetime.combine(day, opens_at)
+    closes = datetime.combine(day, closes_at)
+    length = timedelta(minutes=slot_minutes)
+    slots = []
+    while start + length <= closes:
+        slots.append((start.time(), (start + length).time()))
+        start += length
+    return tuple(slots)
+
+
+DEFAULT_GRID = build_grid(DEFAULT_OPENS_AT, DEFAULT_CLOSES_AT, DEFAULT_SLOT_MINUTES)
+
+
+class CompiledSchedule:
+    def __init__(self, weekly, exceptions):
+        # weekday -> grid, date -> grid
+        self.weekly = weekly
+        self.exceptions = exceptions
+
+    def grid(self, date):
+        if date in self.exceptions:
+            return self.exceptions[date]
+        return self.weekly.get(date.weekday(), ())
+
+    def _slots(self):
+        grids = list(self.weekly.values()) + list(self.exceptions.values())
+        return {slot for grid in grids for slot in grid}
+
+    def start_times(self):
+        return {start for start, _ in self._slots()}
+
+    def end_times(self):
+        return {end for _, end in self._slots()}
+
+
+DEFAULT_SCHEDULE = CompiledSchedule({weekday: DEFAULT_GRID for weekday in range(7)}, {})
+
+
+def compile_schedule(schedule):
+    """CompiledSchedule for a FacilitySchedule with prefetched hours and exceptions."""
+    hours = list(schedule.opening_hours.all())
+    weekly = {}
+    if hours:
+        for opening in hours:
+            grid = build_grid(opening.opens_at, opening.closes_at, schedule.slot_minutes)
+            weekly[opening.weekday] = weekly.get(opening.weekday, ()) + grid
+    else:
+        weekly = {
+            weekday: build_grid(DEFAULT_OPENS_AT, DEFAULT_CLOSES_AT, schedule.slot_minutes)
+            for weekday in range(7)
+        }
+    exceptions = {}
+    for exception in schedule.exceptions.all():
+        if exception.closed:
+            exceptions[exception.date] = ()
+        else:
+            exceptions[exception.date] = build_grid(
+                exception.opens_at, exception.closes_at, schedule.slot_minutes
+            )
+    return CompiledSchedule(weekly, exceptions)
+
+
+class _Grids:
+    def __init__(self, schedules, start_times, end_times):
+        self.schedules = schedules
+        self.start_times = start_times
+        self.end_times = end_times
+
+
+def _load():
+    from .models import Facility, FacilitySchedule
+
+    schedules = {
+        schedule.facility_id: compile_schedule(schedule)
+        for schedule in FacilitySchedule.objects.prefetch_related('opening_hours', 'exceptions')
+    }
+    compiled = list(schedules.values())
+    # Facilities without a schedule use the default grid
+    if not schedules or Facility.objects.exclude(pk__in=list(schedules)).exists():
+        compiled.append(DEFAULT_SCHEDULE)
+    start_times = set().union(*(schedule.start_times() for schedule in compiled))
+    end_times = set().union(*(schedule.end_times() for schedule in compiled))
+    return _Grids(
+        schedules,
+        sorted(start.strftime('%H:%M') for start in start_times),
+        sorted(end.strftime('%H:%M') for end in end_times),
+    )
+
+
+def _grids():
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get('grids')
+        if entry is not None and entry[0] > now:
+            return entry[1]
+    grids = _load()
+    with _cache_lock:
+        _cache['grids'] = (now + settings.SCHEDULE_CACHE_SECONDS, grids)
+    return grids
+
+
+def invalidate():
+    with _cache_lock:
+        _cache.clear()
+
+
+def scheduled_facilities():
+    """{facility_id: CompiledSchedule} for the facilities that have a schedule."""
+    return _grids().schedules
+
+
+def get_schedule(facility_id):
+    return _grids().schedules.get(facility_id, DEFAULT_SCHEDULE)
+
+
+def slot_grid(facility_id, date):
+    """(start_time, end_time) pairs bookable at the facility on date."""
+    return get_schedule(facility_id).grid(date)
+
+
+def slot_end(facility_id, date, start_time):
+    """End time of the slot starting at start_time, or None if there is no such slot."""
+    for start, end in slot_grid(facility_id, date):
+        if start == start_time:
+            return end
+    return None
+
+
+def slot_span(facility_id, date, start_time, end_time=None):
+    """
+    Consecutive grid slots from start_time up to end_time (one slot when
+    end_time is None), or None if they are not back-to-back slots of the
+    facility on date.
+    """
+    grid = slot_grid(facility_id, date)
+    starts = [start for start, _ in grid]
+    if start_time not in starts:
+        return None
+    span = []
+    for start, end in grid[starts.index(start_time):]:
+        if span and start != span[-1][1]:
+            return None
+        span.append((start, end))
+        if end_time is None or end == end_time:
+            return span
+        if end > end_time:
+            return None
+    return None
+
+
+def all_start_times():
+    """Every start time ('HH:MM') any facility offers; the booking form's choices."""
+    return _grids().start_times
+
+
+def all_end_times():
+    """Every slot end time ('HH:MM') any facility offers."""
+    return _grids().end_times
+
+
+def closed_start_times(facility_id, date):
+    """Form choices ('HH:MM') that are not slots of this facility on date."""
+    offered = {start.strftime('%H:%M') for start, _ in slot_grid(facility_id, date)}
+    return [start for start in all_start_times() if start not in offered]
@@ -0,0 +1,106 @@
+"""
+Facility search.
+
+On PostgreSQL the text query is matched against a ``tsvector`` of name,
+location and description (GIN index ``booking_facility_search_idx``) and,
+for typos in places, against trigram indexes on name and location; results
+are ranked by the better of the two. Other databases fall back to
+``icontains``.
+
+The optional "available at" filter keeps facilities that are open at the
+given date and time and still have a seat free then. Opening hours come from
+the cached slot grids; seat usage is a correlated subquery, so search and
+availability are answered by one SQL query.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField, TrigramSimilarity
+from django.db import connections, models
+from django.db.models.functions import Coalesce, Greatest
+
+from . import schedules
+from .availability import OCCUPYING_STATUSES
+from .models import Booking, Facility, FacilitySchedule
+
+SEARCH_CONFIG = 'english'
+
+
+def _is_postgresql(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def search_document():
+    """to_tsvector(name || ' ' || location || ' ' || description); must match the GIN index."""
+    return models.Func(
+        models.F('name'), models.F('location'), models.F('description'),
+        template=f"to_tsvector('{SEARCH_CONFIG}'::regconfig, %(expressions)s)",
+        arg_joiner=" || ' ' || ",
+        output_field=SearchVectorField(),
+    )
+
+
+def filter_text(queryset, query):
+    if not _is_postgresql(queryset):
+        return queryset.filter(
+            models.Q(name__icontains=query)
+            | models.Q(location__icontains=query)
+            | models.Q(description__icontains=query)
+        )
+
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.annotate(
+        document=search_document(),
+        rank=Greatest(
+            SearchRank(models.F('document'), search_query),
+            TrigramSimilarity('name', query),
+            TrigramSimilarity('location', query),
+        ),
+    ).filter(
+        models.Q(document=search_query)
+        | models.Q(name__trigram_similar=query)
+        | models.Q(location__trigram_similar=query)
+    ).order_by('-rank', 'name', 'id')
+
+
+def filter_available_at(queryset, date, time):
+    """Facilities open at date/time with a free seat in the slot running then."""
+    grids = {
+        facility_id: schedule.grid(date)
+        for facility_id, schedule in schedules.scheduled_facilities().items()
+    }
+    open_ids = [
+        facility_id for facility_id, grid in grids.items()
+        if any(start <= time < end for start, end in grid)
+    ]
+    is_open = models.Q(pk__in=open_ids)
+    if any(start <= time < end for start, end in schedules.DEFAULT_SCHEDULE.grid(date)):
+        # Facilities without a schedule use the default grid
+        is_open |= ~models.Q(pk__in=FacilitySchedule.objects.values('facility_id'))
+
+    in_use = (
+        Booking.objects.filter(
+            facility=models.OuterRef('pk'),
+            date=date,
+            status__in=OCCUPYING_STATUSES,
+            start_time__lte=time,
+            end_time__gt=time,
+        )
+        .order_by()
+        .values('facility')
+        .annotate(count=models.Count('*'))
+        .values('count')
+    )
+    return queryset.filter(is_open).annotate(
+        seats_in_use=Coalesce(models.Subquery(in_use), 0),
+        seats=models.Case(
+            models.When(shared_slots=True, then=models.F('capacity')),
+            default=models.Value(1),
+        ),
+    ).filter(seats_in_use__lt=models.F('seats'))
+
+
+def search_facilities(query=None, date=None, time=None, queryset=None):
+    queryset = Facility.objects.all() if queryset is None else queryset
+    if query:
+        queryset = filter_text(queryset, query)
+    if date and time:
+        queryset = filter_available_at(queryset, date, time)
+    return queryset
@@ -0,0 +1,185 @@
+"""
+Per-slot seat counters.
+
+Every grid slot a booking occupies has a ``SlotSeats`` row. Admitting a
+booking is one conditional statement over its slots::
+
+    UPDATE booking_slotseats SET seats_taken = seats_taken + 1
+    WHERE facility_id = ... AND date = ... AND start_time IN (...)
+      AND seats_taken < <capacity>
+
+If fewer rows were updated than the booking covers, a slot is full and the
+savepoint is rolled back. Concurrent bookings of a shared facility increment
+the counter one after another instead of failing on a unique index, and the
+statement itself refuses the booking that would overfill a slot.
+
+Counter rows are created on first use from the bookings already in the
+database, so deleting a day's rows (e.g. after its schedule changed) simply
+rebuilds them on the next booking.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import audit, schedules
+from .availability import OCCUPYING_STATUSES, slot_capacity
+from .intervals import load_index
+from .models import Booking, Facility, SlotSeats
+
+
+class SlotFull(IntegrityError):
+    """A booking no longer fits in its slots (another customer took the last seat)."""
+
+
+def covered_slots(facility_id, date, start_time, end_time):
+    """Start times of the grid slots [start_time, end_time) overlaps."""
+    starts = [
+        start for start, end in schedules.slot_grid(facility_id, date)
+        if start < end_time and end > start_time
+    ]
+    # Bookings off the grid (e.g. from before a schedule change) still count
+    return starts or [start_time]
+
+
+def _create_missing(facility_id, date, starts, exclude_pk=None):
+    """Create counters missing for starts from existing bookings. Returns whether any were missing."""
+    existing = set(
+        SlotSeats.objects.filter(facility_id=facility_id, date=date, start_time__in=starts)
+        .values_list('start_time', flat=True)
+    )
+    missing = [start for start in starts if start not in existing]
+    if not missing:
+        return False
+    index = load_index(facility_id, date, exclude_pk)
+    grid_ends = dict(schedules.slot_grid(facility_id, date))
+    counters = []
+    for start in missing:
+        # Off the grid, count the bookings in progress at start
+        end = grid_ends.get(start) or (datetime.combine(date, start) + timedelta(minutes=1)).time()
+        counters.append(SlotSeats(
+            facility_id=facility_id,
+            date=date,
+            start_time=start,
+            seats_taken=len(index.overlapping(start, end)),
+        ))
+    # A concurrent transaction may have created the same rows; theirs win
+    SlotSeats.objects.bulk_create(counters, ignore_conflicts=True)
+    return True
+
+
+def take(facility_id, date, start_time, end_time, capacity, exclude_pk=None):
+    """Take one seat in every slot the booking covers, or raise SlotFull."""
+    starts = covered_slots(facility_id, date, start_time, end_time)
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                taken = SlotSeats.objects.filter(
+                    facility_id=facility_id,
+                    date=date,
+                    start_time__in=starts,
+                    seats_taken__lt=capacity,
+                ).update(seats_taken=models.F('seats_taken') + 1)
+                if taken != len(starts):
+                    raise SlotFull(
+                        'This time slot is already booked. Please choose another time.' if capacity == 1
+                        else 'Facility is at full capacity for this time slot.'
+                    )
+                return
+        except SlotFull:
+            # Counters are created lazily; retry once when some were missing
+            if attempt or not _create_missing(facility_id, date, starts, exclude_pk):
+                raise
+
+
+def release(facility_id, date, start_time, end_time, count=1):
+    """Give back count seats in every slot the booking(s) covered."""
+    if date < timezone.now().date():
+        # Past counters are never read again; archive_bookings purges them
+        return
+    SlotSeats.objects.filter(
+        facility_id=facility_id,
+        date=date,
+        start_time__in=covered_slots(facility_id, date, start_time, end_time),
+    ).update(seats_taken=Greatest(models.F('seats_taken') - count, 0))
+
+
+def release_rows(rows):
+    """release() for booking values() rows, one UPDATE per distinct slot range."""
+    ranges = Counter(
+        (row['facility_id'], row['date'], row['start_time'], row['end_time']) for row in rows
+    )
+    for (facility_id, date, start_time, end_time), count in ranges.items():
+        release(facility_id, date, start_time, end_time, count)
+
+
+def admit(booking):
+    """
+    Move booking's seats from its stored state to its current one. Called by
+    Booking.save() inside the transaction that writes the booking.
+    """
+    old = None
+    if not booking._state.adding:
+        old = (
+            Booking.objects.select_for_update()
+            .filter(pk=booking.pk)
+            .values('facility_id', 'date', 'start_time', 'end_time', 'status')
+            .first()
+        )
+    new = {
+        'facility_id': booking.facility_id,
+        'date': booking.date,
+        'start_time': booking.start_time,
+        'end_time': booking.end_time,
+        'status': booking.status,
+    }
+    old_occupies = old is not None and old['status'] in OCCUPYING_STATUSES
+    new_occupies = new['status'] in OCCUPYING_STATUSES
+    if old_occupies and new_occupies and all(old[key] == new[key] for key in new if key != 'status'):
+        return
+    if old_occupies:
+        release_rows([old])
+    if new_occupies:
+        take(
+            new['facility_id'], new['date'], new['start_time'], new['end_time'],
+            slot_capacity(booking.facility), exclude_pk=booking.pk,
+        )
+
+
+def change_status(queryset, status):
+    """
+    queryset.update(status=status) that keeps the seat counters in step.
+    Bookings that would move back into a full slot are left unchanged.
+    Returns the number of bookings updated.
+    """
+    with transaction.atomic():
+        rows = list(
+            Booking.objects.filter(pk__in=list(queryset.values_list('pk', flat=True)))
+            .select_for_update()
+            .values('id', 'facility_id', 'date', 'start_time', 'end_time', 'status')
+        )
+        occupies = status in OCCUPYING_STATUSES
+        facilities = Facility.objects.in_bulk({row['facility_id'] for row in rows}) if occupies else {}
+        ids = []
+        changed = []
+        released = []
+        for row in rows:
+            was_occupying = row['status'] in OCCUPYING_STATUSES
+            if was_occupying and not occupies:
+                released.append(row)
+            elif occupies and not was_occupying:
+                try:
+                    take(
+                        row['facility_id'], row['date'], row['start_time'], row['end_time'],
+                        slot_capacity(facilities[row['facility_id']]), exclude_pk=row['id'],
+                    )
+                except SlotFull:
+                    continue
+            ids.append(row['id'])
+            if row['status'] != status:
+                changed.append(row)
+        release_rows(released)
+        audit.record_status_changes(changed, status)
+        return Booking.objects.filter(id__in=ids).update(status=status, updated_at=timezone.now())
@@ -0,0 +1,77 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from . import audit, events, schedules, seats
+from .availability import OCCUPYING_STATUSES
+from .models import Booking, Facility, FacilitySchedule, OpeningHours, ScheduleException, SlotSeats
+
+def _slot_state(booking):
+    # Read from __dict__ so deferred fields are never loaded just for this
+    values = booking.__dict__
+    return (
+        values.get('facility_id'), values.get('date'), values.get('start_time'),
+        values.get('status'), values.get('end_time'),
+    )
+
+def _slots(state):
+    facility_id, date, start_time, _, end_time = state
+    return (facility_id, date, start_time, end_time)
+
+@receiver(post_init, sender=Booking)
+def remember_slot(sender, instance, **kwargs):
+    instance._original_slot = _slot_state(instance)
+
+# Connected before publish_slot_change, which moves _original_slot on
+@receiver(post_save, sender=Booking)
+def record_booking_event(sender, instance, created, **kwargs):
+    old = instance._original_slot
+    new = _slot_state(instance)
+    facility_id, date, start_time, status, end_time = new
+    if created:
+        audit.record(instance.pk, 'created', '', status, date, start_time, end_time)
+    elif old[3] != status:
+        audit.record(instance.pk, 'status_changed', old[3], status, date, start_time, end_time)
+    elif _slots(old) != _slots(new):
+        audit.record(instance.pk, 'rescheduled', old[3], status, date, start_time, end_time)
+
+@receiver(post_save, sender=Booking)
+def publish_slot_change(sender, instance, created, **kwargs):
+    old = instance._original_slot
+    new = _slot_state(instance)
+    if created or old != new:
+        days = [new[:2]]
+        if not created and None not in old:
+            # Moved to another day or facility: the old day changed too
+            days.append(old[:2])
+        events.publish_days(days)
+    instance._original_slot = new
+
+@receiver(post_delete, sender=Booking)
+def release_seats(sender, instance, **kwargs):
+    if instance.status in OCCUPYING_STATUSES:
+        seats.release(instance.facility_id, instance.date, instance.start_time, instance.end_time)
+
+@receiver(post_delete, sender=Booking)
+def record_booking_delete(sender, instance, **kwargs):
+    audit.record_delete(instance)
+
+@receiver(post_delete, sender=Booking)
+def publish_slot_release(sender, instance, **kwargs):
+    # Released bookings (e.g. archived cancellations) held no seat
+    if instance.status in OCCUPYING_STATUSES:
+        events.publish_on_commit(instance.facility_id, instance.date)
+
+@receiver([post_save, post_delete], sender=Facility)
+@receiver([post_save, post_delete], sender=FacilitySchedule)
+@receiver([post_save, post_delete], sender=OpeningHours)
+@receiver([post_save, post_delete], sender=ScheduleException)
+def invalidate_slot_grids(sender, **kwargs):
+    schedules.invalidate()
+
+@receiver([post_save, post_delete], sender=FacilitySchedule)
+@receiver([post_save, post_delete], sender=OpeningHours)
+@receiver([post_save, post_delete], sender=ScheduleException)
+def reset_seat_counters(sender, instance, **kwargs):
+    # Counters follow the old grid; they are rebuilt from the bookings on next use
+    schedule = instance if sender is FacilitySchedule else instance.schedule
+    SlotSeats.objects.filter(facility_id=schedule.facility_id, date__gte=timezone.now().date()).delete()
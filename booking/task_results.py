@@ -0,0 +1,46 @@
+"""
+Expiry of stored Celery task results.
+
+Tasks that nobody reads the result of (confirmation emails) set
+``ignore_result`` and never write a ``TaskResult`` row. The results of the
+remaining tasks are kept for ``CELERY_RESULT_EXPIRES`` and then purged here
+in small chunks, each its own short transaction with a pause in between,
+instead of celery.backend_cleanup's single DELETE over the whole table.
+"""
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_celery_results.models import GroupResult, TaskResult
+
+
+def purge_chunk(model, cutoff, chunk_size):
+    """Delete up to chunk_size results finished before cutoff. Returns the number deleted."""
+    with transaction.atomic():
+        ids = list(
+            model.objects.filter(date_done__lt=cutoff)
+            .order_by('date_done')
+            .values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return 0
+        model.objects.filter(pk__in=ids).delete()
+        return len(ids)
+
+
+def purge_task_results(chunk_size=None, pause=None, now=None):
+    """Delete expired task and group results chunk by chunk. Returns the total deleted."""
+    chunk_size = chunk_size or settings.TASK_RESULT_PURGE_CHUNK_SIZE
+    pause = settings.TASK_RESULT_PURGE_CHUNK_PAUSE if pause is None else pause
+    cutoff = (now or timezone.now()) - settings.CELERY_RESULT_EXPIRES
+    total = 0
+    for model in (TaskResult, GroupResult):
+        while True:
+            deleted = purge_chunk(model, cutoff, chunk_size)
+            total += deleted
+            if deleted < chunk_size:
+                break
+            if pause:
+                time.sleep(pause)
+    return total
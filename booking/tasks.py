@@ -2,7 +2,8 @@ from celery import shared_task
 from django.core.mail import send_mail
 from django.conf import settings
 
-@shared_task
+# Fire and forget: nobody reads the result, so no TaskResult row is written
+@shared_task(ignore_result=True)
 def send_booking_confirmation_email(booking_id):
     from .models import Booking
     try:
@@ -29,4 +30,46 @@ def send_booking_confirmation_email(booking_id):
         return True
     except Exception as e:
         print(f"Error sending confirmation email: {e}")
-        return False 
\ No newline at end of file
+        return False
+
+@shared_task
+def maintain_booking_partitions():
+    from . import partitions
+    created = partitions.ensure_future_partitions()
+    detached = partitions.detach_old_partitions()
+    return {'created': created, 'detached': detached}
+
+@shared_task
+def archive_old_bookings():
+    from .archive import archive_bookings
+    return archive_bookings()
+
+@shared_task
+def expire_pending_bookings():
+    from . import expiry
+    return expiry.expire_pending_bookings()
+
+@shared_task
+def refresh_booking_rollups():
+    from .rollups import refresh_rollups
+    return refresh_rollups()
+
+@shared_task(ignore_result=True)
+def purge_task_results():
+    from .task_results import purge_task_results
+    return purge_task_results()
+
+@shared_task(ignore_result=True)
+def schedule_booking_reminders():
+    from .reminders import schedule_reminders
+    return schedule_reminders()
+
+@shared_task(ignore_result=True)
+def send_reminder_batch(batch):
+    from . import reminders
+    return reminders.send_reminder_batch(batch)
+
+@shared_task(ignore_result=True)
+def purge_idempotency_keys():
+    from .idempotency import purge_expired
+    return purge_expired()
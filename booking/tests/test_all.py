@@ -1,13 +1,14 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from datetime import timedelta, time
+from datetime import datetime, timedelta, time
 from booking.models import Facility, Booking
 from booking.forms import BookingForm
 from django.contrib import messages
 from django.contrib.messages import get_messages
+from unittest.mock import patch
 
 User = get_user_model()
 
@@ -625,4 +626,1871 @@ class ManagementTests(TestCase):
         
         with patch.object(sys, 'argv', ['manage.py', 'invalid_command']):
             with self.assertRaises(SystemExit):
-                main()
\ No newline at end of file
+                main()
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        from booking.routers import ReplicaRouter
+        self.router = ReplicaRouter()
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.facility = Facility.objects.create(
+            name='Test Facility',
+            location='Test Location',
+            capacity=2
+        )
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    @override_settings(REPLICA_DATABASES=['replica_1'])
+    def test_reads_use_replica_only_when_opted_in(self):
+        from booking.routers import read_from_replica, use_primary
+        self.assertEqual(self.router.db_for_read(Booking), 'default')
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Booking), 'replica_1')
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(Booking), 'default')
+        self.assertEqual(self.router.db_for_write(Booking), 'default')
+
+    def test_reads_fall_back_to_primary_without_replicas(self):
+        from booking.routers import read_from_replica
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Booking), 'default')
+
+    def test_write_pins_client_to_primary(self):
+        from booking.middleware import REPLICA_PIN_COOKIE
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.post(reverse('booking:booking_create'), {
+            'facility': self.facility.id,
+            'date': self.tomorrow,
+            'start_time': '10:00',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+
+        response = self.client.get(reverse('booking:facility_list'))
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+
+class PartitionTests(TestCase):
+    def test_month_helpers(self):
+        from datetime import date
+        from booking import partitions
+        self.assertEqual(partitions.add_months(date(2024, 11, 15), 3), date(2025, 2, 1))
+        self.assertEqual(partitions.add_months(date(2024, 1, 31), -1), date(2023, 12, 1))
+        self.assertEqual(partitions.partition_name(date(2025, 2, 1)), 'booking_booking_p2025_02')
+        self.assertEqual(
+            list(partitions.month_range(date(2024, 12, 20), date(2025, 2, 1))),
+            [date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)]
+        )
+
+    def test_manage_partitions_skips_unsupported_database(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('manage_partitions', stdout=out)
+        self.assertIn('skipping', out.getvalue())
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.facility = Facility.objects.create(
+            name='Test Facility',
+            location='Test Location',
+            capacity=2
+        )
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    def test_archives_old_and_cancelled_bookings_in_chunks(self):
+        from booking.archive import archive_bookings
+        from booking.models import ArchivedBooking
+        for hour in range(10, 15):
+            Booking.objects.create(
+                user=self.user,
+                facility=self.facility,
+                date=self.tomorrow,
+                start_time=f'{hour}:00',
+                end_time=f'{hour + 1}:00',
+                status='confirmed'
+            )
+        archived = archive_bookings(
+            chunk_size=2, pause=0, now=timezone.now() + timedelta(days=200)
+        )
+        self.assertEqual(archived, 5)
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(ArchivedBooking.objects.filter(user=self.user).count(), 5)
+
+    def test_recent_bookings_stay_in_hot_table(self):
+        from booking.archive import archive_bookings
+        Booking.objects.create(
+            user=self.user,
+            facility=self.facility,
+            date=self.tomorrow,
+            start_time='10:00',
+            end_time='11:00',
+            status='cancelled'
+        )
+        self.assertEqual(archive_bookings(pause=0), 0)
+        self.assertEqual(archive_bookings(pause=0, now=timezone.now() + timedelta(days=2)), 1)
+
+    def test_booking_list_shows_archived_on_demand(self):
+        from booking.archive import archive_bookings
+        Booking.objects.create(
+            user=self.user,
+            facility=self.facility,
+            date=self.tomorrow,
+            start_time='10:00',
+            end_time='11:00',
+            status='cancelled'
+        )
+        archive_bookings(pause=0, now=timezone.now() + timedelta(days=2))
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.get(reverse('booking:booking_list'))
+        self.assertNotIn('archived_bookings', response.context)
+        response = self.client.get(reverse('booking:booking_list'), {'archived': 1})
+        self.assertEqual(len(response.context['archived_bookings']), 1)
+        self.assertContains(response, 'Archived Bookings')
+
+    def test_archived_bookings_are_paginated(self):
+        from booking.models import ArchivedBooking
+        from booking.views import BookingListView
+        now = timezone.now()
+        ArchivedBooking.objects.bulk_create([
+            ArchivedBooking(
+                original_id=index, user=self.user, facility=self.facility,
+                date=self.tomorrow - timedelta(days=100 + index), start_time='10:00', end_time='11:00',
+                status='confirmed', created_at=now, updated_at=now,
+            )
+            for index in range(5)
+        ])
+        self.client.login(username='testuser', password='testpass')
+        with patch.object(BookingListView, 'archived_paginate_by', 2):
+            response = self.client.get(reverse('booking:booking_list'), {'archived': 1})
+            self.assertEqual([b.original_id for b in response.context['archived_bookings']], [0, 1])
+            self.assertContains(response, '?archived=2')
+            response = self.client.get(reverse('booking:booking_list'), {'archived': 3})
+        self.assertEqual([b.original_id for b in response.context['archived_bookings']], [4])
+        self.assertNotContains(response, 'Older')
+
+class SessionStorageBenchmarkTests(TestCase):
+    """Database queries of an authenticated BookingListView request per session backend."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+
+    def count_booking_list_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        # A fresh client builds its middleware with the current SESSION_ENGINE
+        client = Client()
+        client.login(username='testuser', password='testpass')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('booking:booking_list'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_cached_sessions_skip_session_query(self):
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            db_queries = self.count_booking_list_queries()
+        cached_queries = self.count_booking_list_queries()
+        self.assertEqual(cached_queries, db_queries - 1)
+
+@override_settings(
+    RATELIMIT_ENABLED=True,
+    RATELIMIT_BACKEND='booking.ratelimit.MemoryBackend',
+    RATELIMITS={
+        'booking:available_slots': {'rate': '2/m', 'key': 'ip'},
+        'booking:booking_create': {'rate': '1/h', 'key': 'user', 'methods': ['POST']},
+    },
+)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        from booking.ratelimit import get_backend
+        get_backend().clear()
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.facility = Facility.objects.create(
+            name='Test Facility',
+            location='Test Location',
+            capacity=2
+        )
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    def test_token_bucket_refills(self):
+        from booking.ratelimit import MemoryBackend
+        backend = MemoryBackend()
+        self.assertEqual(backend.consume('k', rate=1.0, capacity=2, now=0), (True, 0.0))
+        self.assertEqual(backend.consume('k', rate=1.0, capacity=2, now=0), (True, 0.0))
+        allowed, retry_after = backend.consume('k', rate=1.0, capacity=2, now=0.5)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 0.5)
+        self.assertTrue(backend.consume('k', rate=1.0, capacity=2, now=1.0)[0])
+
+    def test_available_slots_returns_429_with_retry_after(self):
+        params = {'facility': self.facility.id, 'date': self.tomorrow}
+        for _ in range(2):
+            response = self.client.get(reverse('booking:available_slots'), params)
+            self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('booking:available_slots'), params)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+
+    def test_booking_create_limited_per_user_on_post_only(self):
+        self.client.login(username='testuser', password='testpass')
+        data = {'facility': self.facility.id, 'date': self.tomorrow, 'start_time': '10:00'}
+        self.assertEqual(self.client.post(reverse('booking:booking_create'), data).status_code, 302)
+        data['start_time'] = '11:00'
+        self.assertEqual(self.client.post(reverse('booking:booking_create'), data).status_code, 429)
+        self.assertEqual(self.client.get(reverse('booking:booking_create')).status_code, 200)
+
+class BookingAPITests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.other_user = User.objects.create_user('otheruser', 'other@test.com', 'otherpass')
+        self.facility = Facility.objects.create(
+            name='Test Facility',
+            location='Test Location',
+            capacity=2
+        )
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+        self.client.login(username='testuser', password='testpass')
+
+    def create_booking(self, hour, user=None, status='pending'):
+        return Booking.objects.create(
+            user=user or self.user,
+            facility=self.facility,
+            date=self.tomorrow,
+            start_time=f'{hour}:00',
+            end_time=f'{hour + 1}:00',
+            status=status
+        )
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        response = self.client.get(reverse('booking:api_v1:booking_list'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_booking_list_cursor_pagination(self):
+        for hour in range(10, 15):
+            self.create_booking(hour)
+        self.create_booking(15, user=self.other_user)
+
+        seen = []
+        params = {'limit': 2, 'fields': 'id,start_time'}
+        while True:
+            response = self.client.get(reverse('booking:api_v1:booking_list'), params)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertTrue(all(set(row) == {'id', 'start_time'} for row in page['results']))
+            seen.extend(row['start_time'] for row in page['results'])
+            if not page['next_cursor']:
+                break
+            params['cursor'] = page['next_cursor']
+        self.assertEqual(seen, ['14:00:00', '13:00:00', '12:00:00', '11:00:00', '10:00:00'])
+
+    def test_unknown_field_rejected(self):
+        response = self.client.get(reverse('booking:api_v1:facility_list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_facility_detail(self):
+        response = self.client.get(
+            reverse('booking:api_v1:facility_detail', kwargs={'pk': self.facility.pk}),
+            {'fields': 'name,capacity'}
+        )
+        self.assertEqual(response.json(), {'name': 'Test Facility', 'capacity': 2})
+
+    def test_booking_detail_hides_other_users_bookings(self):
+        booking = self.create_booking(10, user=self.other_user)
+        response = self.client.get(reverse('booking:api_v1:booking_detail', kwargs={'pk': booking.pk}))
+        self.assertEqual(response.status_code, 404)
+
+    @patch('booking.api.send_booking_confirmation_email')
+    def test_batched_create_is_all_or_nothing(self, send_email):
+        payload = [
+            {'facility': self.facility.id, 'date': str(self.tomorrow), 'start_time': '10:00'},
+            {'facility': self.facility.id, 'date': str(self.tomorrow), 'start_time': '10:00'},
+        ]
+        response = self.client.post(
+            reverse('booking:api_v1:booking_list'), payload, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['index'], 1)
+        self.assertFalse(Booking.objects.exists())
+
+        payload[1]['start_time'] = '11:00'
+        response = self.client.post(
+            reverse('booking:api_v1:booking_list'), {'bookings': payload}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertEqual(send_email.delay.call_count, 2)
+
+    def test_cancel_booking(self):
+        pending = self.create_booking(10)
+        confirmed = self.create_booking(11, status='confirmed')
+        response = self.client.post(reverse('booking:api_v1:booking_cancel', kwargs={'pk': pending.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'cancelled')
+        response = self.client.post(reverse('booking:api_v1:booking_cancel', kwargs={'pk': confirmed.pk}))
+        self.assertEqual(response.status_code, 403)
+
+class FakeAsyncPubSub:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = []
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+
+    async def get_message(self, **kwargs):
+        return self.messages.pop(0) if self.messages else None
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeAsyncRedis:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def pubsub(self):
+        return self._pubsub
+
+
+class SlotEventTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.facility = Facility.objects.create(
+            name='Test Facility',
+            location='Test Location',
+            capacity=2
+        )
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    @patch('booking.events.publish')
+    def test_booking_writes_publish_day_state(self, publish):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = Booking.objects.create(
+                user=self.user,
+                facility=self.facility,
+                date=self.tomorrow,
+                start_time='10:00',
+                end_time='11:00'
+            )
+        publish.assert_called_once_with({
+            'facility': self.facility.id, 'date': str(self.tomorrow), 'booked_slots': ['10:00'],
+        })
+
+        publish.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.start_time = time(11, 0)
+            booking.end_time = time(12, 0)
+            booking.save()
+        publish.assert_called_once_with({
+            'facility': self.facility.id, 'date': str(self.tomorrow), 'booked_slots': ['11:00'],
+        })
+
+        publish.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.notes = 'No slot change'
+            booking.save()
+        publish.assert_not_called()
+
+    @patch('booking.events.publish')
+    def test_shared_slot_state_counts_every_seat(self, publish):
+        self.facility.shared_slots = True
+        self.facility.save()
+
+        def book():
+            return Booking.objects.create(
+                user=self.user, facility=self.facility, date=self.tomorrow,
+                start_time=time(10, 0), end_time=time(12, 0),
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = book()
+        # One of two seats taken: the slots stay open for everyone
+        self.assertEqual(publish.call_args.args[0]['booked_slots'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book()
+        self.assertEqual(publish.call_args.args[0]['booked_slots'], ['10:00', '11:00'])
+
+        # Cancelling one of them frees a seat, not the other customer's
+        with self.captureOnCommitCallbacks(execute=True):
+            first.status = 'cancelled'
+            first.save()
+        self.assertEqual(publish.call_args.args[0]['booked_slots'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            third = book()
+        self.assertEqual(publish.call_args.args[0]['booked_slots'], ['10:00', '11:00'])
+
+        # Deleting the cancelled booking changes nothing and publishes nothing
+        publish.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        publish.assert_not_called()
+        self.assertEqual(Booking.objects.exclude(status='cancelled').count(), 2)
+        self.assertTrue(third.pk)
+
+    async def test_stream_sends_snapshot_then_deltas(self):
+        from asgiref.sync import sync_to_async
+        from booking import events
+        await sync_to_async(Booking.objects.create)(
+            user=self.user,
+            facility=self.facility,
+            date=self.tomorrow,
+            start_time='10:00',
+            end_time='11:00'
+        )
+        pubsub = FakeAsyncPubSub([{'data': b'{"booked_slots": ["10:00", "11:00"]}'}])
+        subscribed_at_snapshot = []
+        unavailable_slots = events.unavailable_slots
+
+        def snapshot_slots(*args):
+            # Changes committed while the stream starts must not fall in between
+            subscribed_at_snapshot.extend(pubsub.channels)
+            return unavailable_slots(*args)
+
+        with patch('booking.events.get_async_client', return_value=FakeAsyncRedis(pubsub)), \
+                patch('booking.events.unavailable_slots', side_effect=snapshot_slots):
+            response = await self.async_client.get(
+                reverse('booking:slot_events'), {'facility': self.facility.id, 'date': self.tomorrow}
+            )
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            # Read the way the ASGI handler does; it closes the iterator when the client is gone
+            stream = response.__aiter__()
+            snapshot = await stream.__anext__()
+            delta = await stream.__anext__()
+            keepalive = await stream.__anext__()
+            self.assertEqual(events._open_streams, 1)
+            await stream.aclose()
+        self.assertEqual(events._open_streams, 0)
+        self.assertTrue(pubsub.closed)
+        self.assertEqual(snapshot, b'event: snapshot\ndata: {"booked_slots": ["10:00"]}\n\n')
+        self.assertEqual(delta, b'event: slot\ndata: {"booked_slots": ["10:00", "11:00"]}\n\n')
+        self.assertEqual(keepalive, b': keepalive\n\n')
+        self.assertEqual(pubsub.channels, [f'slots:{self.facility.id}:{self.tomorrow}'])
+        self.assertEqual(subscribed_at_snapshot, pubsub.channels)
+
+    async def test_stream_ends_when_the_client_disconnects(self):
+        import asyncio
+        from django.core.handlers.asgi import ASGIHandler
+        from booking import events
+        from booking.asgi import CancelOnDisconnect
+        pubsub = FakeAsyncPubSub([])
+        left = asyncio.Event()
+        requested = asyncio.Event()
+        sent = []
+
+        async def receive():
+            if not requested.is_set():
+                requested.set()
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await left.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            # Like uvicorn, keep accepting writes after the client left
+            if len(sent) == 3:
+                left.set()
+            await asyncio.sleep(0)
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': reverse('booking:slot_events'),
+            'query_string': f'facility={self.facility.id}&date={self.tomorrow}'.encode(),
+            'headers': [], 'client': ('127.0.0.1', 1234), 'server': ('testserver', 80),
+        }
+        with patch('booking.events.get_async_client', return_value=FakeAsyncRedis(pubsub)), \
+                patch('booking.events.unavailable_slots', return_value=[]):
+            await asyncio.wait_for(CancelOnDisconnect(ASGIHandler())(scope, receive, send), 5)
+        self.assertEqual(events._open_streams, 0)
+        self.assertTrue(pubsub.closed)
+        self.assertEqual(sent[1]['body'], b'event: snapshot\ndata: {"booked_slots": []}\n\n')
+
+    async def test_streams_beyond_the_cap_are_refused(self):
+        with override_settings(SLOT_EVENTS_MAX_STREAMS=0):
+            response = await self.async_client.get(
+                reverse('booking:slot_events'), {'facility': self.facility.id, 'date': self.tomorrow}
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '15')
+
+    def test_stream_requires_valid_parameters(self):
+        response = self.client.get(reverse('booking:slot_events'), {'facility': 'x', 'date': 'today'})
+        self.assertEqual(response.status_code, 400)
+
+class PendingExpiryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.facility = Facility.objects.create(
+            name='Test Facility',
+            location='Test Location',
+            capacity=2
+        )
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    def create_booking(self, hour, status='pending'):
+        return Booking.objects.create(
+            user=self.user,
+            facility=self.facility,
+            date=self.tomorrow,
+            start_time=f'{hour}:00',
+            end_time=f'{hour + 1}:00',
+            status=status
+        )
+
+    @override_settings(BOOKING_PENDING_TTL_MINUTES=30)
+    def test_expires_only_stale_pending_bookings(self):
+        from booking.expiry import expire_pending_bookings
+        stale = [self.create_booking(hour) for hour in range(10, 13)]
+        confirmed = self.create_booking(13, status='confirmed')
+        fresh = self.create_booking(14)
+        Booking.objects.filter(pk__in=[b.pk for b in stale + [confirmed]]).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+
+        with patch('booking.events.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(expire_pending_bookings(chunk_size=2), 3)
+        # One publish of the day per chunk, with the expired slots free
+        self.assertEqual(publish.call_count, 2)
+        self.assertEqual(publish.call_args.args[0]['booked_slots'], ['13:00', '14:00'])
+
+        statuses = dict(Booking.objects.values_list('pk', 'status'))
+        self.assertTrue(all(statuses[b.pk] == 'expired' for b in stale))
+        self.assertEqual(statuses[confirmed.pk], 'confirmed')
+        self.assertEqual(statuses[fresh.pk], 'pending')
+
+    def test_expired_slot_shows_as_available(self):
+        booking = self.create_booking(10)
+        Booking.objects.filter(pk=booking.pk).update(status='expired')
+        response = self.client.get(
+            reverse('booking:available_slots'),
+            {'facility': self.facility.id, 'date': self.tomorrow}
+        )
+        self.assertJSONEqual(response.content, {'booked_slots': []})
+
+class SlotHoldTests(TestCase):
+    def setUp(self):
+        from booking.holds import get_backend
+        get_backend().clear()
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.other_user = User.objects.create_user('otheruser', 'other@test.com', 'otherpass')
+        self.facility = Facility.objects.create(
+            name='Test Facility',
+            location='Test Location',
+            capacity=2
+        )
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    def place_hold(self, start_time='10:00'):
+        return self.client.post(
+            reverse('booking:api_v1:hold_create'),
+            {'facility': self.facility.id, 'date': str(self.tomorrow), 'start_time': start_time},
+            content_type='application/json'
+        )
+
+    def test_token_round_trip(self):
+        from booking.holds import Hold
+        hold = Hold(self.facility.id, self.tomorrow, '10:00', 'abc-def')
+        parsed = Hold.parse(hold.token)
+        self.assertEqual(
+            (parsed.facility_id, parsed.date, parsed.start_time, parsed.secret),
+            (self.facility.id, self.tomorrow, '10:00', 'abc-def')
+        )
+        self.assertIsNone(Hold.parse('garbage'))
+
+    def test_hold_expires(self):
+        from booking.holds import MemoryBackend
+        backend = MemoryBackend()
+        self.assertTrue(backend.add('k', '10:00|a', '10:00', 1, ttl=60, now=0))
+        self.assertFalse(backend.add('k', '10:00|b', '10:00', 1, ttl=60, now=30))
+        self.assertTrue(backend.add('k', '10:00|b', '10:00', 1, ttl=60, now=61))
+
+    def test_hold_blocks_other_customers(self):
+        self.client.login(username='otheruser', password='otherpass')
+        response = self.place_hold()
+        self.assertEqual(response.status_code, 201)
+        token = response.json()['token']
+        self.assertEqual(self.place_hold().status_code, 409)
+
+        slots_url = reverse('booking:available_slots')
+        params = {'facility': self.facility.id, 'date': self.tomorrow}
+        self.assertJSONEqual(self.client.get(slots_url, params).content, {'booked_slots': ['10:00']})
+        self.assertJSONEqual(
+            self.client.get(slots_url, {**params, 'hold': token}).content, {'booked_slots': []}
+        )
+
+        form_data = {'facility': self.facility.id, 'date': self.tomorrow, 'start_time': '10:00'}
+        form = BookingForm(data=form_data, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('currently held', str(form.errors))
+
+        form = BookingForm(data={**form_data, 'hold_token': token}, user=self.other_user)
+        self.assertTrue(form.is_valid())
+        form.save()
+        # Completing the booking releases the hold
+        self.assertEqual(self.place_hold('11:00').status_code, 201)
+        from booking.holds import held_counts
+        self.assertEqual(held_counts(self.facility.id, self.tomorrow), {'11:00': 1})
+
+    def test_release_hold(self):
+        self.client.login(username='testuser', password='testpass')
+        token = self.place_hold().json()['token']
+        response = self.client.delete(reverse('booking:api_v1:hold_release', kwargs={'token': token}))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.place_hold().status_code, 201)
+
+    def test_cannot_hold_booked_slot(self):
+        Booking.objects.create(
+            user=self.other_user,
+            facility=self.facility,
+            date=self.tomorrow,
+            start_time='10:00',
+            end_time='11:00'
+        )
+        self.client.login(username='testuser', password='testpass')
+        self.assertEqual(self.place_hold().status_code, 409)
+
+class FacilityScheduleTests(TestCase):
+    def setUp(self):
+        from booking.models import FacilitySchedule, OpeningHours
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.facility = Facility.objects.create(name='Pool', location='Basement', capacity=1)
+        self.schedule = FacilitySchedule.objects.create(facility=self.facility, slot_minutes=90)
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+        OpeningHours.objects.create(
+            schedule=self.schedule, weekday=self.tomorrow.weekday(), opens_at=time(8, 0), closes_at=time(12, 0)
+        )
+
+    def tearDown(self):
+        # Rolled-back schedules fire no signals; drop this process's grids
+        from booking import schedules
+        schedules.invalidate()
+
+    def test_slot_grid_from_opening_hours(self):
+        from booking.schedules import slot_grid
+        self.assertEqual(
+            slot_grid(self.facility.id, self.tomorrow),
+            ((time(8, 0), time(9, 30)), (time(9, 30), time(11, 0)))
+        )
+        self.assertEqual(slot_grid(self.facility.id, self.tomorrow + timedelta(days=1)), ())
+
+    def test_grid_is_cached_until_schedule_changes(self):
+        from booking.schedules import slot_grid
+        slot_grid(self.facility.id, self.tomorrow)
+        with self.assertNumQueries(0):
+            slot_grid(self.facility.id, self.tomorrow)
+            BookingForm(user=self.user)
+        self.schedule.slot_minutes = 120
+        self.schedule.save()
+        self.assertEqual(len(slot_grid(self.facility.id, self.tomorrow)), 2)
+        self.assertEqual(slot_grid(self.facility.id, self.tomorrow)[1], (time(10, 0), time(12, 0)))
+
+    def test_form_uses_schedule_end_time(self):
+        form = BookingForm(
+            data={'facility': self.facility.id, 'date': self.tomorrow, 'start_time': '09:30'}, user=self.user
+        )
+        self.assertIn(('09:30', '09:30'), form.fields['start_time'].choices)
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.save().end_time, time(11, 0))
+
+    def test_holiday_closes_facility(self):
+        from booking.models import ScheduleException
+        ScheduleException.objects.create(schedule=self.schedule, date=self.tomorrow, reason='Holiday')
+        form = BookingForm(
+            data={'facility': self.facility.id, 'date': self.tomorrow, 'start_time': '08:00'}, user=self.user
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('closed', str(form.errors))
+
+        response = self.client.get(
+            reverse('booking:available_slots'), {'facility': self.facility.id, 'date': self.tomorrow}
+        )
+        self.assertEqual(response.json()['booked_slots'], ['08:00', '09:30'])
+
+    def test_unscheduled_facility_keeps_default_grid(self):
+        other = Facility.objects.create(name='Gym', location='Ground floor', capacity=1)
+        form = BookingForm(
+            data={'facility': other.id, 'date': self.tomorrow, 'start_time': '17:00'}, user=self.user
+        )
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['end_time'], time(18, 0))
+
+class IntervalIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.facility = Facility.objects.create(name='Court', location='Outside', capacity=1)
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    def test_overlap_and_peak(self):
+        from booking.intervals import IntervalIndex
+        index = IntervalIndex([(time(9, 0), time(12, 0)), (time(10, 0), time(11, 0)), (time(13, 0), time(14, 0))])
+        self.assertEqual(index.overlapping(time(11, 30), time(13, 30)), [(540, 720), (780, 840)])
+        # Back-to-back intervals do not overlap
+        self.assertEqual(index.overlapping(time(12, 0), time(13, 0)), [])
+        self.assertEqual(index.peak(time(9, 0), time(12, 0)), 2)
+        self.assertEqual(index.peak(time(11, 0), time(14, 0)), 1)
+        self.assertFalse(index.fits(time(10, 30), time(10, 45), 2))
+        self.assertTrue(index.fits(time(11, 0), time(13, 0), 2))
+        index.add(time(11, 30), time(13, 30))
+        self.assertEqual(index.peak(time(11, 0), time(14, 0)), 2)
+
+    def test_multi_slot_booking(self):
+        form_data = {'facility': self.facility.id, 'date': self.tomorrow, 'start_time': '10:00', 'end_time': '13:00'}
+        form = BookingForm(data=form_data, user=self.user)
+        self.assertTrue(form.is_valid(), form.errors)
+        booking = form.save()
+        self.assertEqual((booking.start_time, booking.end_time), (time(10, 0), time(13, 0)))
+
+        response = self.client.get(
+            reverse('booking:available_slots'), {'facility': self.facility.id, 'date': self.tomorrow}
+        )
+        self.assertEqual(response.json()['booked_slots'], ['10:00', '11:00', '12:00'])
+
+        form = BookingForm(data={**form_data, 'start_time': '12:00', 'end_time': '14:00'}, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('already booked', str(form.errors))
+        form = BookingForm(data={**form_data, 'start_time': '13:00', 'end_time': ''}, user=self.user)
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_end_time_must_follow_the_grid(self):
+        form_data = {'facility': self.facility.id, 'date': self.tomorrow, 'start_time': '16:00', 'end_time': '19:00'}
+        self.assertFalse(BookingForm(data=form_data, user=self.user).is_valid())
+        form_data['end_time'] = '09:00'
+        self.assertFalse(BookingForm(data=form_data, user=self.user).is_valid())
+
+    def test_editing_does_not_conflict_with_itself(self):
+        booking = Booking.objects.create(
+            user=self.user, facility=self.facility, date=self.tomorrow, start_time='10:00', end_time='11:00'
+        )
+        form = BookingForm(
+            data={'facility': self.facility.id, 'date': self.tomorrow, 'start_time': '10:00', 'end_time': '12:00'},
+            instance=booking,
+            user=self.user,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_batch_shares_one_index(self):
+        from booking.intervals import IntervalIndexes
+        indexes = IntervalIndexes()
+        first = BookingForm(
+            data={'facility': self.facility.id, 'date': self.tomorrow, 'start_time': '10:00', 'end_time': '12:00'},
+            user=self.user, interval_indexes=indexes,
+        )
+        self.assertTrue(first.is_valid())
+        first.save()
+        second = BookingForm(
+            data={'facility': self.facility.id, 'date': self.tomorrow, 'start_time': '11:00'},
+            user=self.user, interval_indexes=indexes,
+        )
+        # The first booking is already in the shared index, not re-queried
+        self.assertFalse(second.is_valid())
+        self.assertEqual(len(indexes.get(self.facility.id, self.tomorrow)), 1)
+
+class IntervalIndexBenchmarkTests(TestCase):
+    """Conflict checks against a busy facility-day: ORM Q filters vs. the in-memory index."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.facility = Facility.objects.create(name='Hall', location='Main', capacity=50)
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+        # 15-minute bookings of 15 to 120 minutes from 06:00 on
+        bookings = []
+        for i in range(60):
+            start = 360 + i * 15
+            end = min(start + 15 * (1 + i % 8), 24 * 60 - 1)
+            bookings.append(Booking(
+                user=self.user, facility=self.facility, date=self.tomorrow, status='confirmed',
+                start_time=time(start // 60, start % 60), end_time=time(end // 60, end % 60),
+            ))
+        Booking.objects.bulk_create(bookings)
+        self.probes = [(time(h, m), time(h + 1, m)) for h in range(6, 22) for m in (0, 20, 40)]
+
+    def orm_overlap_counts(self):
+        from django.db.models import Q
+        return [
+            Booking.objects.filter(facility=self.facility, date=self.tomorrow, status__in=['confirmed', 'pending'])
+            .filter(Q(start_time__lt=end) & Q(end_time__gt=start)).count()
+            for start, end in self.probes
+        ]
+
+    def test_index_matches_orm_with_one_query(self):
+        from booking.intervals import load_index
+        with self.assertNumQueries(len(self.probes)):
+            expected = self.orm_overlap_counts()
+        with self.assertNumQueries(1):
+            index = load_index(self.facility.id, self.tomorrow)
+            counts = [len(index.overlapping(start, end)) for start, end in self.probes]
+        self.assertEqual(counts, expected)
+
+class SlotSeatTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.gym = Facility.objects.create(name='Gym', location='Ground floor', capacity=3, shared_slots=True)
+        self.court = Facility.objects.create(name='Court', location='Outside', capacity=4)
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    def book(self, facility, start_time='10:00', **extra):
+        form = BookingForm(
+            data={'facility': facility.id, 'date': self.tomorrow, 'start_time': start_time, **extra},
+            user=self.user,
+        )
+        if form.is_valid():
+            return form.save()
+        return form
+
+    def seats_taken(self, facility, start_time):
+        from booking.models import SlotSeats
+        return SlotSeats.objects.get(facility=facility, date=self.tomorrow, start_time=start_time).seats_taken
+
+    def test_shared_slot_admits_up_to_capacity(self):
+        for _ in range(3):
+            self.assertIsInstance(self.book(self.gym), Booking)
+        form = self.book(self.gym)
+        self.assertIn('full capacity', str(form.errors))
+        self.assertEqual(self.seats_taken(self.gym, time(10, 0)), 3)
+
+        response = self.client.get(
+            reverse('booking:available_slots'), {'facility': self.gym.id, 'date': self.tomorrow}
+        )
+        self.assertEqual(response.json()['booked_slots'], ['10:00'])
+
+    def test_unshared_facility_has_one_seat_per_slot(self):
+        self.assertIsInstance(self.book(self.court), Booking)
+        self.assertIn('already booked', str(self.book(self.court).errors))
+
+    def test_model_save_counts_seats_per_slot(self):
+        pair = Facility.objects.create(name='Pair', location='Hall', capacity=2, shared_slots=True)
+
+        def create(start, end, status='confirmed'):
+            return Booking.objects.create(
+                user=self.user, facility=pair, date=self.tomorrow,
+                start_time=time(start), end_time=time(end), status=status,
+            )
+
+        create(9, 10)
+        create(10, 11)
+        # No slot has more than one of its two seats taken
+        self.assertIsInstance(create(9, 11), Booking)
+
+        from booking.seats import SlotFull
+        with self.assertRaises(SlotFull):
+            create(9, 10, status='pending')
+
+    def test_pending_bookings_hold_their_seats_on_model_save(self):
+        from booking.seats import SlotFull
+        Booking.objects.create(
+            user=self.user, facility=self.court, date=self.tomorrow,
+            start_time=time(10, 0), end_time=time(11, 0), status='pending',
+        )
+        with self.assertRaises(SlotFull):
+            Booking.objects.create(
+                user=self.user, facility=self.court, date=self.tomorrow,
+                start_time=time(10, 0), end_time=time(11, 0), status='confirmed',
+            )
+
+    def test_admission_is_one_conditional_update(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from booking import seats
+        self.book(self.gym)
+        with CaptureQueriesContext(connection) as queries:
+            seats.take(self.gym.id, self.tomorrow, time(10, 0), time(11, 0), capacity=3)
+        statements = [q['sql'] for q in queries if 'booking_slotseats' in q['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('UPDATE'))
+        self.assertIn('"seats_taken" < 3', statements[0])
+
+    def test_lost_race_is_reported_on_the_form(self):
+        form = BookingForm(
+            data={'facility': self.court.id, 'date': self.tomorrow, 'start_time': '10:00'}, user=self.user
+        )
+        self.assertTrue(form.is_valid())
+        # Another customer books the slot between validation and save
+        self.book(self.court)
+        from booking.seats import SlotFull
+        with self.assertRaises(SlotFull):
+            form.save()
+
+        self.client.login(username='testuser', password='testpass')
+        with patch('booking.forms.BookingForm.clean', lambda form: form.cleaned_data | {
+            'start_time': time(10, 0), 'end_time': time(11, 0)
+        }):
+            response = self.client.post(reverse('booking:booking_create'), {
+                'facility': self.court.id, 'date': self.tomorrow, 'start_time': '10:00'
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'already booked')
+        self.assertEqual(Booking.objects.filter(facility=self.court).count(), 1)
+
+    def test_counters_are_built_from_existing_bookings(self):
+        Booking.objects.bulk_create([
+            Booking(user=self.user, facility=self.gym, date=self.tomorrow, start_time=time(9, 0), end_time=time(11, 0)),
+            Booking(user=self.user, facility=self.gym, date=self.tomorrow, start_time=time(10, 0), end_time=time(11, 0)),
+        ])
+        self.assertIsInstance(self.book(self.gym), Booking)
+        self.assertEqual(self.seats_taken(self.gym, time(10, 0)), 3)
+
+    def test_multi_slot_booking_takes_a_seat_in_each_slot(self):
+        booking = self.book(self.gym, end_time='12:00')
+        self.assertEqual(self.seats_taken(self.gym, time(10, 0)), 1)
+        self.assertEqual(self.seats_taken(self.gym, time(11, 0)), 1)
+        booking.start_time = time(11, 0)
+        booking.end_time = time(13, 0)
+        booking.save()
+        self.assertEqual(
+            [self.seats_taken(self.gym, time(hour, 0)) for hour in (10, 11, 12)], [0, 1, 1]
+        )
+
+    def test_cancel_and_delete_release_seats(self):
+        from booking import seats
+        first = self.book(self.court)
+        seats.change_status(Booking.objects.filter(pk=first.pk), 'cancelled')
+        self.assertEqual(self.seats_taken(self.court, time(10, 0)), 0)
+        second = self.book(self.court)
+        self.assertIsInstance(second, Booking)
+
+        # The cancelled booking cannot be confirmed back into the taken slot
+        self.assertEqual(seats.change_status(Booking.objects.filter(pk=first.pk), 'confirmed'), 0)
+        second.delete()
+        self.assertEqual(self.seats_taken(self.court, time(10, 0)), 0)
+        self.assertEqual(seats.change_status(Booking.objects.filter(pk=first.pk), 'confirmed'), 1)
+        self.assertEqual(self.seats_taken(self.court, time(10, 0)), 1)
+
+class FacilitySearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.pool = Facility.objects.create(
+            name='Olympic Pool', location='Sports Centre', capacity=1, description='Heated indoor swimming'
+        )
+        self.gym = Facility.objects.create(
+            name='Gym', location='Sports Centre', capacity=2, shared_slots=True, description='Weights and cardio'
+        )
+        self.studio = Facility.objects.create(name='Studio', location='Arts Building', capacity=1)
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    def tearDown(self):
+        from booking import schedules
+        schedules.invalidate()
+
+    def book(self, facility, start_time):
+        Booking.objects.create(
+            user=self.user, facility=facility, date=self.tomorrow, start_time=start_time, end_time=time(11, 0)
+        )
+
+    def test_text_search_falls_back_to_icontains(self):
+        from booking.search import search_facilities
+        self.assertEqual(list(search_facilities('swimming')), [self.pool])
+        self.assertEqual(set(search_facilities('sports centre')), {self.pool, self.gym})
+
+    def test_available_at_filter(self):
+        from booking.models import FacilitySchedule, ScheduleException
+        from booking.search import search_facilities
+        self.book(self.pool, '10:00')
+        self.book(self.gym, '10:00')
+        schedule = FacilitySchedule.objects.create(facility=self.studio)
+        ScheduleException.objects.create(schedule=schedule, date=self.tomorrow)
+
+        # Pool is booked, the gym still has a seat, the studio is closed
+        self.assertEqual(list(search_facilities(date=self.tomorrow, time=time(10, 30))), [self.gym])
+        self.book(self.gym, '09:00')
+        self.assertEqual(list(search_facilities(date=self.tomorrow, time=time(10, 30))), [])
+        self.assertEqual(list(search_facilities(date=self.tomorrow, time=time(8, 0))), [])
+        self.assertEqual(
+            set(search_facilities(date=self.tomorrow, time=time(11, 0))), {self.pool, self.gym}
+        )
+
+    def test_search_and_availability_in_one_query(self):
+        from booking.search import search_facilities
+        search_facilities(date=self.tomorrow, time=time(10, 0))  # warm the slot grid cache
+        with self.assertNumQueries(1):
+            results = list(search_facilities('centre', self.tomorrow, time(10, 0)))
+        self.assertEqual(set(results), {self.pool, self.gym})
+
+    def test_list_view_and_api_filters(self):
+        response = self.client.get(reverse('booking:facility_list'), {'q': 'studio'})
+        self.assertEqual(list(response.context['facilities']), [self.studio])
+
+        response = self.client.get(reverse('booking:facility_list'), {'date': self.tomorrow})
+        self.assertEqual(len(response.context['facilities']), 3)
+        self.assertTrue(response.context['search_form'].non_field_errors())
+
+        response = self.client.get(reverse('booking:api_v1:facility_list'), {'q': 'weights', 'fields': 'name'})
+        self.assertEqual(response.json()['results'], [{'name': 'Gym'}])
+        response = self.client.get(reverse('booking:api_v1:facility_list'), {'time': 'noon'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_pages_ranked_results_in_rank_order(self):
+        from django.db import models
+        # What search_facilities returns on PostgreSQL: a rank annotation
+        ranked = Facility.objects.annotate(rank=models.Case(
+            models.When(pk=self.studio.pk, then=models.Value(0.9)),
+            models.When(pk=self.pool.pk, then=models.Value(0.5)),
+            default=models.Value(0.1),
+            output_field=models.FloatField(),
+        ))
+        names = []
+        params = {'q': 'centre', 'fields': 'name', 'limit': 1}
+        with patch('booking.api.search_facilities', return_value=ranked):
+            while True:
+                page = self.client.get(reverse('booking:api_v1:facility_list'), params).json()
+                names.extend(row['name'] for row in page['results'])
+                if not page['next_cursor']:
+                    break
+                params['cursor'] = page['next_cursor']
+        self.assertEqual(names, [self.studio.name, self.pool.name, self.gym.name])
+
+class NextAvailableSlotTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.court = Facility.objects.create(name='Court', location='Outside', capacity=1)
+        self.pool = Facility.objects.create(name='Pool', location='Sports Centre', capacity=1)
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+        self.start = datetime.combine(self.tomorrow, time(0, 0))
+
+    def fill_days(self, facility, days, first_day=None):
+        """Book every default slot of facility for the given number of days."""
+        first_day = first_day or self.tomorrow
+        Booking.objects.bulk_create([
+            Booking(
+                user=self.user, facility=facility, date=first_day + timedelta(days=offset),
+                start_time=time(hour, 0), end_time=time(hour + 1, 0), status='confirmed',
+            )
+            for offset in range(days) for hour in range(9, 18)
+        ])
+
+    def test_earliest_slots_across_facilities(self):
+        from booking.next_available import next_available_slots
+        Booking.objects.create(
+            user=self.user, facility=self.court, date=self.tomorrow, start_time='09:00', end_time='10:00'
+        )
+        slots = next_available_slots([self.court, self.pool], count=3, start=self.start)
+        self.assertEqual(
+            [(slot.facility, slot.start_time) for slot in slots],
+            [(self.pool, time(9, 0)), (self.court, time(10, 0)), (self.pool, time(10, 0))]
+        )
+
+    def test_time_window_and_start_time(self):
+        from booking.next_available import next_available_slots
+        start = datetime.combine(self.tomorrow, time(16, 30))
+        slots = next_available_slots([self.court], count=2, start=start, earliest=time(12, 0), latest=time(13, 0))
+        self.assertEqual(
+            [(slot.date, slot.start_time) for slot in slots],
+            [(self.tomorrow + timedelta(days=1), time(12, 0)), (self.tomorrow + timedelta(days=1), time(13, 0))]
+        )
+
+    @override_settings(NEXT_SLOT_CHUNK_DAYS=7, NEXT_SLOT_HORIZON_DAYS=366)
+    def test_benchmark_year_of_bookings(self):
+        """A year of bookings: chunked scanning stops early instead of reading the whole year."""
+        from booking.next_available import next_available_slots
+        self.fill_days(self.court, 200)
+        self.fill_days(self.court, 165, first_day=self.tomorrow + timedelta(days=201))
+        self.fill_days(self.pool, 365)
+        list(next_available_slots([self.court], count=1, start=self.start))  # warm the slot grid cache
+
+        # Free the pool tomorrow: found in the first chunk
+        Booking.objects.filter(facility=self.pool, date=self.tomorrow, start_time=time(15, 0)).delete()
+        with self.assertNumQueries(1):
+            slots = next_available_slots([self.court, self.pool], count=1, start=self.start)
+        self.assertEqual((slots[0].facility, slots[0].start_time), (self.pool, time(15, 0)))
+
+        # The court's only free day is 200 days out: 29 weekly chunks, not 200 per-day probes
+        with self.assertNumQueries(29):
+            slots = next_available_slots([self.court], count=1, start=self.start)
+        self.assertEqual(slots[0].date, self.tomorrow + timedelta(days=200))
+
+    def test_api(self):
+        url = reverse('booking:api_v1:next_slots')
+        response = self.client.get(url, {
+            'facility': [self.court.id, self.pool.id], 'after': self.tomorrow.isoformat(), 'count': 2,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['facility_name'], row['date'], row['start_time']) for row in response.json()['results']],
+            [('Court', str(self.tomorrow), '09:00'), ('Pool', str(self.tomorrow), '09:00')]
+        )
+        response = self.client.get(url, {'q': 'sports', 'after': self.tomorrow.isoformat(), 'count': 1})
+        self.assertEqual(response.json()['results'][0]['facility_name'], 'Pool')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'facility': self.court.id, 'latest': '25:00'}).status_code, 400)
+
+class BookingRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.facility = Facility.objects.create(name='Court', location='Outside', capacity=1)
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    def book(self, start_time, end_time, date=None, status='confirmed'):
+        return Booking.objects.create(
+            user=self.user, facility=self.facility, date=date or self.tomorrow,
+            start_time=start_time, end_time=end_time, status=status,
+        )
+
+    def rollups(self):
+        from booking.models import BookingRollup
+        return list(
+            BookingRollup.objects.order_by('date', 'hour', 'status')
+            .values_list('date', 'hour', 'status', 'bookings', 'booked_minutes')
+        )
+
+    def test_hour_spans(self):
+        from booking.rollups import hour_spans
+        self.assertEqual(hour_spans(time(9, 0), time(11, 0)), [(9, 60), (10, 60)])
+        self.assertEqual(hour_spans(time(9, 30), time(10, 15)), [(9, 30), (10, 15)])
+
+    def test_refresh_rebuilds_only_changed_days(self):
+        from booking.models import BookingRollup, RollupWatermark
+        from booking.rollups import refresh_rollups
+        self.book('09:00', '11:00')
+        later = self.book('09:00', '10:00', date=self.tomorrow + timedelta(days=1))
+        self.assertEqual(refresh_rollups(), 2)
+        self.assertEqual(self.rollups(), [
+            (self.tomorrow, 9, 'confirmed', 1, 60),
+            (self.tomorrow, 10, 'confirmed', 0, 60),
+            (later.date, 9, 'confirmed', 1, 60),
+        ])
+        # Move the watermark past the overlap window: nothing changed since
+        watermark = RollupWatermark.objects.get()
+        Booking.objects.update(updated_at=watermark.updated_at)
+        self.assertEqual(refresh_rollups(), 0)
+
+        later.status = 'cancelled'
+        later.save()
+        self.assertEqual(refresh_rollups(), 1)
+        self.assertEqual(
+            list(BookingRollup.objects.filter(date=later.date).values_list('status', 'bookings')),
+            [('cancelled', 1)]
+        )
+
+    def test_archived_bookings_still_counted(self):
+        from booking.archive import archive_bookings
+        from booking.rollups import refresh_rollups
+        self.book('09:00', '10:00')
+        archive_bookings(pause=0, now=timezone.now() + timedelta(days=200))
+        self.book('10:00', '11:00')
+        refresh_rollups()
+        self.assertEqual(self.rollups(), [
+            (self.tomorrow, 9, 'confirmed', 1, 60),
+            (self.tomorrow, 10, 'confirmed', 1, 60),
+        ])
+
+    def test_dashboard_is_staff_only_and_reads_rollups(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from booking.rollups import refresh_rollups
+        today = timezone.now().date()
+        self.book('09:00', '11:00', date=today)
+        refresh_rollups()
+        url = reverse('booking:utilization_dashboard')
+
+        self.client.login(username='testuser', password='testpass')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if '"booking_booking"' in query['sql']])
+        entry = response.context['facilities'][0]
+        self.assertEqual(entry['statuses']['confirmed'], 1)
+        self.assertEqual(entry['booked_minutes'], 120)
+        # Seven days of the default nine-hour grid
+        self.assertEqual(entry['offered_minutes'], 7 * 9 * 60)
+        self.assertContains(response, 'Court')
+
+class AdminScalingTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser('admin', 'admin@test.com', 'adminpass')
+        self.user = User.objects.create_user('alice', 'alice@test.com', 'testpass', phone_number='5551234')
+        self.court = Facility.objects.create(name='Tennis Court', location='Outside', capacity=1)
+        self.pool = Facility.objects.create(name='Pool', location='Inside', capacity=1)
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        self.court_booking = Booking.objects.create(
+            user=self.user, facility=self.court, date=tomorrow, start_time='10:00', end_time='11:00'
+        )
+        self.pool_booking = Booking.objects.create(
+            user=self.admin_user, facility=self.pool, date=tomorrow, start_time='10:00', end_time='11:00'
+        )
+
+    def search(self, term):
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+        model_admin = site._registry[Booking]
+        request = RequestFactory().get('/')
+        queryset, may_have_duplicates = model_admin.get_search_results(request, Booking.objects.all(), term)
+        self.assertFalse(may_have_duplicates)
+        return set(queryset)
+
+    def test_booking_search_matches_facility_and_user(self):
+        self.assertEqual(self.search('tennis'), {self.court_booking})
+        self.assertEqual(self.search('ALI'), {self.court_booking})
+        self.assertEqual(self.search('"tennis court" alice'), {self.court_booking})
+        self.assertEqual(self.search('pool alice'), set())
+
+    def test_paginator_uses_estimate_for_large_results(self):
+        from booking.paginators import EstimatedCountPaginator
+        queryset = Booking.objects.order_by('pk')
+        self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 2)
+        with patch('booking.paginators.estimated_count', return_value=5_000_000):
+            self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 5_000_000)
+        with patch('booking.paginators.estimated_count', return_value=3):
+            self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 2)
+
+    def test_large_changelists_skip_full_count(self):
+        from django.contrib.admin.sites import site
+        from booking.models import ArchivedBooking
+        for model in (Booking, ArchivedBooking, User):
+            model_admin = site._registry[model]
+            self.assertFalse(model_admin.show_full_result_count)
+        self.assertEqual(site._registry[Booking].date_hierarchy, 'date')
+        self.assertNotIn('facility', site._registry[Booking].list_filter)
+
+    def test_autocomplete_for_booking_fields(self):
+        self.client.login(username='admin', password='adminpass')
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'booking', 'model_name': 'booking', 'field_name': 'facility', 'term': 'tenn',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Tennis Court (Outside)'])
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'booking', 'model_name': 'booking', 'field_name': 'user', 'term': '5551',
+        })
+        self.assertEqual([result['text'] for result in response.json()['results']], ['alice'])
+
+class ProductionSettingsTests(TestCase):
+    def test_production_profile_passes_startup_check(self):
+        from django.conf import settings
+        from mini_booking.settings import production
+        from booking.checks import check_production_settings
+        with override_settings(
+            PRODUCTION=True,
+            DEBUG=production.DEBUG,
+            SECRET_KEY='s' * 50,
+            TEMPLATES=production.TEMPLATES,
+            CACHES=production.CACHES,
+        ), patch.dict(settings.DATABASES['default'], CONN_MAX_AGE=production.DATABASES['default']['CONN_MAX_AGE']):
+            self.assertEqual(check_production_settings(), [])
+
+    def test_debug_grade_settings_refuse_to_start(self):
+        from django.apps import apps
+        from django.core.exceptions import ImproperlyConfigured
+        from booking.checks import check_production_settings
+        with override_settings(PRODUCTION=True, DEBUG=True):
+            self.assertEqual(
+                [error.id for error in check_production_settings()],
+                ['booking.E001', 'booking.E002', 'booking.E003', 'booking.E004', 'booking.E005']
+            )
+            with self.assertRaisesMessage(ImproperlyConfigured, 'booking.E001'):
+                apps.get_app_config('booking').ready()
+        # Development settings are not checked
+        self.assertEqual(check_production_settings(), [])
+
+class CeleryRoutingTests(TestCase):
+    def test_tasks_routed_to_their_queues(self):
+        from mini_booking.celery import app
+        from booking import tasks
+        routes = {
+            tasks.send_booking_confirmation_email: 'notifications',
+            tasks.expire_pending_bookings: 'maintenance',
+            tasks.archive_old_bookings: 'maintenance',
+            tasks.maintain_booking_partitions: 'maintenance',
+            tasks.refresh_booking_rollups: 'analytics',
+        }
+        for task, queue in routes.items():
+            self.assertEqual(app.amqp.router.route({}, task.name)['queue'].name, queue)
+        self.assertTrue(tasks.send_booking_confirmation_email.acks_late)
+        self.assertEqual(tasks.send_booking_confirmation_email.rate_limit, '20/s')
+
+    @override_settings(
+        CELERY_BROKER_URL='memory://',
+        CELERY_RESULT_BACKEND='cache+memory://',
+        CELERY_TASK_ANNOTATIONS={},
+    )
+    def test_email_backlog_does_not_delay_maintenance(self):
+        """Queue isolation with an in-memory broker and the production routes."""
+        from celery import Celery
+        from celery.contrib.testing.worker import start_worker
+
+        from mini_booking.celery import app as celery_app
+
+        # start_worker() makes its app the current one; restore ours afterwards
+        self.addCleanup(celery_app.set_current)
+        app = Celery('throughput', set_as_current=False)
+        app.config_from_object('django.conf:settings', namespace='CELERY')
+
+        @app.task(name='booking.tasks.send_booking_confirmation_email', shared=False)
+        def send_email(booking_id):
+            return booking_id
+
+        @app.task(name='booking.tasks.expire_pending_bookings', shared=False)
+        def expire():
+            return 'expired'
+
+        emails = [send_email.delay(booking_id) for booking_id in range(500)]
+        expired = expire.delay()
+        with start_worker(app, queues=['maintenance'], pool='solo', perform_ping_check=False, loglevel='WARNING'):
+            self.assertEqual(expired.get(timeout=10), 'expired')
+        self.assertFalse(any(result.ready() for result in emails))
+
+        with start_worker(app, queues=['notifications'], pool='solo', perform_ping_check=False, loglevel='WARNING'):
+            self.assertEqual([result.get(timeout=60) for result in emails], list(range(500)))
+
+class TaskResultTests(TestCase):
+    def run_in_worker(self, task, *args):
+        """Trace the task the way a worker does, storing its result unless ignored."""
+        from uuid import uuid4
+        from celery.app.trace import build_tracer
+        task = task._get_current_object()
+        tracer = build_tracer(task.name, task, app=task.app)
+        return tracer(str(uuid4()), args, {}, {})
+
+    def test_confirmation_email_writes_no_result(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django_celery_results.models import TaskResult
+        from booking.tasks import expire_pending_bookings, send_booking_confirmation_email
+        user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        facility = Facility.objects.create(name='Court', location='Outside', capacity=1)
+        booking = Booking.objects.create(
+            user=user, facility=facility, date=timezone.now().date() + timedelta(days=1),
+            start_time='10:00', end_time='11:00',
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.run_in_worker(send_booking_confirmation_email, booking.id)
+        self.assertFalse([query for query in queries if 'django_celery_results' in query['sql']])
+        self.assertFalse(TaskResult.objects.exists())
+
+        self.run_in_worker(expire_pending_bookings)
+        self.assertEqual(TaskResult.objects.count(), 1)
+
+    def test_purge_deletes_expired_results_in_chunks(self):
+        from django_celery_results.models import TaskResult
+        from booking.task_results import purge_task_results
+        now = timezone.now()
+        TaskResult.objects.bulk_create(
+            [TaskResult(task_id=f'old-{index}', status='SUCCESS') for index in range(5)]
+            + [TaskResult(task_id='recent', status='SUCCESS')]
+        )
+        # date_done is auto_now
+        TaskResult.objects.exclude(task_id='recent').update(date_done=now - timedelta(days=2))
+        self.assertEqual(purge_task_results(chunk_size=2, pause=0, now=now), 5)
+        self.assertEqual(list(TaskResult.objects.values_list('task_id', flat=True)), ['recent'])
+
+class BootstrapCommandTests(TestCase):
+    def bootstrap(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('bootstrap', stdout=out)
+        return out.getvalue()
+
+    def test_second_boot_skips_completed_steps(self):
+        import tempfile
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(__import__('shutil').rmtree, static_root)
+        environ = {'DJANGO_SUPERUSER_USERNAME': 'admin', 'DJANGO_SUPERUSER_PASSWORD': 'adminpass'}
+        with override_settings(
+            STATIC_ROOT=static_root,
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        ), patch.dict('os.environ', environ):
+            first = self.bootstrap()
+            self.assertIn('migrate: skipped, no unapplied migrations', first)
+            self.assertIn('collectstatic: collected', first)
+            self.assertIn('sample data: created sample facilities', first)
+            self.assertIn('superuser: created admin', first)
+            self.assertTrue(User.objects.get(username='admin').is_superuser)
+
+            second = self.bootstrap()
+            self.assertIn('collectstatic: skipped, static files unchanged', second)
+            self.assertIn('sample data: skipped, facilities exist', second)
+            self.assertIn('superuser: skipped, admin exists', second)
+            self.assertIn('Bootstrap finished in', second)
+
+class OwnBookingQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.facility = Facility.objects.create(name='Court', location='Outside', capacity=1)
+        self.booking = Booking.objects.create(
+            user=self.user, facility=self.facility, date=timezone.now().date() + timedelta(days=1),
+            start_time='10:00', end_time='11:00',
+        )
+        self.client.login(username='testuser', password='testpass')
+        # Warm the session cache and the schedule grid cache
+        self.client.get(reverse('booking:booking_list'))
+
+    def url(self, name, booking=None):
+        return reverse(name, kwargs={'pk': (booking or self.booking).pk})
+
+    def test_detail_fetches_booking_once(self):
+        # Session user, then the booking joined with its facility
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url('booking:booking_detail'))
+        self.assertContains(response, 'Court')
+
+    def test_update_fetches_booking_once(self):
+        # Session user, the booking, the facility choices of the form
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url('booking:booking_update'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_delete_fetches_booking_once(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url('booking:booking_delete')).status_code, 200)
+        # Session user, the booking, its delete and the seat release
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url('booking:booking_delete'), follow=False)
+        self.assertRedirects(response, reverse('booking:booking_list'), fetch_redirect_response=False)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_other_users_booking_is_forbidden(self):
+        other = User.objects.create_user('otheruser', 'other@test.com', 'otherpass')
+        booking = Booking.objects.create(
+            user=other, facility=self.facility, date=self.booking.date, start_time='12:00', end_time='13:00',
+        )
+        for name in ('booking:booking_detail', 'booking:booking_update', 'booking:booking_delete'):
+            self.assertEqual(self.client.get(self.url(name, booking)).status_code, 403)
+
+    def test_missing_booking_is_not_found(self):
+        for name in ('booking:booking_detail', 'booking:booking_update', 'booking:booking_delete'):
+            response = self.client.get(reverse(name, kwargs={'pk': self.booking.pk + 100}))
+            self.assertEqual(response.status_code, 404)
+
+class FacilityCalendarTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # No Redis here; only the calendar invalidation matters
+        publish = patch('booking.events.publish')
+        publish.start()
+        self.addCleanup(publish.stop)
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.facility = Facility.objects.create(name='Gym', location='Inside', capacity=2, shared_slots=True)
+        self.day = timezone.now().date().replace(day=1) + timedelta(days=40)
+        self.month = self.day.strftime('%Y-%m')
+
+    def book(self, start_time, end_time, user=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Booking.objects.create(
+                user=user or self.user, facility=self.facility, date=self.day,
+                start_time=start_time, end_time=end_time,
+            )
+
+    def calendar(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        url = reverse('booking:api_v1:facility_calendar', kwargs={'pk': self.facility.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'month': self.month})
+        self.assertEqual(response.status_code, 200)
+        booking_queries = [query for query in queries if '"booking_booking"' in query['sql']]
+        day = next(day for day in response.json()['days'] if day['date'] == self.day.isoformat())
+        return day, len(booking_queries)
+
+    def test_month_is_one_cached_query(self):
+        self.book('09:00', '11:00')
+        self.book('10:00', '11:00')
+        day, queries = self.calendar()
+        self.assertEqual(queries, 1)
+        self.assertEqual(
+            [(slot['start_time'], slot['booked'], slot['free']) for slot in day['slots'][:3]],
+            [('09:00', 1, 1), ('10:00', 2, 0), ('11:00', 0, 2)]
+        )
+        self.assertEqual(day['free_slots'], 8)
+        _, queries = self.calendar()
+        self.assertEqual(queries, 0)
+
+    def test_booking_writes_invalidate_the_month(self):
+        self.calendar()
+        booking = self.book('12:00', '13:00')
+        day, queries = self.calendar()
+        self.assertEqual(queries, 1)
+        self.assertEqual(day['slots'][3]['booked'], 1)
+
+        self.client.login(username='testuser', password='testpass')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('booking:api_v1:booking_cancel', kwargs={'pk': booking.pk}))
+        day, _ = self.calendar()
+        self.assertEqual(day['slots'][3]['booked'], 0)
+
+    def test_calendar_page(self):
+        self.book('09:00', '10:00')
+        url = reverse('booking:facility_calendar', kwargs={'pk': self.facility.pk})
+        response = self.client.get(url, {'month': self.month})
+        self.assertContains(response, 'Gym')
+        self.assertContains(response, '(1 booked)')
+        self.assertEqual(len(response.context['weeks'][0]), 7)
+        response = self.client.get(url, {'month': 'not-a-month'})
+        self.assertEqual(response.context['month_start'], timezone.now().date().replace(day=1))
+        response = self.client.get(reverse('booking:api_v1:facility_calendar', kwargs={'pk': self.facility.pk}),
+                                   {'month': '2024-13'})
+        self.assertEqual(response.status_code, 400)
+
+class BookingReminderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.facility = Facility.objects.create(name='Gym', location='Inside', capacity=10, shared_slots=True)
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+        # Queued batches run inline
+        from booking import reminders
+        delay = patch('booking.tasks.send_reminder_batch.delay', side_effect=reminders.send_reminder_batch)
+        self.delay = delay.start()
+        self.addCleanup(delay.stop)
+
+    def book(self, hour, status='confirmed', user=None):
+        return Booking.objects.create(
+            user=user or self.user, facility=self.facility, date=self.tomorrow,
+            start_time=time(hour, 0), end_time=time(hour + 1, 0), status=status,
+        )
+
+    def at(self, day, hour, minute=0):
+        return datetime.combine(day, time(hour, minute))
+
+    def test_reminders_sent_once_per_kind(self):
+        from django.core import mail
+        from booking.models import BookingReminder
+        from booking.reminders import schedule_reminders
+        booking = self.book(9)
+        self.book(10, status='pending')
+        self.book(15)
+
+        # 24 hours ahead: only the confirmed 09:00 booking is in the window
+        self.assertEqual(schedule_reminders(now=self.at(self.tomorrow - timedelta(days=1), 9)), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Booking Reminder - Gym', mail.outbox[0].subject)
+        self.assertEqual(schedule_reminders(now=self.at(self.tomorrow - timedelta(days=1), 9, 5)), 0)
+
+        self.assertEqual(schedule_reminders(now=self.at(self.tomorrow, 8)), 1)
+        self.assertEqual(schedule_reminders(now=self.at(self.tomorrow, 8, 5)), 0)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(
+            sorted(BookingReminder.objects.filter(booking=booking).values_list('kind', flat=True)), ['1h', '24h']
+        )
+        self.assertFalse(BookingReminder.objects.filter(sent_at__isnull=True).exists())
+
+    def test_batches_share_one_task_and_connection_each(self):
+        from django.core import mail
+        from booking.reminders import schedule_reminders
+        users = [User.objects.create_user(f'user{index}', f'user{index}@test.com', 'pw') for index in range(5)]
+        for user in users:
+            self.book(9, user=user)
+        with patch('booking.reminders.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual(schedule_reminders(now=self.at(self.tomorrow, 8), batch_size=2), 5)
+        self.assertEqual(self.delay.call_count, 3)
+        self.assertEqual(get_connection.call_count, 3)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_failed_batch_is_released_for_the_next_run(self):
+        from django.core import mail
+        from booking.models import BookingReminder
+        from booking.reminders import schedule_reminders
+        self.book(9)
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError):
+            with self.assertRaises(OSError):
+                schedule_reminders(now=self.at(self.tomorrow, 8))
+        self.assertFalse(BookingReminder.objects.exists())
+        self.assertEqual(schedule_reminders(now=self.at(self.tomorrow, 8, 5)), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_batch_failing_part_way_only_releases_unsent_reminders(self):
+        from django.core import mail
+        from django.core.mail.backends.locmem import EmailBackend
+        from booking.models import BookingReminder
+        from booking.reminders import schedule_reminders
+        for index in range(3):
+            self.book(9, user=User.objects.create_user(f'user{index}', f'user{index}@test.com', 'pw'))
+        send_messages = EmailBackend.send_messages
+        calls = []
+
+        def fail_second(backend, messages):
+            calls.append(messages)
+            if len(calls) == 2:
+                raise OSError
+            return send_messages(backend, messages)
+
+        with patch.object(EmailBackend, 'send_messages', fail_second):
+            with self.assertRaises(OSError):
+                schedule_reminders(now=self.at(self.tomorrow, 8))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(BookingReminder.objects.filter(sent_at__isnull=False).count(), 1)
+        self.assertEqual(BookingReminder.objects.count(), 1)
+        self.assertEqual(schedule_reminders(now=self.at(self.tomorrow, 8, 5)), 2)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(len({message.to[0] for message in mail.outbox}), 3)
+
+    def test_archive_purges_old_markers(self):
+        from booking.archive import archive_bookings
+        from booking.models import BookingReminder
+        from booking.reminders import schedule_reminders
+        self.book(9)
+        schedule_reminders(now=self.at(self.tomorrow, 8))
+        archive_bookings(pause=0)
+        self.assertTrue(BookingReminder.objects.exists())
+        archive_bookings(pause=0, now=timezone.now() + timedelta(days=3))
+        self.assertFalse(BookingReminder.objects.exists())
+
+    def test_window_across_midnight(self):
+        from booking.reminders import starting_between
+        late = self.book(9)
+        Booking.objects.filter(pk=late.pk).update(date=self.tomorrow - timedelta(days=1), start_time=time(23, 50))
+        early = self.book(10)
+        Booking.objects.filter(pk=early.pk).update(start_time=time(0, 10))
+        self.book(11)
+        window = starting_between(
+            Booking.objects.all(), self.at(self.tomorrow - timedelta(days=1), 23, 30), self.at(self.tomorrow, 0, 30)
+        )
+        self.assertEqual(set(window), {late, early})
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        from booking.idempotency import get_backend
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.facility = Facility.objects.create(name='Court', location='Outside', capacity=1)
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+        self.client.login(username='testuser', password='testpass')
+        get_backend().clear()
+        email = patch('booking.tasks.send_booking_confirmation_email.delay')
+        self.send_email = email.start()
+        self.addCleanup(email.stop)
+
+    def ajax_create(self, key, start_time='10:00'):
+        data = {'facility': self.facility.id, 'date': self.tomorrow, 'start_time': start_time}
+        return self.client.post(
+            reverse('booking:booking_create'), data,
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retried_ajax_create_replays_without_touching_bookings(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        first = self.ajax_create('retry-1')
+        self.assertEqual(first.json()['success'], True)
+
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.ajax_create('retry-1')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertFalse([q for q in queries.captured_queries if 'booking_booking' in q['sql']])
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(self.send_email.call_count, 1)
+
+        # Another key is a new request and loses the slot to the first
+        self.assertEqual(self.ajax_create('retry-2').json()['success'], False)
+
+    def test_key_reused_for_different_request_or_still_in_progress(self):
+        import hashlib
+        from booking.idempotency import _call, store_key
+        self.ajax_create('retry-1')
+        self.assertEqual(self.ajax_create('retry-1', start_time='11:00').status_code, 422)
+
+        path = reverse('booking:booking_create')
+        _call('claim', store_key(self.user.pk, path, 'busy'), hashlib.sha256(b'').hexdigest(), 60)
+        response = self.client.post(
+            path, '', content_type='application/x-www-form-urlencoded', HTTP_IDEMPOTENCY_KEY='busy',
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_api_create_falls_back_to_database_without_redis(self):
+        from redis.exceptions import ConnectionError
+        from booking.idempotency import purge_expired
+        from booking.models import IdempotencyKey
+        payload = {'facility': self.facility.id, 'date': str(self.tomorrow), 'start_time': '10:00'}
+        url = reverse('booking:api_v1:booking_list')
+        with override_settings(IDEMPOTENCY_BACKEND='booking.idempotency.RedisBackend'), \
+                patch('redis.Redis.set', side_effect=ConnectionError), \
+                patch('booking.api.send_booking_confirmation_email'):
+            responses = [
+                self.client.post(url, payload, content_type='application/json', HTTP_IDEMPOTENCY_KEY='api-1')
+                for _ in range(2)
+            ]
+        self.assertEqual([r.status_code for r in responses], [201, 201])
+        self.assertEqual(responses[1].json(), responses[0].json())
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(purge_expired(), 1)
+
+    def test_killed_request_only_locks_its_key_briefly(self):
+        from booking.idempotency import _call, store_key
+        path = reverse('booking:booking_create')
+        with override_settings(IDEMPOTENCY_LOCK_SECONDS=0):
+            # A worker killed after claiming never releases the key
+            _call('claim', store_key(self.user.pk, path, 'retry-1'), 'fingerprint', 0)
+            first = self.ajax_create('retry-1')
+            self.assertEqual(first.json()['success'], True)
+            # The stored response is kept for the full TTL, not the lock's
+            self.assertEqual(self.ajax_create('retry-1')['Idempotent-Replayed'], 'true')
+
+    def test_response_stored_in_database_when_redis_drops_after_claim(self):
+        from redis.exceptions import ConnectionError
+        from booking.models import IdempotencyKey
+        with override_settings(IDEMPOTENCY_BACKEND='booking.idempotency.RedisBackend'), \
+                patch('redis.Redis.set', side_effect=[True, ConnectionError]):
+            self.assertEqual(self.ajax_create('retry-1').json()['success'], True)
+        stored = IdempotencyKey.objects.get()
+        self.assertEqual(stored.status_code, 200)
+        self.assertGreater(stored.expires_at, timezone.now() + timedelta(hours=23))
+
+    def test_server_errors_release_the_key(self):
+        with patch('booking.views.BookingCreateView.form_valid', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.ajax_create('retry-1')
+        self.assertEqual(self.ajax_create('retry-1').json()['success'], True)
+
+class BookingEventTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.facility = Facility.objects.create(name='Court', location='Outside', capacity=1)
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    def book(self, hour, status='pending'):
+        return Booking.objects.create(
+            user=self.user, facility=self.facility, date=self.tomorrow,
+            start_time=time(hour, 0), end_time=time(hour + 1, 0), status=status,
+        )
+
+    def history(self, booking_id):
+        from booking.models import BookingEvent
+        return list(
+            BookingEvent.objects.filter(booking_id=booking_id)
+            .values_list('action', 'from_status', 'to_status')
+        )
+
+    def test_request_history_is_written_with_one_insert(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from booking import audit
+
+        with CaptureQueriesContext(connection) as queries:
+            with audit.collect(source='test'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    booking = self.book(10)
+                    booking.start_time, booking.end_time = time(11, 0), time(12, 0)
+                    booking.save()
+                    booking.status = 'confirmed'
+                    booking.save()
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "booking_bookingevent"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self.history(booking.pk), [
+            ('created', '', 'pending'),
+            ('rescheduled', 'pending', 'pending'),
+            ('status_changed', 'pending', 'confirmed'),
+        ])
+
+    def test_user_delete_and_admin_action_are_attributed(self):
+        from booking.admin import BookingAdmin
+        from booking.models import BookingEvent
+        deleted, cancelled = self.book(10), self.book(12)
+        self.client.login(username='testuser', password='testpass')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('booking:booking_delete', kwargs={'pk': deleted.pk}))
+        event = BookingEvent.objects.get(booking_id=deleted.pk, action='deleted')
+        self.assertEqual((event.actor, event.source), (self.user, f'POST /booking/{deleted.pk}/delete/'))
+        self.assertEqual(event.start_time, time(10, 0))
+
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+        request = RequestFactory().post('/admin/')
+        request.user = self.user
+        with self.captureOnCommitCallbacks(execute=True), patch.object(BookingAdmin, 'message_user'):
+            BookingAdmin(Booking, site).cancel_bookings(request, Booking.objects.filter(pk=cancelled.pk))
+        self.assertEqual(self.history(cancelled.pk)[-1], ('status_changed', 'pending', 'cancelled'))
+
+    def test_expiry_and_archive_are_recorded_but_rollbacks_are_not(self):
+        from django.db import transaction
+        from booking.archive import archive_chunk
+        from booking.expiry import expire_chunk
+        later = timezone.now() + timedelta(days=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self.book(10)
+            expire_chunk(10, now=later)
+            archive_chunk(10, now=later + timedelta(days=2))
+        self.assertEqual(self.history(booking.pk), [
+            ('created', '', 'pending'),
+            ('status_changed', 'pending', 'expired'),
+            ('archived', 'expired', ''),
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    rolled_back = self.book(14)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.history(rolled_back.pk), [])
+
+class APITokenTests(TestCase):
+    def setUp(self):
+        from booking.api_tokens import issue
+        self.user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        self.facility = Facility.objects.create(name='Court', location='Outside', capacity=1)
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+        self.token = issue(self.user, 'mobile')
+        self.client = Client(enforce_csrf_checks=True)
+        email = patch('booking.api.send_booking_confirmation_email')
+        email.start()
+        self.addCleanup(email.stop)
+
+    def create(self, **headers):
+        payload = {'facility': self.facility.id, 'date': str(self.tomorrow), 'start_time': '10:00'}
+        return self.client.post(
+            reverse('booking:api_v1:booking_list'), payload, content_type='application/json', **headers
+        )
+
+    def test_token_clients_write_without_csrf(self):
+        from booking.models import APIToken
+        response = self.create(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, 201)
+        booking = Booking.objects.get()
+        self.assertEqual(booking.user, self.user)
+
+        cancel = reverse('booking:api_v1:booking_cancel', kwargs={'pk': booking.pk})
+        response = self.client.post(cancel, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.json()['status'], 'cancelled')
+
+        self.assertEqual(self.create(HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.create(HTTP_AUTHORIZATION='Basic abc').status_code, 401)
+        # Only the digest is stored
+        self.assertFalse(APIToken.objects.filter(key_hash=self.token).exists())
+
+    def test_session_writes_still_need_the_csrf_token(self):
+        self.client.login(username='testuser', password='testpass')
+        response = self.create()
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Booking.objects.exists())
+
+        self.client.get(reverse('booking:booking_create'))
+        response = self.create(HTTP_X_CSRFTOKEN=self.client.cookies['csrftoken'].value)
+        self.assertEqual(response.status_code, 201)
+
+    def test_create_api_token_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from booking.api_tokens import authenticate
+        out = StringIO()
+        call_command('create_api_token', 'testuser', '--name', 'partner', stdout=out)
+        self.assertEqual(authenticate(out.getvalue().splitlines()[-1]), self.user)
+
+class BookingEventFlushTests(TransactionTestCase):
+    @patch('booking.events.publish')
+    def test_archive_and_expiry_write_events_per_chunk(self, publish):
+        from booking import audit
+        from booking.archive import archive_bookings
+        from booking.expiry import expire_pending_bookings
+        from booking.models import BookingEvent
+        user = User.objects.create_user('testuser', 'test@test.com', 'testpass')
+        facility = Facility.objects.create(name='Court', location='Outside', capacity=1)
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        for hour in (9, 10, 11):
+            Booking.objects.create(
+                user=user, facility=facility, date=tomorrow, start_time=time(hour, 0), end_time=time(hour + 1, 0),
+            )
+        later = timezone.now() + timedelta(days=3)
+
+        with patch('booking.audit.write', side_effect=audit.write) as write:
+            self.assertEqual(expire_pending_bookings(chunk_size=2, now=later), 3)
+            self.assertEqual(archive_bookings(chunk_size=2, pause=0, now=later + timedelta(days=2)), 3)
+        self.assertEqual([len(call.args[0]) for call in write.call_args_list], [2, 1, 2, 1])
+        self.assertEqual(BookingEvent.objects.filter(action='archived', source='booking.archive').count(), 3)
+        self.assertEqual(BookingEvent.objects.filter(to_status='expired', source='booking.expiry').count(), 3)
@@ -1,9 +1,10 @@
-from django.urls import path
+from django.urls import include, path
+from . import api
 from .views import (
     CustomLoginView, CustomLogoutView, SignUpView, HomeView,
     BookingListView, BookingDetailView, BookingCreateView,
     BookingUpdateView, BookingDeleteView, available_slots, FacilityListView,
-    health_check
+    health_check, slot_events, UtilizationDashboardView, FacilityCalendarView
 )
 
 app_name = 'booking'
@@ -19,6 +20,10 @@ urlpatterns = [
     path('booking/<int:pk>/update/', BookingUpdateView.as_view(), name='booking_update'),
     path('booking/<int:pk>/delete/', BookingDeleteView.as_view(), name='booking_delete'),
     path('api/available-slots/', available_slots, name='available_slots'),
+    path('api/slot-events/', slot_events, name='slot_events'),
+    path('api/v1/', include((api.urlpatterns, 'api_v1'))),
     path('facilities/', FacilityListView.as_view(), name='facility_list'),
+    path('facilities/<int:pk>/calendar/', FacilityCalendarView.as_view(), name='facility_calendar'),
+    path('dashboard/utilization/', UtilizationDashboardView.as_view(), name='utilization_dashboard'),
     path('health/', health_check, name='health_check'),
 ] 
\ No newline at end of file
@@ -3,10 +3,12 @@ from django.contrib.auth.forms import UserCreationForm
 from django.urls import reverse_lazy
 from django.views.generic import CreateView, TemplateView, ListView, DetailView, UpdateView, DeleteView, RedirectView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from .forms import BookingForm
-from .models import Booking, Facility
+from .forms import BookingForm, FacilitySearchForm
+from .models import ArchivedBooking, Booking, Facility
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from .tasks import send_booking_confirmation_email
 from django.db import connections
@@ -14,6 +16,18 @@ from django.db.utils import OperationalError
 from redis import Redis
 from redis.exceptions import RedisError
 from django.conf import settings
+from .routers import read_from_replica
+from .availability import unavailable_slots
+from . import events
+from .search import search_facilities
+from .seats import SlotFull
+from .idempotency import idempotent
+from django.utils.decorators import method_decorator
+from .rollups import utilization_report
+from .month_calendar import month_calendar, parse_month
+import calendar
+from contextlib import aclosing
+from datetime import date as date_cls, timedelta
 
 class CustomLoginView(LoginView):
     template_name = 'registration/login.html'
@@ -33,9 +47,23 @@ class SignUpView(CreateView):
     template_name = 'registration/signup.html'
     success_url = reverse_lazy('login')
 
+class ReplicaReadMixin:
+    """Serve GET requests (including template rendering) from a read replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        with read_from_replica():
+            response = super().dispatch(request, *args, **kwargs)
+            # Querysets are evaluated while rendering, so render inside the block
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+        return response
+
 class HomeView(TemplateView):
     template_name = 'booking/home.html'
 
+@method_decorator(idempotent, name='post')
 class BookingCreateView(LoginRequiredMixin, CreateView):
     model = Booking
     form_class = BookingForm
@@ -55,19 +83,28 @@ class BookingCreateView(LoginRequiredMixin, CreateView):
                 initial['facility'] = Facility.objects.get(id=facility_id)
             except Facility.DoesNotExist:
                 pass
+        try:
+            initial['date'] = date_cls.fromisoformat(self.request.GET['date'])
+        except (KeyError, ValueError):
+            pass
         return initial
 
     def form_valid(self, form):
         form.instance.user = self.request.user
-        if self.request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            self.object = form.save()
-            # Send confirmation email asynchronously
-            send_booking_confirmation_email.delay(self.object.id)
-            return JsonResponse({
-                'success': True,
-                'redirect_url': self.get_success_url()
-            })
-        return super().form_valid(form)
+        try:
+            if self.request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                self.object = form.save()
+                # Send confirmation email asynchronously
+                send_booking_confirmation_email.delay(self.object.id)
+                return JsonResponse({
+                    'success': True,
+                    'redirect_url': self.get_success_url()
+                })
+            return super().form_valid(form)
+        except SlotFull as e:
+            # Another customer took the last seat after the form was validated
+            form.add_error(None, str(e))
+            return self.form_invalid(form)
 
     def form_invalid(self, form):
         if self.request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -77,33 +114,71 @@ class BookingCreateView(LoginRequiredMixin, CreateView):
             })
         return super().form_invalid(form)
 
-class BookingListView(LoginRequiredMixin, ListView):
+class BookingListView(ReplicaReadMixin, LoginRequiredMixin, ListView):
     model = Booking
     template_name = 'booking/booking_list.html'
     context_object_name = 'bookings'
     ordering = ['-date', '-start_time']
+    archived_paginate_by = 20
 
     def get_queryset(self):
         return super().get_queryset().filter(user=self.request.user)
 
-class BookingDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Archived bookings live in a separate table and are only read on
+        # demand, a page at a time; ?archived=<n> shows page n
+        context['show_archived'] = bool(self.request.GET.get('archived'))
+        if context['show_archived']:
+            paginator = Paginator(
+                ArchivedBooking.objects.filter(user=self.request.user).select_related('facility'),
+                self.archived_paginate_by,
+            )
+            context['archived_bookings'] = paginator.get_page(self.request.GET.get('archived'))
+        return context
+
+class OwnBookingMixin(UserPassesTestMixin):
+    """
+    Single-booking views of the requesting user's bookings. The booking (with
+    its facility) is fetched once, scoped to the user, and shared by
+    test_func and the view; other users' bookings are forbidden and missing
+    ones not found.
+    """
+
+    def get_queryset(self):
+        return Booking.objects.filter(user=self.request.user).select_related('facility')
+
+    def get_object(self, queryset=None):
+        if not hasattr(self, '_booking'):
+            self._booking = super().get_object(queryset)
+        return self._booking
+
+    def test_func(self):
+        try:
+            booking = self.get_object()
+        except Http404:
+            # Only looked up again when the user's own bookings do not have it
+            if Booking.objects.filter(pk=self.kwargs[self.pk_url_kwarg]).exists():
+                return False
+            raise
+        return self.booking_allowed(booking)
+
+    def booking_allowed(self, booking):
+        return True
+
+class BookingDetailView(ReplicaReadMixin, LoginRequiredMixin, OwnBookingMixin, DetailView):
     model = Booking
     template_name = 'booking/booking_detail.html'
     context_object_name = 'booking'
 
-    def test_func(self):
-        booking = self.get_object()
-        return booking.user == self.request.user
-
-class BookingUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class BookingUpdateView(LoginRequiredMixin, OwnBookingMixin, UpdateView):
     model = Booking
     form_class = BookingForm
     template_name = 'booking/booking_form.html'
     success_url = reverse_lazy('booking:booking_list')
 
-    def test_func(self):
-        booking = self.get_object()
-        return booking.user == self.request.user and booking.status == 'pending'
+    def booking_allowed(self, booking):
+        return booking.status == 'pending'
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -111,51 +186,95 @@ class BookingUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return kwargs
 
     def form_valid(self, form):
+        try:
+            response = super().form_valid(form)
+        except SlotFull as e:
+            form.add_error(None, str(e))
+            return self.form_invalid(form)
         messages.success(self.request, 'Booking updated successfully!')
-        return super().form_valid(form)
+        return response
 
-class BookingDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class BookingDeleteView(LoginRequiredMixin, OwnBookingMixin, DeleteView):
     model = Booking
     template_name = 'booking/booking_confirm_delete.html'
     success_url = reverse_lazy('booking:booking_list')
 
-    def test_func(self):
-        booking = self.get_object()
-        return booking.user == self.request.user and booking.status != 'confirmed'
+    def booking_allowed(self, booking):
+        return booking.status != 'confirmed'
 
-    def delete(self, request, *args, **kwargs):
-        messages.success(request, 'Booking cancelled successfully!')
-        return super().delete(request, *args, **kwargs)
+    def form_valid(self, form):
+        # DeleteView handles POST through form_valid(), not delete()
+        messages.success(self.request, 'Booking cancelled successfully!')
+        return super().form_valid(form)
 
+@read_from_replica()
 def available_slots(request):
-    facility_id = request.GET.get('facility')
-    date = request.GET.get('date')
-    
-    if not facility_id or not date:
+    try:
+        facility_id = int(request.GET['facility'])
+        date = date_cls.fromisoformat(request.GET['date'])
+    except (KeyError, ValueError):
         return JsonResponse({'error': 'Missing parameters'}, status=400)
     
-    # Get all booked and pending slots for the facility and date
-    booked_slots = Booking.objects.filter(
-        facility_id=facility_id,
-        date=date,
-        status__in=['confirmed', 'pending']  # Hem onaylı hem bekleyen bookingleri kontrol et
-    ).values_list('start_time', flat=True)
-    
-    # Convert time objects to string format
-    booked_slots = [t.strftime('%H:%M') for t in booked_slots]
-    
-    return JsonResponse({'booked_slots': booked_slots})
+    # Slots held by other customers mid-checkout count as taken
+    slots = unavailable_slots(facility_id, date, exclude_hold=request.GET.get('hold'))
+    return JsonResponse({'booked_slots': slots})
+
+class EventStreamResponse(StreamingHttpResponse):
+    """
+    Server-sent events. When the handler stops reading the response (the
+    request cancelled on disconnect, or an error while sending), the event
+    stream is closed right away instead of whenever the garbage collector
+    gets to it.
+    """
+
+    def __init__(self, stream):
+        super().__init__(stream, content_type='text/event-stream')
+        self.stream = stream
+        self['Cache-Control'] = 'no-cache'
+        self['X-Accel-Buffering'] = 'no'
 
-class FacilityListView(ListView):
+    async def __aiter__(self):
+        async with aclosing(self.stream):
+            async for part in super().__aiter__():
+                yield part
+
+async def slot_events(request):
+    try:
+        facility_id = int(request.GET['facility'])
+        date = date_cls.fromisoformat(request.GET['date'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Missing parameters'}, status=400)
+
+    if isinstance(request, ASGIRequest):
+        if not events.streams_available():
+            # The page falls back to fetching the slots once
+            response = JsonResponse({'error': 'Too many live streams'}, status=503)
+            response['Retry-After'] = str(settings.SLOT_EVENTS_HEARTBEAT)
+            return response
+        stream = events.stream_slot_events(facility_id, date)
+        return EventStreamResponse(stream)
+    response = StreamingHttpResponse(
+        events.stream_slot_events_sync(facility_id, date), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+class FacilityListView(ReplicaReadMixin, ListView):
     model = Facility
     template_name = 'booking/facility_list.html'
     context_object_name = 'facilities'
 
     def get_queryset(self):
-        return Facility.objects.all()
+        self.search_form = FacilitySearchForm(self.request.GET)
+        if not self.search_form.is_valid():
+            return Facility.objects.all()
+        data = self.search_form.cleaned_data
+        return search_facilities(data['q'], data['date'], data['time'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['search_form'] = self.search_form
         today = timezone.now().date()
         
         # Bugünün tüm onaylanmış VE bekleyen bookinglerini tek sorguda al
@@ -179,6 +298,60 @@ class FacilityListView(ListView):
         
         return context 
 
+class FacilityCalendarView(DetailView):
+    """Month of slot occupancy for one facility (?month=YYYY-MM, default this month)."""
+    model = Facility
+    template_name = 'booking/facility_calendar.html'
+    context_object_name = 'facility'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        today = timezone.now().date()
+        try:
+            year, month = parse_month(self.request.GET.get('month', ''))
+        except ValueError:
+            year, month = today.year, today.month
+        days = {day['date']: day for day in month_calendar(self.object, year, month)}
+        first = date_cls(year, month, 1)
+        previous_month = first - timedelta(days=1)
+        next_month = first + timedelta(days=calendar.monthrange(year, month)[1])
+        context.update({
+            'month_start': first,
+            'weeks': [
+                [days.get(date) for date in week]
+                for week in calendar.Calendar().monthdatescalendar(year, month)
+            ],
+            'previous_month': previous_month.strftime('%Y-%m'),
+            'next_month': next_month.strftime('%Y-%m'),
+            'today': today,
+        })
+        return context
+
+class UtilizationDashboardView(ReplicaReadMixin, LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """Staff utilization report, read from the hourly rollups only."""
+    template_name = 'booking/utilization_dashboard.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            days = min(max(int(self.request.GET.get('days', settings.UTILIZATION_DASHBOARD_DAYS)), 1), 366)
+        except ValueError:
+            days = settings.UTILIZATION_DASHBOARD_DAYS
+        last_day = timezone.now().date()
+        first_day = last_day - timedelta(days=days - 1)
+        facilities, busiest_hours = utilization_report(first_day, last_day)
+        context.update({
+            'days': days,
+            'first_day': first_day,
+            'last_day': last_day,
+            'facilities': facilities,
+            'busiest_hours': busiest_hours,
+        })
+        return context
+
 def health_check(request):
     # Check database connection
     db_healthy = True
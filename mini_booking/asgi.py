@@ -0,0 +1,18 @@
+"""
+ASGI config for mini_booking.
+
+Serving through ASGI lets the slot-events stream hold many idle connections
+without a worker thread each; CancelOnDisconnect ends a stream as soon as
+its browser leaves.
+"""
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mini_booking.settings.production')
+
+application = get_asgi_application()
+
+from booking.asgi import CancelOnDisconnect  # noqa: E402
+
+application = CancelOnDisconnect(application)
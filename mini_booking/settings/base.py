@@ -1,5 +1,8 @@
 import os
+from datetime import timedelta
 from pathlib import Path
+from celery.schedules import crontab
+from kombu import Queue
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -10,6 +13,9 @@ SECRET_KEY = 'your-secret-key'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Set by the production profile; booking.checks then refuses debug-grade settings
+PRODUCTION = False
+
 ALLOWED_HOSTS = []
 
 INSTALLED_APPS = [
@@ -19,6 +25,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Facility search lookups (booking.search)
     
     # Third party apps
     'crispy_forms',
@@ -49,10 +56,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'booking.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'booking.middleware.AuditMiddleware',
+    'booking.middleware.APITokenMiddleware',
+    'booking.middleware.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,18 +85,207 @@ TEMPLATES = [
 ]
 
 ROOT_URLCONF = 'mini_booking.urls'
+ASGI_APPLICATION = 'mini_booking.asgi.application'
 
 # Login/Logout Settings
 LOGIN_REDIRECT_URL = 'booking:home'
 LOGOUT_REDIRECT_URL = 'booking:home'
 LOGIN_URL = 'booking:login'
 
+# Redis: database 0 is the Celery broker, database 1 the Django cache.
+# Both clients share the same connection limit per process.
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379')
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 50))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_URL', f'{REDIS_URL}/1'),
+        'KEY_PREFIX': 'mini_booking',
+        'OPTIONS': {
+            'max_connections': REDIS_MAX_CONNECTIONS,
+        },
+    },
+}
+
+# Sessions are read from the cache and written through to the database, so an
+# authenticated request no longer needs a session SELECT. Flash messages live
+# in a signed cookie instead of the session.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Rate limiting (see booking.ratelimit), token buckets per URL name
+RATELIMIT_ENABLED = True
+RATELIMIT_BACKEND = 'booking.ratelimit.RedisBackend'
+RATELIMIT_REDIS_URL = os.environ.get('RATELIMIT_REDIS_URL', f'{REDIS_URL}/2')
+RATELIMITS = {
+    'booking:available_slots': {'rate': '60/m', 'burst': 20, 'key': 'user_or_ip'},
+    'booking:booking_create': {'rate': '10/m', 'burst': 5, 'key': 'user', 'methods': ['POST']},
+    'booking:api_v1:booking_list': {'rate': '10/m', 'burst': 5, 'key': 'user', 'methods': ['POST']},
+    'booking:api_v1:hold_create': {'rate': '20/m', 'burst': 10, 'key': 'user'},
+    'booking:api_v1:next_slots': {'rate': '30/m', 'burst': 10, 'key': 'user_or_ip'},
+    'booking:api_v1:facility_calendar': {'rate': '60/m', 'burst': 20, 'key': 'user_or_ip'},
+}
+
+# Live slot updates (server-sent events over Redis pub/sub)
+SLOT_EVENTS_REDIS_URL = os.environ.get('SLOT_EVENTS_REDIS_URL', f'{REDIS_URL}/0')
+SLOT_EVENTS_HEARTBEAT = 15
+# Open streams per server process; more are refused with a 503
+SLOT_EVENTS_MAX_STREAMS = int(os.environ.get('SLOT_EVENTS_MAX_STREAMS', 200))
+
+# Slot holds during checkout (see booking.holds)
+SLOT_HOLD_BACKEND = 'booking.holds.RedisBackend'
+SLOT_HOLD_REDIS_URL = os.environ.get('SLOT_HOLD_REDIS_URL', f'{REDIS_URL}/3')
+SLOT_HOLD_TTL_SECONDS = 5 * 60
+
+# Idempotency-Key replay for booking creation (see booking.idempotency); the
+# database keeps the keys while Redis is unavailable
+IDEMPOTENCY_BACKEND = 'booking.idempotency.RedisBackend'
+IDEMPOTENCY_REDIS_URL = os.environ.get('IDEMPOTENCY_REDIS_URL', f'{REDIS_URL}/4')
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+# How long a request may run before a retry with its key is let through
+IDEMPOTENCY_LOCK_SECONDS = 60
+
+# How long a process keeps compiled facility slot grids (see booking.schedules)
+SCHEDULE_CACHE_SECONDS = 60
+
+# Next available slot search (see booking.next_available)
+NEXT_SLOT_CHUNK_DAYS = 7
+NEXT_SLOT_HORIZON_DAYS = 90
+
+# Month calendars (see booking.month_calendar); invalidated on booking writes,
+# the timeout only bounds staleness after writes that bypass the ORM signals
+CALENDAR_CACHE_SECONDS = 300
+
+# Utilization rollups (see booking.rollups): the refresh watermark trails the
+# newest booking change by this much so late commits are not missed.
+ROLLUP_WATERMARK_OVERLAP_SECONDS = 300
+UTILIZATION_DASHBOARD_DAYS = 30
+
 # Celery Configuration
-CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', f'{REDIS_URL}/0')
+CELERY_BROKER_POOL_LIMIT = REDIS_MAX_CONNECTIONS
+CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+CELERY_BROKER_TRANSPORT_OPTIONS = {'max_connections': REDIS_MAX_CONNECTIONS}
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'django-db')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# Results that are stored (tasks without ignore_result) are purged after a
+# day by booking.task_results, in chunks of TASK_RESULT_PURGE_CHUNK_SIZE
+CELERY_RESULT_EXPIRES = timedelta(days=1)
+TASK_RESULT_PURGE_CHUNK_SIZE = 1000
+TASK_RESULT_PURGE_CHUNK_PAUSE = 0.2
+
+# Queues by latency class, each consumed by its own worker service (see
+# docker-compose.yml): a backlog of emails never delays maintenance, and
+# long analytics runs never hold a notification worker.
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_QUEUES = (
+    Queue('default'),
+    Queue('notifications'),
+    Queue('maintenance'),
+    Queue('analytics'),
+)
+CELERY_TASK_ROUTES = {
+    'booking.tasks.send_booking_confirmation_email': {'queue': 'notifications'},
+    'booking.tasks.expire_pending_bookings': {'queue': 'maintenance'},
+    'booking.tasks.archive_old_bookings': {'queue': 'maintenance'},
+    'booking.tasks.maintain_booking_partitions': {'queue': 'maintenance'},
+    'booking.tasks.refresh_booking_rollups': {'queue': 'analytics'},
+    'booking.tasks.purge_task_results': {'queue': 'maintenance'},
+    'booking.tasks.schedule_booking_reminders': {'queue': 'maintenance'},
+    'booking.tasks.send_reminder_batch': {'queue': 'notifications'},
+    'booking.tasks.purge_idempotency_keys': {'queue': 'maintenance'},
+}
+# Tasks are acknowledged after they ran, so a killed worker's tasks are
+# redelivered; maintenance and analytics tasks are idempotent and a duplicate
+# email beats a lost one. One prefetched task per process keeps long tasks
+# from hoarding messages another worker could run.
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Emails per second the SMTP relay accepts from the whole notifications service.
+# Celery rate limits apply per worker instance (node), not per pool process,
+# so the relay's limit is split between the notifications workers.
+SMTP_RELAY_RATE_LIMIT = int(os.environ.get('SMTP_RELAY_RATE_LIMIT', 20))
+NOTIFICATION_WORKERS = int(os.environ.get('NOTIFICATION_WORKERS', 1))
+CELERY_TASK_ANNOTATIONS = {
+    'booking.tasks.send_booking_confirmation_email': {
+        'rate_limit': f'{max(SMTP_RELAY_RATE_LIMIT // NOTIFICATION_WORKERS, 1)}/s',
+    },
+    'booking.tasks.refresh_booking_rollups': {'rate_limit': '6/m'},
+}
+CELERY_BEAT_SCHEDULE = {
+    'maintain-booking-partitions': {
+        'task': 'booking.tasks.maintain_booking_partitions',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'archive-old-bookings': {
+        'task': 'booking.tasks.archive_old_bookings',
+        'schedule': crontab(minute=15),
+    },
+    'expire-pending-bookings': {
+        'task': 'booking.tasks.expire_pending_bookings',
+        'schedule': crontab(minute='*/5'),
+    },
+    'refresh-booking-rollups': {
+        'task': 'booking.tasks.refresh_booking_rollups',
+        'schedule': crontab(minute='*/10'),
+    },
+    'schedule-booking-reminders': {
+        'task': 'booking.tasks.schedule_booking_reminders',
+        'schedule': crontab(minute='*/5'),
+    },
+    'purge-idempotency-keys': {
+        'task': 'booking.tasks.purge_idempotency_keys',
+        'schedule': crontab(hour=4, minute=45),
+    },
+    # Replaces beat's default entry, a single DELETE over all expired results
+    'celery.backend_cleanup': {
+        'task': 'booking.tasks.purge_task_results',
+        'schedule': crontab(hour=4, minute=30),
+    },
+}
+
+# Pending bookings not confirmed within the TTL are expired and free their slot
+BOOKING_PENDING_TTL_MINUTES = 24 * 60
+BOOKING_PENDING_EXPIRY_CHUNK_SIZE = 1000
+
+# Booking table partitioning (PostgreSQL only)
+BOOKING_PARTITION_MONTHS_AHEAD = 3
+BOOKING_PARTITION_RETAIN_MONTHS = 24
+
+# Booking reminders (see booking.reminders): kind -> time before the start.
+# Each run covers starts up to REMINDER_CATCH_UP behind the lead time, which
+# must exceed the beat interval so a late run misses nothing.
+BOOKING_REMINDERS = {
+    '24h': timedelta(hours=24),
+    '1h': timedelta(hours=1),
+}
+REMINDER_CATCH_UP = timedelta(minutes=30)
+REMINDER_BATCH_SIZE = 200
+REMINDER_STALE_CLAIM = timedelta(minutes=30)
+
+# Booking archival: past bookings older than BOOKING_ARCHIVE_AFTER_DAYS and
+# cancelled bookings untouched for BOOKING_ARCHIVE_CANCELLED_AFTER_DAYS are
+# moved in chunks, pausing BOOKING_ARCHIVE_CHUNK_PAUSE seconds between them.
+BOOKING_ARCHIVE_AFTER_DAYS = 90
+BOOKING_ARCHIVE_CANCELLED_AFTER_DAYS = 1
+BOOKING_ARCHIVE_CHUNK_SIZE = 500
+BOOKING_ARCHIVE_CHUNK_PAUSE = 0.5
+
+# Database routing
+# Read-only views may read from REPLICA_DATABASES (aliases in DATABASES);
+# writes and booking validation always use 'default'. After a write the
+# client's reads stay on the primary for REPLICA_PIN_SECONDS.
+DATABASE_ROUTERS = ['booking.routers.ReplicaRouter']
+REPLICA_DATABASES = []
+REPLICA_PIN_SECONDS = 5
+
+# Admin changelists of large tables show the planner's row estimate instead
+# of COUNT(*) once it exceeds this many rows (see booking.paginators).
+ADMIN_EXACT_COUNT_LIMIT = 10000
 
 # Custom User Model
 AUTH_USER_MODEL = 'booking.CustomUser'
@@ -12,6 +12,21 @@ DATABASES = {
     }
 }
 
+# In-process cache so development and tests do not need a Redis server
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Rate limits use process memory; off by default so the test suite's many
+# requests from one client never trip them
+RATELIMIT_BACKEND = 'booking.ratelimit.MemoryBackend'
+RATELIMIT_ENABLED = False
+
+SLOT_HOLD_BACKEND = 'booking.holds.MemoryBackend'
+IDEMPOTENCY_BACKEND = 'booking.idempotency.MemoryBackend'
+
 # Development specific settings
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
@@ -4,10 +4,19 @@ import os
 
 load_dotenv()
 
-DEBUG = True  # Geçici olarak True yapıyoruz
-ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0']
+PRODUCTION = True
 
-# PostgreSQL database for production
+# Never on here: DEBUG keeps every SQL statement in connection.queries, which
+# grows without bound in long-lived web and worker processes
+DEBUG = False
+SECRET_KEY = os.getenv('SECRET_KEY', SECRET_KEY)
+ALLOWED_HOSTS = [
+    host.strip()
+    for host in os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1,0.0.0.0').split(',')
+    if host.strip()
+]
+
+# PostgreSQL database for production, with persistent connections
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -16,11 +25,72 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST', 'db'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica1,replica2
+for index, host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+# Templates are compiled once per process; no debug context processor
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [os.path.join(BASE_DIR, 'templates')],
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
+
+# Shared Redis cache (sessions, rate limits, slot grids); fail fast when Redis is down
+CACHES = {
+    'default': {
+        **CACHES['default'],
+        'OPTIONS': {
+            **CACHES['default']['OPTIONS'],
+            'socket_connect_timeout': 2,
+            'socket_timeout': 2,
+        },
+    },
+}
+
+# Logging to stdout; SQL statements are never logged
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'root': {'handlers': ['console'], 'level': os.getenv('LOG_LEVEL', 'INFO')},
+    'loggers': {
+        'django.db.backends': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 # Production security settings
 SECURE_SSL_REDIRECT = False
 SESSION_COOKIE_SECURE = False
 CSRF_COOKIE_SECURE = False
-SECURE_BROWSER_XSS_FILTER = True 
\ No newline at end of file
+SECURE_BROWSER_XSS_FILTER = True